@@ -5,6 +5,10 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Serve with an ASGI server so the async AI views share one event loop:
+
+    uvicorn TodoGenius.asgi:application --port 8000
 """
 
 import os
@@ -42,6 +42,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'corsheaders',
     'rest_framework',
     'drf_spectacular',
@@ -80,6 +81,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'TodoGenius.wsgi.application'
+ASGI_APPLICATION = 'TodoGenius.asgi.application'
 
 
 # Database
@@ -144,6 +146,12 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_THROTTLE_RATES': {
+        # Per-client limit on AI enhancement calls (aiengine.throttles)
+        'ai_enhance': '30/min',
+        # Tasks, not requests, sent to the batch endpoint
+        'ai_enhance_batch': '300/hour',
+    },
 }
 
 SPECTACULAR_SETTINGS = {
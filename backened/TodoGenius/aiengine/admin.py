@@ -1,3 +1,5 @@
 from django.contrib import admin
+from .models import BackfillCheckpoint, EnhancementJob
 
-# Register your models here.
+admin.site.register(EnhancementJob)
+admin.site.register(BackfillCheckpoint)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AiengineConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'aiengine'
+
+    def ready(self):
+        # Connect the Context signal handlers that keep the search index current
+        from . import signals  # noqa: F401
@@ -3,6 +3,154 @@ MAX_TOKENS = 400
 TEMPERATURE = 0.7
 MODEL_NAME = "Mistral-7B-Instruct-v0.3-Q4_K_M.gguf"
 
+# Inference backend: 'lm_studio' (HTTP), 'llama_cpp' (in-process GGUF model)
+# or 'llama_cpp_pool' (GGUF model in a pool of worker processes)
+INFERENCE_ENGINE = 'lm_studio'
+LLAMA_N_CTX = 4096
+LLAMA_N_GPU_LAYERS = 0
+LLAMA_THREADS_PER_WORKER = 4
+
+# Shared HTTP connection pool for LM Studio
+HTTP_MAX_CONNECTIONS = 100
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 20
+HTTP_KEEPALIVE_EXPIRY = 60.0  # seconds
+
+# Constrained decoding for enhancement output: None, 'json_schema'
+# (OpenAI-style response_format, LM Studio) or 'gbnf' (llama.cpp grammar)
+CONSTRAINED_OUTPUT = None
+
+# Keep the server-side KV cache between requests so the static system
+# prompt is only prefilled once
+PROMPT_CACHE = True
+
+# Token budgets for the request-specific prompt sections; entries are
+# ranked by relevance to the task and added while they fit. No single
+# entry (e.g. a pasted email) may take more than PROMPT_ENTRY_MAX_TOKENS.
+PROMPT_SECTION_BUDGETS = {'categories': 200, 'tasks': 250, 'context': 500}
+PROMPT_ENTRY_MAX_TOKENS = 150
+
+# Cache of finished enhancements, keyed on the task name and a fingerprint
+# of the context the prompt was built from
+ENHANCEMENT_CACHE = True
+ENHANCEMENT_CACHE_TTL = 300  # seconds
+ENHANCEMENT_CACHE_MAX_ENTRIES = 512  # memory tier
+ENHANCEMENT_CACHE_DISK_SIZE_LIMIT = 64 * 1024 * 1024  # bytes
+
+# Semantic layer over the enhancement cache: reuse a result for a
+# near-duplicate task name (hashed n-gram cosine similarity) built from the
+# same context. Off by default: n-gram similarity cannot tell a rewording
+# from an edit that changes the task, so only names adding no words are
+# reused. Tune the threshold with `manage.py evaluate_semantic_cache`.
+SEMANTIC_CACHE = False
+SEMANTIC_CACHE_THRESHOLD = 0.75
+SEMANTIC_CACHE_DIMENSIONS = 1024
+
+# Micro-batching of non-streaming enhancement calls
+BATCHING = False
+BATCH_WINDOW_MS = 5
+BATCH_MAX_SIZE = 8
+BATCH_MAX_IN_FLIGHT = 4  # batches decoding at once
+BATCH_TIMEOUT = 330  # seconds a caller waits for its batch, queueing included
+
+# Request hedging across LM_STUDIO_BASE_URLS: a duplicate goes to a second
+# endpoint once a call is slower than the pool's HEDGE_PERCENTILE latency
+HEDGING = False
+HEDGE_PERCENTILE = 95
+HEDGE_MIN_SAMPLES = 20  # latencies needed before hedging starts
+HEDGE_MIN_DELAY = 0.05  # seconds
+LATENCY_WINDOW = 200  # recent latencies kept per kind
+
+# Circuit breaker and background health checks for LM Studio
+CIRCUIT_FAILURE_THRESHOLD = 3  # consecutive failures before opening
+CIRCUIT_RECOVERY_TIMEOUT = 30  # seconds open before a trial request
+HEALTH_CHECK_INTERVAL = 10  # seconds between /models probes
+HEALTH_CHECK_TIMEOUT = 2  # seconds
+HEALTH_MONITOR = True
+
+# Admission control: concurrent generations, queue depth and the longest a
+# request may wait for a slot before it is turned away. With batching on,
+# allow at least BATCH_MAX_SIZE in flight or batches can never fill.
+ADMISSION_MAX_IN_FLIGHT = 2
+ADMISSION_MAX_QUEUE = 16
+ADMISSION_QUEUE_TIMEOUT = 10  # seconds
+
+# LLM scheduler: generation slots above are shared by 'interactive' requests
+# and 'batch' background work. Weights set the fair share under contention;
+# batch work holds at most SCHEDULER_BATCH_MAX_SLOTS slots (None: all but
+# one) and jumps the queue once it has waited SCHEDULER_STARVATION_TIMEOUT.
+SCHEDULER_WEIGHTS = {'interactive': 8, 'batch': 1}
+SCHEDULER_BATCH_MAX_SLOTS = None
+SCHEDULER_BATCH_MAX_QUEUE = 10000
+SCHEDULER_STARVATION_TIMEOUT = 30  # seconds
+
+# Context retrieval for prompts: 'postgres' (full-text search), 'memory'
+# (in-process BM25 index), 'off' (newest 24h only) or None to pick Postgres
+# when the database is Postgres. A window of None searches all context.
+CONTEXT_SEARCH_BACKEND = None
+CONTEXT_SEARCH_TOP_K = 5
+CONTEXT_SEARCH_WINDOW_DAYS = None
+
+# Rule-based deadlines ("tomorrow at 3pm", "by Friday", "in 2 weeks", "EOD")
+# read from the task name or its context. A match at or above the minimum
+# confidence fixes the deadline and the model is not asked for one.
+TEMPORAL_PARSER = True
+TEMPORAL_MIN_CONFIDENCE = 0.85
+
+# Learnt category/priority predictor (`manage.py train_task_predictor`).
+# ENHANCEMENT_MODE: 'llm' ignores it, 'hybrid' fixes confidently predicted
+# fields and asks the model for the rest, 'fast' skips the model entirely
+# when category and priority are both confident.
+ENHANCEMENT_MODE = 'hybrid'
+PREDICTOR_DIMENSIONS = 2 ** 14
+PREDICTOR_MIN_SAMPLES = 100  # tasks learnt before predictions are used
+PREDICTOR_MIN_CONFIDENCE = 0.9  # calibrated category probability
+PREDICTOR_MAX_PRIORITY_ERROR = 0.1  # held-out mean absolute error
+
+# Stale-while-revalidate: with PROVISIONAL_MODE (or "provisional": true on a
+# request) enhance-task answers at once from the caches, fixed fields and
+# similar past tasks, and the full enhancement runs on a background pool.
+# Results stay fetchable from enhance-task/upgrade/<id>/ for the TTL.
+# Upgrades live in the memory of the process that started them: behind
+# several worker processes, route polls to the same process (sticky
+# sessions) or use the job queue (/api/ai/jobs/) instead.
+PROVISIONAL_MODE = False
+PROVISIONAL_MAX_WORKERS = 4
+PROVISIONAL_MAX_PENDING = 64  # upgrades queued or running; more are refused (503)
+PROVISIONAL_RESULT_TTL = 300  # seconds
+PROVISIONAL_MAX_ENTRIES = 1000
+PROVISIONAL_MAX_WAIT = 30  # seconds a long poll may wait
+
+# Enhancement job queue (EnhancementJob table, `manage.py run_enhancement_worker`).
+# A worker holds a claimed job for JOB_VISIBILITY_TIMEOUT and renews the lease
+# while it runs; a job whose lease lapses is claimed again. Failed attempts
+# retry after JOB_RETRY_BACKOFF * 2**(attempt - 1) seconds. Finished jobs are
+# deleted after JOB_RESULT_TTL.
+JOB_MAX_ATTEMPTS = 3
+JOB_VISIBILITY_TIMEOUT = 60  # seconds
+JOB_RETRY_BACKOFF = 5  # seconds
+JOB_RESULT_TTL = 24 * 3600  # seconds
+JOB_WORKER_CONCURRENCY = 2
+JOB_POLL_INTERVAL = 1.0  # seconds between polls of an empty queue
+
+# Batch enhancement endpoint (enhance-tasks/batch/): task names per request,
+# and how many are enhanced at once. With BATCHING on, concurrent items are
+# packed into shared batched decodes.
+BATCH_ENHANCEMENT_MAX_ITEMS = 100
+BATCH_ENHANCEMENT_CONCURRENCY = 4
+
+# Backfill of tasks created without AI (`manage.py backfill_enhancements`):
+# tasks read per chunk, enhanced at once in the scheduler's batch class, and
+# the most enhanced per minute (None: no limit).
+BACKFILL_CHUNK_SIZE = 20
+BACKFILL_CONCURRENCY = 2
+BACKFILL_RATE_PER_MINUTE = 30
+
+# Snapshot of recent tasks, recent context and categories shared by every
+# prompt in the process, reloaded when a save/delete bumps its version in the
+# Django cache. The max age bounds staleness when the cache is per-process.
+PROMPT_CONTEXT_SNAPSHOT = True
+PROMPT_CONTEXT_MAX_AGE = 60  # seconds
+
 # Priority Score Ranges
 PRIORITY_RANGES = {
     'low': (0.0, 0.3),
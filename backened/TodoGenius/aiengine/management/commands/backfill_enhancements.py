@@ -0,0 +1,71 @@
+from datetime import datetime, time, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from ...models import BackfillCheckpoint
+from ...services.backfill import TaskBackfill
+
+
+class Command(BaseCommand):
+    help = (
+        "Enhance tasks created without AI, resuming from the last checkpoint. "
+        "Meant for idle hours, e.g. from cron: "
+        "0 22 * * * python manage.py backfill_enhancements --stop-at 06:00"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Tasks read and enhanced per chunk (default: AI_BACKFILL_CHUNK_SIZE)')
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help='Tasks enhanced at once (default: AI_BACKFILL_CONCURRENCY)')
+        parser.add_argument('--rate', type=float, default=None, metavar='PER_MINUTE',
+                            help='Most tasks enhanced per minute, 0 for no limit (default: AI_BACKFILL_RATE_PER_MINUTE)')
+        parser.add_argument('--max-tasks', type=int, default=None,
+                            help='Stop after this many tasks')
+        parser.add_argument('--stop-at', metavar='HH:MM',
+                            help='Stop at this local time (the next occurrence), e.g. when the working day starts')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Show the suggestions without writing them or the checkpoint')
+        parser.add_argument('--reset', action='store_true',
+                            help='Start over from the oldest task instead of the checkpoint')
+        parser.add_argument('--name', default='tasks',
+                            help='Checkpoint name, to keep separate runs apart (default: tasks)')
+        parser.add_argument('--status', action='store_true',
+                            help='Show the checkpoint and exit')
+
+    def handle(self, *args, **options):
+        if options['status']:
+            checkpoint = BackfillCheckpoint.objects.filter(name=options['name']).first()
+            if checkpoint is None:
+                self.stdout.write(f"No backfill '{options['name']}' has run yet")
+                return
+            self.stdout.write(
+                f"{checkpoint.name}: {checkpoint.processed} processed, {checkpoint.updated} updated, "
+                f"{checkpoint.failed} failed, last task created {checkpoint.last_created_at}, "
+                f"{'finished ' + str(checkpoint.finished_at) if checkpoint.finished_at else 'in progress'}"
+            )
+            return
+
+        backfill = TaskBackfill(
+            name=options['name'], chunk_size=options['chunk_size'], concurrency=options['concurrency'],
+            rate_per_minute=options['rate'], dry_run=options['dry_run'], log=self.stdout.write
+        )
+        totals = backfill.run(
+            max_tasks=options['max_tasks'], stop_at=self._stop_at(options['stop_at']), reset=options['reset']
+        )
+        prefix = 'Dry run: ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{totals['processed']} tasks processed, {totals['updated']} updated, "
+            f"{totals['failed']} failed (stopped: {totals['stopped']})"
+        ))
+
+    @staticmethod
+    def _stop_at(value):
+        if not value:
+            return None
+        try:
+            stop = time.fromisoformat(value)
+        except ValueError:
+            raise CommandError(f"--stop-at expects HH:MM, got '{value}'")
+        now = timezone.localtime()
+        stop_at = timezone.make_aware(datetime.combine(now.date(), stop))
+        return stop_at if stop_at > now else stop_at + timedelta(days=1)
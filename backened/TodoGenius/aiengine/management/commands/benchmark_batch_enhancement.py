@@ -0,0 +1,63 @@
+import asyncio
+import time
+from django.core.management.base import BaseCommand
+from ...services.task_processor import TaskProcessor
+
+
+DEFAULT_TASKS = [
+    'Buy groceries',
+    'Prepare slides for the quarterly review',
+    'Call the dentist',
+    'Renew car insurance',
+    'Plan weekend trip',
+    'Reply to the landlord about the lease',
+    'Book flights for the conference',
+    'Fix the leaking kitchen tap',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare enhancing a list of tasks one call at a time with the batch "
+        "enhancement used by /api/ai/enhance-tasks/batch/ (caches bypassed)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--task', action='append', dest='tasks',
+                            help='Task name to enhance; repeat for several (default: built-in samples)')
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help='Tasks enhanced at once in the batch (default: AI_BATCH_ENHANCEMENT_CONCURRENCY)')
+
+    def handle(self, *args, **options):
+        tasks = options['tasks'] or DEFAULT_TASKS
+        sequential, sequential_ok = asyncio.run(self._sequential(tasks))
+        self.stdout.write(f"Sequential: {len(tasks)} tasks in {sequential:.2f}s "
+                          f"({len(tasks) / sequential:.2f} tasks/s), {sequential_ok} succeeded")
+
+        summary = asyncio.run(self._batch(tasks, options['concurrency']))
+        self.stdout.write(f"Batch:      {summary['items']} tasks in {summary['elapsed']:.2f}s "
+                          f"({summary['items_per_second']:.2f} tasks/s), {summary['succeeded']} succeeded, "
+                          f"concurrency {summary['concurrency']}")
+        self.stdout.write(self.style.SUCCESS(f"Speedup over sequential calls: {sequential / summary['elapsed']:.2f}x"))
+
+    @staticmethod
+    def _uncached_processor() -> TaskProcessor:
+        # Both runs enhance the same names: without this the second would be cache hits
+        processor = TaskProcessor()
+        processor.cache = None
+        processor.semantic_cache = None
+        return processor
+
+    async def _sequential(self, tasks):
+        ok = 0
+        started = time.perf_counter()
+        for task in tasks:
+            result = await self._uncached_processor().aenhance_task(task)
+            ok += bool(result['success'])
+        return time.perf_counter() - started, ok
+
+    async def _batch(self, tasks, concurrency):
+        summary = None
+        async for item in self._uncached_processor().astream_batch_enhancement(tasks, concurrency):
+            summary = item.get('summary', summary)
+        return summary
@@ -0,0 +1,94 @@
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from ...services.lm_studio_client import LMStudioClient
+from ...services.task_processor import TaskProcessor
+from ...utils.prompt_templates import PromptTemplates
+
+
+DEFAULT_TASKS = [
+    'Buy groceries',
+    'Prepare slides for the quarterly review',
+    'Call the dentist',
+    'Renew car insurance',
+    'Plan weekend trip',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark prefill time of the legacy single-string prompt against the "
+        "prefix-stable system + user layout with server-side prompt caching "
+        "on the LM Studio / llama.cpp HTTP server"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=5,
+                            help='Requests per layout (default: 5)')
+        parser.add_argument('--task', action='append', dest='tasks',
+                            help='Task name to enhance; repeat for several (default: built-in samples)')
+
+    def handle(self, *args, **options):
+        iterations = max(1, options['iterations'])
+        tasks = options['tasks'] or DEFAULT_TASKS
+
+        processor = TaskProcessor()
+        client = LMStudioClient()
+        recent_tasks = processor.get_recent_tasks()
+        recent_context = processor.get_existing_context()
+        existing_categories = processor._get_existing_categories()
+
+        self.stdout.write(f"Model: {client.model_name} at {client.base_url}")
+        self.stdout.write("Measuring time to first token with max_tokens=1 (~ prefill time)\n")
+
+        # Legacy layout: task ahead of the static guidelines, cache reset on every call
+        legacy = []
+        for i in range(iterations):
+            prompt = PromptTemplates._build_enhancement_prompt(
+                tasks[i % len(tasks)], recent_tasks, recent_context, existing_categories
+            )
+            payload = client._build_completion_payload(prompt, max_tokens=1)
+            payload.update({'cache_prompt': False, 'reset': True})
+            legacy.append(self._time_to_first_token(client, 'completions', payload))
+
+        # Prefix-stable layout: the first request warms the cache and is not counted
+        cached = []
+        for i in range(iterations + 1):
+            messages = PromptTemplates._build_enhancement_messages(
+                tasks[i % len(tasks)], recent_tasks, recent_context, existing_categories
+            )
+            payload = client._build_chat_payload(messages, max_tokens=1)
+            payload['cache_prompt'] = True
+            elapsed = self._time_to_first_token(client, 'chat/completions', payload)
+            if i:
+                cached.append(elapsed)
+
+        self._report('legacy prompt (no cache)', legacy)
+        self._report('static prefix (cached)', cached)
+
+        legacy_median = statistics.median(legacy)
+        cached_median = statistics.median(cached)
+        if cached_median > 0:
+            self.stdout.write(self.style.SUCCESS(
+                f"\nMedian prefill speedup: {legacy_median / cached_median:.2f}x "
+                f"({legacy_median * 1000:.0f} ms -> {cached_median * 1000:.0f} ms)"
+            ))
+
+    @staticmethod
+    def _time_to_first_token(client, endpoint: str, payload: dict) -> float:
+        start = time.perf_counter()
+        stream = client._stream(endpoint, payload)
+        try:
+            for _ in stream:
+                break
+        finally:
+            stream.close()
+        return time.perf_counter() - start
+
+    def _report(self, label: str, samples: list):
+        self.stdout.write(
+            f"{label:<28} n={len(samples):<3} "
+            f"mean={statistics.mean(samples) * 1000:8.1f} ms  "
+            f"median={statistics.median(samples) * 1000:8.1f} ms  "
+            f"min={min(samples) * 1000:8.1f} ms"
+        )
@@ -0,0 +1,83 @@
+import statistics
+import time
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from ...constants import TEMPORAL_MIN_CONFIDENCE
+from ...utils.temporal_parser import TemporalParser
+
+
+DEFAULT_TASKS = [
+    'call mom tomorrow at 3pm',
+    'submit expense report by Friday',
+    'renew passport in 2 weeks',
+    'send the invoice EOD',
+    'dentist appointment at 9:30 am',
+    'pay rent on 1st of november',
+    'finish slides next week',
+    'move friday review to monday',
+    'gym every monday',
+    'buy groceries',
+    'prepare slides for the quarterly review',
+    'team meeting',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the rule-based temporal parser: time per input and how "
+        "many inputs get a deadline fixed without the model"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=2000,
+                            help='Passes over the inputs (default: 2000)')
+        parser.add_argument('--task', action='append', dest='tasks',
+                            help='Task name to parse; repeat for several (default: built-in samples)')
+        parser.add_argument('--recent-tasks', type=int, default=0, metavar='N',
+                            help='Use the titles of the newest N tasks instead')
+
+    def handle(self, *args, **options):
+        if options['recent_tasks']:
+            Task = apps.get_model('tasks', 'Task')
+            tasks = list(Task.objects.order_by('-created_at').values_list('title', flat=True)[:options['recent_tasks']])
+        else:
+            tasks = options['tasks'] or DEFAULT_TASKS
+        if not tasks:
+            self.stdout.write("No task names to parse")
+            return
+        iterations = max(1, options['iterations'])
+        min_confidence = getattr(settings, 'AI_TEMPORAL_MIN_CONFIDENCE', TEMPORAL_MIN_CONFIDENCE)
+        now = timezone.localtime()
+
+        fixed = 0
+        for task in tasks:
+            match = TemporalParser.parse(task, now)
+            if match is None:
+                outcome = '-'
+            else:
+                confident = match['confidence'] >= min_confidence
+                fixed += confident
+                outcome = (f"{match['deadline'].strftime('%a %Y-%m-%d %H:%M')}  "
+                           f"'{match['text']}' {match['confidence']:.2f}{'' if confident else ' (left to model)'}")
+            self.stdout.write(f"  {task[:40]:<40}  {outcome}")
+
+        # Time whole passes and divide, so timer overhead stays out of the figure
+        per_input = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            for task in tasks:
+                TemporalParser.parse(task, now)
+            per_input.append((time.perf_counter() - start) / len(tasks) * 1e6)
+
+        per_input.sort()
+        self.stdout.write(
+            f"\n{len(tasks)} inputs x {iterations} passes: "
+            f"mean={statistics.mean(per_input):.1f} us  "
+            f"median={statistics.median(per_input):.1f} us  "
+            f"p95={per_input[min(len(per_input) - 1, int(len(per_input) * 0.95))]:.1f} us per input"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Deadline fixed without the model for {fixed}/{len(tasks)} inputs (confidence >= {min_confidence})"
+        ))
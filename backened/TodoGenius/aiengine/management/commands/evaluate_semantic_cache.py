@@ -0,0 +1,142 @@
+import json
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from ...services.semantic_cache import HashedNgramEmbedder, SemanticCache
+
+
+# (cached task name, new task name, same enhancement expected). Positives
+# are the rewordings users actually type; negatives share words but not
+# intent, including edits that extend or negate a name while it is typed.
+DEFAULT_PAIRS = [
+    ('buy groceries', 'grocery shopping', True),
+    ('buy groceries', 'get groceries tmrw', True),
+    ('buy groceries', 'groceries', True),
+    ('call mom', 'call mom tonight', True),
+    ('call mom', 'phone call with mom', True),
+    ('dentist appointment', 'dentist appt', True),
+    ('book dentist appointment', 'schedule dentist appointment', True),
+    ('prepare slides for the quarterly review', 'quarterly review slides', True),
+    ('team meeting', 'team mtg', True),
+    ('pay electricity bill', 'pay the electricity bill', True),
+    ('renew car insurance', 'car insurance renewal', True),
+    ('do laundry', 'laundry', True),
+    ('plan weekend trip', 'plan trip for the weekend', True),
+    ('submit expense report', 'expense report submission', True),
+    ('clean the kitchen', 'kitchen cleaning', True),
+    ('mom birthday gift', 'buy gift for mom bday', True),
+    ('fix login bug', 'fix the login bug', True),
+    ('water the plants', 'water plants', True),
+    ('call mom', 'call dad', False),
+    ('call mom', 'call the bank', False),
+    ('buy groceries', 'buy a car', False),
+    ('buy milk', 'buy eggs', False),
+    ('pay electricity bill', 'pay water bill', False),
+    ('dentist appointment', 'doctor appointment', False),
+    ('team meeting', 'team lunch', False),
+    ('renew car insurance', 'renew passport', False),
+    ('fix login bug', 'fix bike', False),
+    ('clean the kitchen', 'clean the garage', False),
+    ('email the client', 'email the landlord', False),
+    ('book flight to paris', 'book hotel in paris', False),
+    ('prepare slides for the quarterly review', 'prepare taxes', False),
+    ('plan weekend trip', 'plan sprint', False),
+    ('submit expense report', 'submit tax return', False),
+    ('water the plants', 'buy plants', False),
+    ('cancel gym membership', 'renew gym membership', False),
+    ('write blog post', 'read blog post', False),
+    ('call dentist', 'call dentist urgent', False),
+    ('pay invoice', 'do not pay invoice', False),
+    ('buy milk', 'buy milk and eggs', False),
+    ('clean kitchen', 'clean kitchen sink', False),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Evaluate the semantic enhancement cache: for each similarity threshold, "
+        "the share of reworded task pairs it would reuse (hit rate) and of "
+        "different tasks it would wrongly reuse (false reuse), with names that "
+        "add words or a negation never reused"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pairs', help='JSONL file of {"a": ..., "b": ..., "same": true|false} '
+                                            '(default: built-in labelled pairs)')
+        parser.add_argument('--thresholds', default='0.5,0.6,0.7,0.75,0.8,0.85,0.9,0.95',
+                            help='Comma-separated thresholds to sweep')
+        parser.add_argument('--replay-tasks', type=int, default=0, metavar='N',
+                            help='Also replay the titles of the newest N tasks through a cache at '
+                                 'AI_SEMANTIC_CACHE_THRESHOLD and list the reuses for review')
+
+    def handle(self, *args, **options):
+        pairs = self._load_pairs(options['pairs']) if options['pairs'] else DEFAULT_PAIRS
+        try:
+            thresholds = [float(value) for value in options['thresholds'].split(',')]
+        except ValueError:
+            raise CommandError('--thresholds must be comma-separated numbers')
+
+        embedder = HashedNgramEmbedder()
+        scored = [
+            (a, b, same, float(embedder.embed(a) @ embedder.embed(b)),
+             SemanticCache.reusable(embedder.content(b), embedder.content(a)))
+            for a, b, same in pairs
+        ]
+        positives = [row for row in scored if row[2]]
+        negatives = [row for row in scored if not row[2]]
+        if not positives or not negatives:
+            raise CommandError('Need both same and different pairs to evaluate')
+
+        self.stdout.write(f"{len(positives)} reworded pairs, {len(negatives)} different pairs\n")
+        self.stdout.write(f"{'threshold':>9}  {'hit rate':>8}  {'false reuse':>11}  {'precision':>9}")
+        for threshold in thresholds:
+            hits = sum(1 for row in positives if row[4] and row[3] >= threshold)
+            false_reuses = sum(1 for row in negatives if row[4] and row[3] >= threshold)
+            reused = hits + false_reuses
+            precision = f"{hits / reused:9.3f}" if reused else f"{'-':>9}"
+            self.stdout.write(
+                f"{threshold:9.2f}  {hits / len(positives):8.3f}  {false_reuses / len(negatives):11.3f}  {precision}"
+            )
+
+        refused = [row for row in scored if not row[4]]
+        self.stdout.write(
+            f"\nRefused for added words or negation: {sum(1 for row in refused if not row[2])} different pairs, "
+            f"{sum(1 for row in refused if row[2])} reworded pairs"
+        )
+        self.stdout.write("Closest different pairs (false reuse risks):")
+        for a, b, _, similarity, _ in sorted((row for row in negatives if row[4]), key=lambda row: row[3], reverse=True)[:5]:
+            self.stdout.write(f"  {similarity:.3f}  {a!r} ~ {b!r}")
+        self.stdout.write("Furthest reworded pairs (missed hits):")
+        for a, b, _, similarity, reusable in sorted(positives, key=lambda row: (row[4], row[3]))[:5]:
+            self.stdout.write(f"  {similarity:.3f}  {a!r} ~ {b!r}{'' if reusable else '  (refused)'}")
+
+        if options['replay_tasks']:
+            self._replay(options['replay_tasks'])
+
+    def _load_pairs(self, path):
+        pairs = []
+        try:
+            with open(path, encoding='utf-8') as handle:
+                for line in handle:
+                    if line.strip():
+                        row = json.loads(line)
+                        pairs.append((row['a'], row['b'], bool(row['same'])))
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f"Could not read pairs from {path}: {str(e)}")
+        return pairs
+
+    def _replay(self, limit: int):
+        """Feed real task titles, oldest first, through one shared context"""
+        Task = apps.get_model('tasks', 'Task')
+        titles = list(Task.objects.order_by('-created_at').values_list('title', flat=True)[:limit])[::-1]
+        cache = SemanticCache(capacity=max(1, len(titles)))
+        reuses = 0
+        self.stdout.write(f"\nReplaying {len(titles)} task titles at threshold {cache.threshold}:")
+        for index, title in enumerate(titles):
+            hit = cache.lookup(title, 'replay')
+            if hit is not None:
+                reuses += 1
+                self.stdout.write(f"  {hit[1]:.3f}  {title!r} reuses {hit[0]!r}")
+            else:
+                cache.add(title, 'replay', title)
+        if titles:
+            self.stdout.write(f"Reuse rate: {reuses / len(titles):.3f} ({reuses}/{len(titles)})")
@@ -0,0 +1,123 @@
+import signal
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from ...constants import JOB_WORKER_CONCURRENCY, JOB_POLL_INTERVAL
+from ...services.admission import AdmissionRejected
+from ...services.job_queue import EnhancementJobQueue
+from ...services.task_processor import TaskProcessor
+
+
+class Command(BaseCommand):
+    help = (
+        "Run enhancement jobs queued through /api/ai/jobs/. Start as many "
+        "workers as the AI backend can serve; they share the queue safely."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help='Jobs run at once (default: AI_JOB_WORKER_CONCURRENCY)')
+        parser.add_argument('--poll-interval', type=float, default=None,
+                            help='Seconds between polls of an empty queue (default: AI_JOB_POLL_INTERVAL)')
+        parser.add_argument('--priority', choices=['interactive', 'batch'], default='interactive',
+                            help='LLM scheduler class the jobs run in (default: interactive)')
+        parser.add_argument('--worker-id', help='Lease owner name (default: host:pid)')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queue is empty instead of waiting for jobs')
+
+    def handle(self, *args, **options):
+        concurrency = max(1, options['concurrency'] or getattr(settings, 'AI_JOB_WORKER_CONCURRENCY', JOB_WORKER_CONCURRENCY))
+        poll_interval = options['poll_interval'] or getattr(settings, 'AI_JOB_POLL_INTERVAL', JOB_POLL_INTERVAL)
+        queue = EnhancementJobQueue(worker_id=options['worker_id'])
+        priority = options['priority']
+
+        stopping = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stopping.set())
+
+        self.stdout.write(f"Worker {queue.worker_id}: {concurrency} slots, {priority} priority")
+        running = {}
+        heartbeat_every = queue.visibility_timeout.total_seconds() / 3
+        last_heartbeat = last_purge = time.monotonic()
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='enhancement-job') as executor:
+            while not stopping.is_set():
+                jobs = self._claim(queue, concurrency - len(running)) if len(running) < concurrency else []
+                for job in jobs:
+                    running[executor.submit(self._process, queue, job, priority)] = job
+                if options['once'] and not running:
+                    break
+
+                now = time.monotonic()
+                if now - last_heartbeat >= heartbeat_every:
+                    queue.heartbeat([job.pk for job in running.values()])
+                    last_heartbeat = now
+                if now - last_purge >= 3600:
+                    purged = queue.purge_expired()
+                    if purged:
+                        self.stdout.write(f"Purged {purged} expired jobs")
+                    last_purge = now
+
+                if jobs and len(running) < concurrency:
+                    # The queue may hold more: claim again right away
+                    continue
+                if running:
+                    done, _ = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        running.pop(future)
+                else:
+                    stopping.wait(poll_interval)
+
+            if running:
+                self.stdout.write(f"Stopping: finishing {len(running)} running jobs")
+                while running:
+                    done, _ = wait(running, timeout=heartbeat_every)
+                    for future in done:
+                        running.pop(future)
+                    queue.heartbeat([job.pk for job in running.values()])
+        self.stdout.write(self.style.SUCCESS(f"Worker {queue.worker_id} stopped"))
+
+    @staticmethod
+    def _claim(queue: EnhancementJobQueue, limit: int):
+        try:
+            return queue.claim(limit)
+        except Exception as e:
+            # Database unreachable: keep the worker alive and poll again
+            print(f"Error claiming enhancement jobs: {str(e)}")
+            close_old_connections()
+            return []
+
+    def _process(self, queue: EnhancementJobQueue, job, priority: str):
+        started = time.monotonic()
+        try:
+            result = TaskProcessor(priority=priority).enhance_task(job.task_name)
+            meta = result.get('meta', {})
+            if result['success'] and meta.get('complete') is not False:
+                queue.complete(job, result)
+                outcome = 'succeeded'
+            elif result['success']:
+                # The stream broke off before the JSON closed: the data is
+                # partly fallback, kept in case no attempt is left
+                queue.retry(job, 'Generation ended before the answer was complete', result=result)
+                outcome = 'incomplete'
+            else:
+                # Circuit open or a failed generation: the fallback is kept in
+                # case no attempt is left
+                queue.retry(job, result['data'].get('reasoning', 'Enhancement failed'),
+                            delay=meta.get('retry_after'), result=result)
+                outcome = 'failed'
+        except AdmissionRejected as rejected:
+            queue.retry(job, f"AI service at capacity ({rejected.reason})", delay=rejected.retry_after)
+            outcome = 'rejected'
+        except Exception as e:
+            print(f"Error running enhancement job {job.pk}: {str(e)}")
+            queue.retry(job, str(e))
+            outcome = 'failed'
+        finally:
+            close_old_connections()
+        self.stdout.write(
+            f"Job {job.pk} attempt {job.attempts}/{job.max_attempts} {outcome} "
+            f"in {time.monotonic() - started:.1f}s: {job.task_name[:60]}"
+        )
@@ -1,3 +1,81 @@
+import uuid
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class EnhancementJob(models.Model):
+    """
+    A task enhancement queued for the worker (`manage.py run_enhancement_worker`)
+
+    The table is the queue: workers claim due jobs with SELECT ... FOR
+    UPDATE SKIP LOCKED and hold them until `locked_until`, renewing the
+    lease while they work. A job whose lease runs out (a worker died) is
+    claimed again; failed attempts are retried until max_attempts.
+    """
+
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    task_name = models.CharField(max_length=255)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    # Not claimed before this time: submission time, or the retry backoff
+    available_at = models.DateTimeField(default=timezone.now)
+    # Lease of the worker running the job
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    locked_until = models.DateTimeField(blank=True, null=True)
+    result = models.JSONField(blank=True, null=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    # Finished jobs are deleted after this time
+    expires_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'enhancement_jobs'
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='enhancement_job_due_idx'),
+            models.Index(fields=['status', 'locked_until'], name='enhancement_job_lease_idx'),
+            models.Index(fields=['expires_at'], name='enhancement_job_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task_name} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in ('succeeded', 'failed')
+
+
+class BackfillCheckpoint(models.Model):
+    """
+    Progress of a resumable backfill (`manage.py backfill_enhancements`)
+
+    Tasks are walked in (created_at, id) order; the last task handled is
+    stored so an interrupted run continues where it stopped.
+    """
+
+    name = models.CharField(max_length=100, unique=True)
+    last_created_at = models.DateTimeField(blank=True, null=True)
+    last_id = models.UUIDField(blank=True, null=True)
+    processed = models.PositiveIntegerField(default=0)
+    updated = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'backfill_checkpoints'
+
+    def __str__(self):
+        return f"{self.name}: {self.processed} processed"
@@ -1,8 +1,23 @@
 from rest_framework import serializers
+from .constants import BATCH_ENHANCEMENT_MAX_ITEMS
 
 class TaskEnhancementInputSerializer(serializers.Serializer):
     """Serializer for task enhancement input"""
     task_name = serializers.CharField(max_length=255)
+    # Client-chosen key (e.g. one per open form); a newer request with the
+    # same key cancels the one still in flight
+    request_key = serializers.CharField(max_length=128, required=False, allow_blank=True)
+    # Answer at once without the model and upgrade in the background;
+    # defaults to AI_PROVISIONAL_MODE
+    provisional = serializers.BooleanField(required=False, allow_null=True, default=None)
+
+class TaskBatchEnhancementInputSerializer(serializers.Serializer):
+    """Serializer for batch task enhancement input"""
+    task_names = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        min_length=1,
+        max_length=BATCH_ENHANCEMENT_MAX_ITEMS
+    )
 
 class CategorySerializer(serializers.Serializer):
     """Serializer for category with color validation"""
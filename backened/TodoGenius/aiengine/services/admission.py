@@ -0,0 +1,59 @@
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Dict, Optional
+from .llm_scheduler import INTERACTIVE, BATCH, AdmissionRejected, LLMScheduler, get_llm_scheduler
+
+__all__ = ['AdmissionController', 'AdmissionRejected', 'get_admission_controller']
+
+
+class AdmissionController:
+    """
+    Admission of one job class into the LLM scheduler
+
+    Interactive enhancements are admitted through a bounded queue with a
+    wait deadline: a full queue or an expired wait raises AdmissionRejected
+    with a Retry-After estimate, so the worst-case wait of an admitted
+    request stays bounded under overload. Batch work queues without a
+    deadline and only runs in the slots interactive work leaves free.
+    """
+
+    def __init__(self, job_class: str = INTERACTIVE, scheduler: Optional[LLMScheduler] = None):
+        self.job_class = job_class
+        self.scheduler = scheduler or get_llm_scheduler()
+
+    def acquire(self):
+        self.scheduler.acquire(self.job_class)
+
+    async def aacquire(self):
+        await self.scheduler.aacquire(self.job_class)
+
+    def release(self, service_time: Optional[float] = None):
+        self.scheduler.release(self.job_class, service_time)
+
+    @contextmanager
+    def slot(self):
+        with self.scheduler.slot(self.job_class):
+            yield
+
+    @asynccontextmanager
+    async def aslot(self):
+        async with self.scheduler.aslot(self.job_class):
+            yield
+
+    def stats(self) -> Dict[str, Any]:
+        return self.scheduler.stats()
+
+
+_controllers: Dict[str, AdmissionController] = {}
+_controllers_lock = threading.Lock()
+
+
+def get_admission_controller(job_class: str = INTERACTIVE) -> AdmissionController:
+    """Process-wide admission controller for a job class ('interactive' or 'batch')"""
+    if job_class not in (INTERACTIVE, BATCH):
+        raise ValueError(f"Unknown job class '{job_class}'")
+    controller = _controllers.get(job_class)
+    if controller is None:
+        with _controllers_lock:
+            controller = _controllers.setdefault(job_class, AdmissionController(job_class))
+    return controller
@@ -0,0 +1,233 @@
+import asyncio
+import time
+from datetime import datetime, timezone as dt_timezone
+from typing import Callable, Dict, List, Optional
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.utils import timezone
+from ..constants import BACKFILL_CHUNK_SIZE, BACKFILL_CONCURRENCY, BACKFILL_RATE_PER_MINUTE
+from ..models import BackfillCheckpoint
+from .prompt_context import PromptContextStore
+from .task_processor import TaskProcessor
+
+
+class TaskBackfill:
+    """
+    Enhance tasks that were created without AI (is_ai_enhanced=False)
+
+    Tasks are read in keyset order on (created_at, id), one chunk at a
+    time, and enhanced as a batch in the LLM scheduler's 'batch' class, so
+    they only take generation slots interactive requests leave free. The
+    suggestions only fill what the user left empty (description, deadline,
+    category, a default priority) and are written with one bulk_update per
+    chunk. The checkpoint is saved after every chunk.
+
+    An enhancement that failed because the backend was down or at capacity
+    stops the run before that task, so it is retried next time; any other
+    failure, including a generation that broke off before its JSON closed,
+    is counted and skipped, and the task stays unenhanced.
+    """
+
+    def __init__(self, name: str = 'tasks', chunk_size: Optional[int] = None, concurrency: Optional[int] = None,
+                 rate_per_minute: Optional[float] = None, dry_run: bool = False,
+                 log: Callable[[str], None] = print):
+        self.name = name
+        self.chunk_size = chunk_size or getattr(settings, 'AI_BACKFILL_CHUNK_SIZE', BACKFILL_CHUNK_SIZE)
+        self.concurrency = concurrency or getattr(settings, 'AI_BACKFILL_CONCURRENCY', BACKFILL_CONCURRENCY)
+        self.rate_per_minute = (rate_per_minute if rate_per_minute is not None
+                                else getattr(settings, 'AI_BACKFILL_RATE_PER_MINUTE', BACKFILL_RATE_PER_MINUTE))
+        self.dry_run = dry_run
+        self.log = log
+        self.Task = apps.get_model('tasks', 'Task')
+        self.default_priority = self.Task._meta.get_field('priority_score').default
+
+    def checkpoint(self, reset: bool = False) -> BackfillCheckpoint:
+        # Unsaved until the first chunk is written, so a dry run leaves no row
+        checkpoint = BackfillCheckpoint.objects.filter(name=self.name).first() or BackfillCheckpoint(name=self.name)
+        if reset:
+            checkpoint.last_created_at = checkpoint.last_id = checkpoint.finished_at = None
+            checkpoint.processed = checkpoint.updated = checkpoint.failed = 0
+            if not self.dry_run:
+                checkpoint.save()
+        return checkpoint
+
+    def _next_chunk(self, checkpoint: BackfillCheckpoint) -> List:
+        tasks = self.Task.objects.select_related('category').filter(is_ai_enhanced=False)
+        if checkpoint.last_created_at is not None:
+            tasks = tasks.filter(
+                Q(created_at__gt=checkpoint.last_created_at)
+                | Q(created_at=checkpoint.last_created_at, id__gt=checkpoint.last_id)
+            )
+        return list(tasks.order_by('created_at', 'id')[:self.chunk_size])
+
+    def run(self, max_tasks: Optional[int] = None, stop_at: Optional[datetime] = None,
+            reset: bool = False) -> Dict:
+        """
+        Process chunks until no tasks are left, `max_tasks` were handled,
+        `stop_at` passes or the backend becomes unavailable. Returns the
+        counters of this run.
+        """
+        checkpoint = self.checkpoint(reset)
+        processor = TaskProcessor(priority='batch')
+        totals = {'processed': 0, 'updated': 0, 'failed': 0, 'stopped': 'done'}
+        while True:
+            if max_tasks is not None and totals['processed'] >= max_tasks:
+                totals['stopped'] = 'max_tasks'
+                break
+            if stop_at is not None and timezone.now() >= stop_at:
+                totals['stopped'] = 'stop_at'
+                break
+            if not processor.client.is_available():
+                totals['stopped'] = 'backend_unavailable'
+                break
+            chunk = self._next_chunk(checkpoint)
+            if max_tasks is not None:
+                chunk = chunk[:max_tasks - totals['processed']]
+            if not chunk:
+                if not self.dry_run:
+                    checkpoint.finished_at = timezone.now()
+                    checkpoint.save()
+                break
+
+            started = time.monotonic()
+            results = asyncio.run(self._enhance(processor, [task.title for task in chunk]))
+            handled, changed, failed, retry = self._apply(chunk, results)
+            if handled:
+                last = handled[-1]
+                checkpoint.last_created_at, checkpoint.last_id = last.created_at, last.id
+            checkpoint.processed += len(handled)
+            checkpoint.updated += len(changed)
+            checkpoint.failed += failed
+            if not self.dry_run:
+                self._write(changed)
+                checkpoint.save()
+            totals['processed'] += len(handled)
+            totals['updated'] += len(changed)
+            totals['failed'] += failed
+            self.log(f"Chunk of {len(chunk)}: {len(changed)} updated, {failed} failed, "
+                     f"{time.monotonic() - started:.1f}s ({checkpoint.processed} processed in total)")
+            if retry:
+                totals['stopped'] = 'backend_unavailable'
+                break
+            self._throttle(len(chunk), time.monotonic() - started)
+        return totals
+
+    async def _enhance(self, processor: TaskProcessor, titles: List[str]) -> List[Dict]:
+        """Results of the batch enhancement, in the order of `titles`"""
+        results: List[Optional[Dict]] = [None] * len(titles)
+        async for item in processor.astream_batch_enhancement(titles, self.concurrency):
+            if 'index' in item:
+                results[item['index']] = item
+        return results
+
+    @staticmethod
+    def _retryable(result: Dict) -> bool:
+        meta = result.get('meta', {})
+        return meta.get('circuit') == 'open' or 'rejected' in meta
+
+    @staticmethod
+    def _incomplete(result: Dict) -> bool:
+        """Generation broke off: the data is partly fallback and must not be written"""
+        return result.get('meta', {}).get('complete') is False
+
+    def _apply(self, chunk: List, results: List[Dict]):
+        """
+        (tasks handled in keyset order, tasks with suggestions to write,
+        failures, whether to stop). Handling stops at the first retryable
+        failure so the checkpoint stays before it.
+        """
+        handled, changed, failed = [], [], 0
+        categories = self._categories(results)
+        for task, result in zip(chunk, results):
+            if self._retryable(result):
+                return handled, changed, failed, True
+            handled.append(task)
+            if not result['success'] or self._incomplete(result):
+                failed += 1
+                continue
+            fields = self._suggest(task, result['data'], categories)
+            self.log(f"  {task.title[:50]:<50}  {', '.join(fields) or 'nothing to fill'}")
+            changed.append(task)
+        return handled, changed, failed, False
+
+    @staticmethod
+    def _categories(results: List[Dict]) -> Dict:
+        """Existing categories suggested anywhere in the chunk, by lowercased name, in one query"""
+        names = {
+            result['data']['category']['name'].lower()
+            for result in results
+            if result.get('success') and (result['data'].get('category') or {}).get('name')
+        }
+        if not names:
+            return {}
+        Category = apps.get_model('tasks', 'Category')
+        categories = {}
+        for category in Category.objects.annotate(lower_name=Lower('name')).filter(lower_name__in=names):
+            categories.setdefault(category.lower_name, category)
+        return categories
+
+    def _suggest(self, task, data: Dict, categories: Dict) -> List[str]:
+        """Fill the task's empty fields from the enhancement; returns the fields filled"""
+        filled = []
+        if not (task.description or '').strip() and data.get('descriptions'):
+            descriptions = data['descriptions']
+            task.description = descriptions if isinstance(descriptions, str) else '\n'.join(descriptions)
+            filled.append('description')
+        deadline = self._parse_deadline(data.get('deadline'))
+        if task.deadline is None and deadline is not None and task.status in ('pending', 'in_progress'):
+            task.deadline = deadline
+            task.is_ai_suggested_deadline = True
+            filled.append('deadline')
+        category = data.get('category') or {}
+        if task.category_id is None and category.get('name') and not category.get('is_new'):
+            task.category = categories.get(category['name'].lower())
+            if task.category is not None:
+                filled.append('category')
+        if task.priority_score == self.default_priority and data.get('priority_score') is not None:
+            task.priority_score = data['priority_score']
+            filled.append('priority_score')
+        task.is_ai_enhanced = True
+        return filled
+
+    @staticmethod
+    def _parse_deadline(value) -> Optional[datetime]:
+        """Enhancement deadlines are UTC, formatted without an offset"""
+        try:
+            return datetime.fromisoformat(value).replace(tzinfo=dt_timezone.utc) if value else None
+        except (TypeError, ValueError):
+            return None
+
+    def _write(self, tasks: List):
+        """
+        bulk_update the suggestions, skipping tasks edited since the chunk
+        was read so a user's change is never overwritten
+        """
+        if not tasks:
+            return
+        with transaction.atomic():
+            current = dict(self.Task.objects.select_for_update()
+                           .filter(pk__in=[task.pk for task in tasks])
+                           .values_list('pk', 'updated_at'))
+            unchanged = [task for task in tasks if current.get(task.pk) == task.updated_at]
+            now = timezone.now()
+            for task in unchanged:
+                task.updated_at = now
+            # bulk_update skips Task.save, which would bump category usage once per task
+            self.Task.objects.bulk_update(unchanged, [
+                'description', 'deadline', 'is_ai_suggested_deadline', 'category',
+                'priority_score', 'is_ai_enhanced', 'updated_at'
+            ])
+        # bulk_update sends no post_save, so invalidate the prompt context here
+        PromptContextStore.invalidate()
+        if len(unchanged) < len(tasks):
+            self.log(f"  {len(tasks) - len(unchanged)} tasks edited meanwhile, skipped (run again with --reset to revisit)")
+
+    def _throttle(self, count: int, elapsed: float):
+        """Sleep so the run stays under rate_per_minute tasks"""
+        if self.rate_per_minute:
+            remaining = count * 60.0 / self.rate_per_minute - elapsed
+            if remaining > 0:
+                time.sleep(remaining)
@@ -0,0 +1,188 @@
+import asyncio
+import json
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Dict, List, Optional
+from django.conf import settings
+from ..constants import BATCHING, BATCH_WINDOW_MS, BATCH_MAX_SIZE, BATCH_MAX_IN_FLIGHT, BATCH_TIMEOUT
+from .inference_engine import BaseInferenceEngine
+
+
+class _BatchRequest:
+    def __init__(self, prompt: str, max_tokens: Optional[int], schema: Optional[Dict]):
+        self.prompt = prompt
+        self.max_tokens = max_tokens
+        self.schema = schema
+        self.future: Future = Future()
+        self.enqueued_at = time.monotonic()
+
+    @property
+    def group(self) -> tuple:
+        # Only requests with identical generation parameters can share a batch
+        return (self.max_tokens, json.dumps(self.schema) if self.schema is not None else None)
+
+
+class BatchScheduler:
+    """
+    Dynamic micro-batching of completion requests
+
+    A collector thread takes the first queued request, keeps collecting
+    for AI_BATCH_WINDOW_MS or until AI_BATCH_MAX_SIZE requests are waiting,
+    and hands the batch to the engine's generate_completion_batch as one
+    generation. Results are demultiplexed back to each caller's future.
+    Batches run on a small dispatch pool so the next window fills while
+    the previous batch decodes.
+    """
+
+    def __init__(self, engine: BaseInferenceEngine, window_ms: Optional[float] = None,
+                 max_batch_size: Optional[int] = None, max_in_flight: Optional[int] = None):
+        self.engine = engine
+        self.window = (window_ms if window_ms is not None
+                       else getattr(settings, 'AI_BATCH_WINDOW_MS', BATCH_WINDOW_MS)) / 1000.0
+        self.max_batch_size = max_batch_size or getattr(settings, 'AI_BATCH_MAX_SIZE', BATCH_MAX_SIZE)
+        self.timeout = getattr(settings, 'AI_BATCH_TIMEOUT', BATCH_TIMEOUT)
+        self._queue: 'queue.Queue[_BatchRequest]' = queue.Queue()
+        self._dispatch = ThreadPoolExecutor(
+            max_workers=max_in_flight or getattr(settings, 'AI_BATCH_MAX_IN_FLIGHT', BATCH_MAX_IN_FLIGHT),
+            thread_name_prefix='llm-batch'
+        )
+        self._stats_lock = threading.Lock()
+        self._recent = deque(maxlen=100)
+        self._totals = {'batches': 0, 'requests': 0, 'failed_batches': 0}
+        self._size_histogram: Dict[int, int] = {}
+        self._collector = threading.Thread(target=self._collect, name='llm-batch-collector', daemon=True)
+        self._collector.start()
+
+    def submit(self, prompt: str, max_tokens: Optional[int] = None, schema: Optional[Dict] = None) -> Future:
+        """Queue a completion; the future resolves to a generate_completion-shaped result"""
+        request = _BatchRequest(prompt, max_tokens, schema)
+        self._queue.put(request)
+        return request.future
+
+    def generate(self, prompt: str, max_tokens: Optional[int] = None, schema: Optional[Dict] = None) -> Dict[str, Any]:
+        future = self.submit(prompt, max_tokens, schema)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # Dropped from its batch if still queued
+            future.cancel()
+            return self._timeout_result()
+
+    async def agenerate(self, prompt: str, max_tokens: Optional[int] = None, schema: Optional[Dict] = None) -> Dict[str, Any]:
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(self.submit(prompt, max_tokens, schema)), self.timeout)
+        except asyncio.TimeoutError:
+            return self._timeout_result()
+
+    def _timeout_result(self) -> Dict[str, Any]:
+        return BaseInferenceEngine._error_result(f"Batched generation timed out after {self.timeout} seconds", self.timeout)
+
+    def _collect(self):
+        while True:
+            first = self._queue.get()
+            batch = [first]
+            deadline = first.enqueued_at + self.window
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            groups: Dict[tuple, List[_BatchRequest]] = {}
+            for request in batch:
+                groups.setdefault(request.group, []).append(request)
+            for requests in groups.values():
+                self._dispatch.submit(self._run_batch, requests)
+
+    def _run_batch(self, requests: List[_BatchRequest]):
+        # Requests whose caller was cancelled while queued are dropped here
+        requests = [request for request in requests if request.future.set_running_or_notify_cancel()]
+        if not requests:
+            return
+        started = time.monotonic()
+        first = requests[0]
+        try:
+            results = self.engine.generate_completion_batch(
+                [request.prompt for request in requests], first.max_tokens, first.schema
+            )
+        except Exception as e:
+            print(f"Batched generation failed: {str(e)}")
+            results = [BaseInferenceEngine._error_result(f"Batched generation failed: {str(e)}", 0.0)] * len(requests)
+        finished = time.monotonic()
+
+        if len(results) != len(requests):
+            # Never leave a caller waiting on a result the engine did not return
+            print(f"Batched generation returned {len(results)} results for {len(requests)} prompts")
+            missing = BaseInferenceEngine._error_result("Batched generation returned no result for this prompt",
+                                                        finished - started)
+            results = list(results[:len(requests)]) + [missing] * (len(requests) - len(results))
+
+        for request, result in zip(requests, results):
+            request.future.set_result(dict(result, batch_size=len(requests)))
+        self._record(requests, started, finished, results)
+
+    def _record(self, requests: List[_BatchRequest], started: float, finished: float, results: List[Dict]):
+        size = len(requests)
+        with self._stats_lock:
+            self._totals['batches'] += 1
+            self._totals['requests'] += size
+            if not any(result.get('success') for result in results):
+                self._totals['failed_batches'] += 1
+            self._size_histogram[size] = self._size_histogram.get(size, 0) + 1
+            self._recent.append({
+                'size': size,
+                'queue_wait_ms': round((started - min(r.enqueued_at for r in requests)) * 1000, 2),
+                'generation_ms': round((finished - started) * 1000, 2),
+            })
+
+    def stats(self) -> Dict[str, Any]:
+        """Batch size and latency figures for tuning the window"""
+        with self._stats_lock:
+            recent = list(self._recent)
+            stats = dict(self._totals)
+            stats['size_histogram'] = dict(sorted(self._size_histogram.items()))
+        stats['window_ms'] = self.window * 1000
+        stats['max_batch_size'] = self.max_batch_size
+        stats['mean_batch_size'] = round(stats['requests'] / stats['batches'], 2) if stats['batches'] else 0.0
+        if recent:
+            stats['recent_mean_queue_wait_ms'] = round(sum(b['queue_wait_ms'] for b in recent) / len(recent), 2)
+            stats['recent_mean_generation_ms'] = round(sum(b['generation_ms'] for b in recent) / len(recent), 2)
+        stats['recent_batches'] = recent[-10:]
+        stats['queued'] = self._queue.qsize()
+        return stats
+
+
+_schedulers: Dict[str, BatchScheduler] = {}
+_schedulers_lock = threading.Lock()
+_unsupported = set()
+
+
+def get_batch_scheduler(engine: BaseInferenceEngine) -> Optional[BatchScheduler]:
+    """
+    Process-wide BatchScheduler for the engine's backend, or None when
+    AI_BATCHING is off or the engine cannot decode a batch natively (its
+    generate_completion_batch would only run the prompts one by one). The
+    first engine instance seen is the one the scheduler dispatches through.
+    """
+    if not getattr(settings, 'AI_BATCHING', BATCHING):
+        return None
+    key = f"{type(engine).__name__}:{engine.model_name}"
+    if not engine.native_batching:
+        if key not in _unsupported:
+            _unsupported.add(key)
+            print(f"AI_BATCHING ignored: {type(engine).__name__} has no native batched decoding")
+        return None
+    scheduler = _schedulers.get(key)
+    if scheduler is None:
+        with _schedulers_lock:
+            scheduler = _schedulers.get(key)
+            if scheduler is None:
+                scheduler = _schedulers[key] = BatchScheduler(engine)
+    return scheduler
@@ -0,0 +1,140 @@
+import asyncio
+import threading
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Dict, Optional
+
+
+class RequestSuperseded(Exception):
+    """A newer request with the same request key replaced this one"""
+
+    def __init__(self, key: str):
+        super().__init__(f"Request '{key}' was superseded by a newer request")
+        self.key = key
+
+
+class _Entry:
+    """The request currently holding a key and the task doing its work"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.task: Optional[asyncio.Task] = None
+        self.superseded = False
+
+    def cancel(self):
+        self.superseded = True
+        if self.task is not None:
+            self.loop.call_soon_threadsafe(self.task.cancel)
+
+
+class CancellationRegistry:
+    """
+    Latest enhancement request per client-supplied request key
+
+    A debounced form sends a new enhancement for every pause in typing.
+    Running a request under its key cancels the previous request for the
+    same key; the cancellation reaches the generation as CancelledError,
+    which closes the upstream stream (LM Studio) or stops the decode
+    (llama.cpp). A client disconnect cancels the view the same way.
+
+    Also keeps the token accounting: tokens decoded by generations that
+    were cancelled, and an estimate of the tokens they would still have
+    produced, from the mean length of generations that ran to completion.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[str, _Entry] = {}
+        self._completed_tokens: deque = deque(maxlen=200)
+        self._stats = {
+            'superseded': 0,
+            'disconnected': 0,
+            'generations_cancelled': 0,
+            'tokens_decoded_before_cancel': 0,
+            'tokens_saved': 0,
+        }
+
+    def _claim(self, key: str) -> _Entry:
+        entry = _Entry(asyncio.get_running_loop())
+        with self._lock:
+            previous = self._entries.get(key)
+            self._entries[key] = entry
+            if previous is not None:
+                self._stats['superseded'] += 1
+        if previous is not None:
+            previous.cancel()
+        return entry
+
+    def _release(self, key: str, entry: _Entry):
+        with self._lock:
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+
+    def _cancelled(self, key: str, entry: _Entry):
+        """Translate a CancelledError: superseded requests raise RequestSuperseded"""
+        if entry.superseded:
+            raise RequestSuperseded(key)
+        with self._lock:
+            self._stats['disconnected'] += 1
+
+    async def run(self, key: Optional[str], work: Awaitable[Any]) -> Any:
+        """Await `work` as the current request for `key`; without a key, just await it"""
+        if not key:
+            return await work
+        entry = self._claim(key)
+        entry.task = asyncio.ensure_future(work)
+        try:
+            return await entry.task
+        except asyncio.CancelledError:
+            self._cancelled(key, entry)
+            raise
+        finally:
+            self._release(key, entry)
+
+    async def stream(self, key: Optional[str], events: AsyncIterator) -> AsyncIterator:
+        """
+        Iterate `events` as the current request for `key`. Each step runs as
+        its own task so a newer request can cancel the pending one.
+        """
+        if not key:
+            async for event in events:
+                yield event
+            return
+        entry = self._claim(key)
+        try:
+            while not entry.superseded:
+                entry.task = asyncio.ensure_future(events.__anext__())
+                try:
+                    event = await entry.task
+                except StopAsyncIteration:
+                    return
+                except asyncio.CancelledError:
+                    self._cancelled(key, entry)
+                    raise
+                yield event
+            raise RequestSuperseded(key)
+        finally:
+            self._release(key, entry)
+            await events.aclose()
+
+    def record_completed(self, tokens: int):
+        with self._lock:
+            self._completed_tokens.append(tokens)
+
+    def record_cancelled(self, tokens: int, max_tokens: int):
+        """A generation stopped after decoding `tokens` of at most `max_tokens` tokens"""
+        with self._lock:
+            if self._completed_tokens:
+                expected = min(max_tokens, sum(self._completed_tokens) / len(self._completed_tokens))
+            else:
+                expected = max_tokens
+            self._stats['generations_cancelled'] += 1
+            self._stats['tokens_decoded_before_cancel'] += tokens
+            self._stats['tokens_saved'] += max(0, round(expected - tokens))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats, active_keys=len(self._entries))
+
+
+# Process-wide registry for enhancement requests
+enhancement_cancellations = CancellationRegistry()
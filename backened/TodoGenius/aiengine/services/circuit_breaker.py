@@ -0,0 +1,244 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+from django.conf import settings
+from ..constants import CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RECOVERY_TIMEOUT, HEALTH_CHECK_INTERVAL
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a backend whose circuit is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit for {name} is open, retry in {retry_after:.0f} seconds")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open circuit breaker for one backend
+
+    closed:    requests flow; consecutive failures are counted and the
+               circuit opens once they reach the threshold.
+    open:      requests are refused immediately until the recovery
+               timeout passes (or the health monitor sees the backend
+               answer again).
+    half_open: a single trial request is let through; its success closes
+               the circuit, its failure opens it again. A trial that ends
+               without an outcome (cancelled, dropped) must be released
+               with cancel_trial; one still unreleased after the recovery
+               timeout is treated as lost once a probe succeeds.
+
+    Failed health probes are counted separately from failed requests and
+    open the circuit once they reach the same threshold.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_threshold: Optional[int] = None,
+                 recovery_timeout: Optional[float] = None):
+        self.name = name
+        self.failure_threshold = failure_threshold or getattr(
+            settings, 'AI_CIRCUIT_FAILURE_THRESHOLD', CIRCUIT_FAILURE_THRESHOLD)
+        self.recovery_timeout = recovery_timeout or getattr(
+            settings, 'AI_CIRCUIT_RECOVERY_TIMEOUT', CIRCUIT_RECOVERY_TIMEOUT)
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._probe_failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._trial_started_at = 0.0
+        self._last_error: Optional[str] = None
+        self._rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = False
+
+    def _open(self, error: Optional[str]):
+        if self._state != self.OPEN:
+            print(f"Circuit for {self.name} opened: {error}")
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._trial_in_flight = False
+        self._last_error = error
+
+    def retry_after(self) -> float:
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0.0
+            return max(0.0, self.recovery_timeout - (time.monotonic() - self._opened_at))
+
+    def allow_request(self) -> bool:
+        """True if a request may go to the backend now"""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                self._trial_started_at = time.monotonic()
+                return True
+            self._rejected += 1
+            return False
+
+    def is_open(self) -> bool:
+        """Non-consuming check used to fail fast before any work is done"""
+        with self._lock:
+            self._maybe_half_open()
+            return self._state == self.OPEN
+
+    def check(self):
+        """Raise CircuitOpenError unless a request may go through"""
+        if not self.allow_request():
+            raise CircuitOpenError(self.name, self.retry_after())
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                print(f"Circuit for {self.name} closed")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+            self._last_error = None
+
+    def record_failure(self, error: Optional[str] = None):
+        with self._lock:
+            self._failures += 1
+            self._last_error = error
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._open(error)
+
+    def cancel_trial(self):
+        """A request let through was abandoned before it had an outcome"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def probe_failed(self, error: Optional[str] = None):
+        """The health monitor could not reach the backend: open after `failure_threshold` in a row"""
+        with self._lock:
+            self._probe_failures += 1
+            self._last_error = error
+            if self._probe_failures >= self.failure_threshold:
+                self._open(error)
+
+    def probe_succeeded(self):
+        """The backend answers again: let one real request confirm it"""
+        with self._lock:
+            self._probe_failures = 0
+            if self._state == self.OPEN:
+                self._state = self.HALF_OPEN
+                self._trial_in_flight = False
+            elif (self._state == self.HALF_OPEN and self._trial_in_flight
+                  and time.monotonic() - self._trial_started_at >= self.recovery_timeout):
+                # The trial never reported back: let another one through
+                print(f"Circuit for {self.name}: trial request lost, allowing a new one")
+                self._trial_in_flight = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            self._maybe_half_open()
+            retry_after = 0.0
+            if self._state == self.OPEN:
+                retry_after = max(0.0, self.recovery_timeout - (time.monotonic() - self._opened_at))
+            return {
+                'name': self.name,
+                'state': self._state,
+                'consecutive_failures': self._failures,
+                'consecutive_probe_failures': self._probe_failures,
+                'failure_threshold': self.failure_threshold,
+                'retry_after': round(retry_after, 1),
+                'rejected_requests': self._rejected,
+                'last_error': self._last_error,
+            }
+
+
+class HealthMonitor:
+    """
+    Background prober that polls a backend's health check and caches it
+
+    Requests read the cached result instead of paying for their own health
+    call, and the probe result drives the circuit breaker: consecutive
+    failed probes open it, a successful probe moves an open circuit to
+    half-open.
+    """
+
+    def __init__(self, name: str, probe: Callable[[], Dict[str, Any]], breaker: CircuitBreaker,
+                 interval: Optional[float] = None):
+        self.name = name
+        self.probe = probe
+        self.breaker = breaker
+        self.interval = interval or getattr(settings, 'AI_HEALTH_CHECK_INTERVAL', HEALTH_CHECK_INTERVAL)
+        self._result: Optional[Dict[str, Any]] = None
+        self._checked_at: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'health-{name}', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.poll()
+            self._stop.wait(self.interval)
+
+    def poll(self) -> Dict[str, Any]:
+        try:
+            result = self.probe()
+        except Exception as e:
+            result = {'status': 'unhealthy', 'error': str(e)}
+
+        if result.get('status') == 'healthy':
+            self.breaker.probe_succeeded()
+        else:
+            self.breaker.probe_failed(result.get('error'))
+
+        self._result = result
+        self._checked_at = time.time()
+        return result
+
+    def cached_result(self) -> Optional[Dict[str, Any]]:
+        """Last probe result with its age, or None before the first probe"""
+        if self._result is None:
+            return None
+        return dict(self._result, checked_at=self._checked_at,
+                    age_seconds=round(time.time() - self._checked_at, 1))
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_monitors: Dict[str, HealthMonitor] = {}
+_registry_lock = threading.RLock()
+
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    """Process-wide breaker for the backend identified by `name` (its base URL)"""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _registry_lock:
+            breaker = _breakers.setdefault(name, CircuitBreaker(name))
+    return breaker
+
+
+def get_health_monitor(name: str, probe: Callable[[], Dict[str, Any]]) -> HealthMonitor:
+    """Process-wide health monitor for `name`, started on first use"""
+    monitor = _monitors.get(name)
+    if monitor is None:
+        with _registry_lock:
+            monitor = _monitors.get(name)
+            if monitor is None:
+                monitor = HealthMonitor(name, probe, get_circuit_breaker(name))
+                _monitors[name] = monitor
+                monitor.start()
+    return monitor
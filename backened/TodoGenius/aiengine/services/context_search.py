@@ -0,0 +1,288 @@
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from ..constants import CONTEXT_SEARCH_BACKEND, CONTEXT_SEARCH_WINDOW_DAYS
+
+_TOKEN_RE = re.compile(r"[a-z0-9]{2,}")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have he her his i if in into is it its me my no not of on
+or our she so than that the their them then there these they this to too up us was we were what when
+where which who will with you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased alphanumeric terms without stopwords"""
+    return [term for term in _TOKEN_RE.findall((text or '').lower()) if term not in STOPWORDS]
+
+
+def format_context(ctx, score: Optional[float] = None) -> Dict[str, Any]:
+    """The dict shape TaskProcessor puts into prompts"""
+    formatted = {
+        'content': ctx.content,
+        'source_type': ctx.source_type,
+        'context_date': ctx.context_date.isoformat() if ctx.context_date else None,
+        'created_at': ctx.created_at.isoformat() if ctx.created_at else None,
+        'is_processed': ctx.is_processed
+    }
+    if score is not None:
+        formatted['score'] = round(score, 4)
+    return formatted
+
+
+class BM25Index:
+    """
+    Incremental inverted index with Okapi BM25 scoring
+
+    Postings map each term to {doc id: term frequency}; adding or removing a
+    document touches only its own terms, so the index is kept current one
+    row at a time. A query only walks the postings of its own terms.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[Any, int]] = {}
+        self._doc_terms: Dict[Any, Tuple[str, ...]] = {}
+        self._lengths: Dict[Any, int] = {}
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self._lengths)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._lengths
+
+    def add(self, doc_id, text: str):
+        if doc_id in self._lengths:
+            self.remove(doc_id)
+        terms = Counter(tokenize(text))
+        for term, frequency in terms.items():
+            self._postings.setdefault(term, {})[doc_id] = frequency
+        length = sum(terms.values())
+        self._doc_terms[doc_id] = tuple(terms)
+        self._lengths[doc_id] = length
+        self._total_length += length
+
+    def remove(self, doc_id):
+        length = self._lengths.pop(doc_id, None)
+        if length is None:
+            return
+        self._total_length -= length
+        for term in self._doc_terms.pop(doc_id):
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+
+    def search(self, query: str, k: int, accept=None) -> List[Tuple[Any, float]]:
+        """
+        Top-k (doc id, score) for the query; `accept(doc_id)` filters
+        candidates. Terms are scored rarest first (MaxScore): once the k-th
+        best score beats the most the remaining common terms could add, they
+        only update documents already in the running, not scan for new ones.
+        """
+        count = len(self._lengths)
+        if not count:
+            return []
+        average_length = self._total_length / count or 1.0
+        terms = []
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if postings:
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                terms.append((idf, postings))
+        terms.sort(key=lambda item: item[0], reverse=True)
+        # Upper bound of what the terms from position i onwards can add to a score
+        bounds = [0.0] * (len(terms) + 1)
+        for i in range(len(terms) - 1, -1, -1):
+            bounds[i] = bounds[i + 1] + terms[i][0] * (self.k1 + 1)
+
+        scores: Dict[Any, float] = {}
+        for i, (idf, postings) in enumerate(terms):
+            if len(scores) >= k and heapq.nlargest(k, scores.values())[-1] >= bounds[i]:
+                matches = [(doc_id, postings[doc_id]) for doc_id in scores if doc_id in postings]
+            else:
+                matches = postings.items()
+            for doc_id, frequency in matches:
+                if doc_id not in scores:
+                    if accept is not None and not accept(doc_id):
+                        continue
+                    scores[doc_id] = 0.0
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / average_length)
+                scores[doc_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+
+class InMemoryContextSearch:
+    """
+    BM25 over every Context row, held in process memory
+
+    Loaded from the database on first search and then kept current by the
+    Context post_save / post_delete signals (aiengine/signals.py). Meant for
+    development, tests and single-process deployments; with several worker
+    processes each keeps its own copy.
+    """
+
+    name = 'memory'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = BM25Index()
+        self._docs: Dict[Any, Dict[str, Any]] = {}
+        self._created: Dict[Any, datetime] = {}
+        self._loaded = False
+        # Changes signalled while the table is being loaded: pk -> row, or None once deleted
+        self._pending: Dict[Any, Any] = {}
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        Context = apps.get_model('context', 'Context')
+        rows = list(Context.objects.all())
+        with self._lock:
+            if not self._loaded:
+                for ctx in rows:
+                    self._add(ctx)
+                for pk, ctx in self._pending.items():
+                    if ctx is None:
+                        self._remove(pk)
+                    else:
+                        self._add(ctx)
+                self._pending.clear()
+                self._loaded = True
+                print(f"Context search index loaded with {len(self._index)} entries")
+
+    def _add(self, ctx):
+        self._index.add(ctx.pk, ctx.content)
+        self._docs[ctx.pk] = format_context(ctx)
+        self._created[ctx.pk] = ctx.created_at
+
+    def _remove(self, pk):
+        self._index.remove(pk)
+        self._docs.pop(pk, None)
+        self._created.pop(pk, None)
+
+    def index(self, ctx):
+        """Add or refresh one Context row"""
+        with self._lock:
+            if self._loaded:
+                self._add(ctx)
+            else:
+                self._pending[ctx.pk] = ctx
+
+    def remove(self, pk):
+        with self._lock:
+            if self._loaded:
+                self._remove(pk)
+            else:
+                self._pending[pk] = None
+
+    def search(self, query: str, k: int, since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        self._ensure_loaded()
+        with self._lock:
+            accept = None
+            if since is not None:
+                accept = lambda pk: self._created.get(pk) is not None and self._created[pk] >= since
+            hits = self._index.search(query, k, accept)
+            return [dict(self._docs[pk], score=round(score, 4)) for pk, score in hits]
+
+    async def asearch(self, query: str, k: int, since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        if not self._loaded:
+            await sync_to_async(self._ensure_loaded)()
+        return self.search(query, k, since)
+
+    def stats(self) -> Dict[str, Any]:
+        return {'backend': self.name, 'loaded': self._loaded, 'documents': len(self._index)}
+
+
+class PostgresContextSearch:
+    """
+    Full-text search on Postgres
+
+    Ranks rows with ts_rank_cd over to_tsvector('english', content); the
+    GIN expression index context_content_fts_idx on the same expression
+    keeps lookups off a sequential scan. The database maintains the index,
+    so the signal hooks are no-ops here.
+    """
+
+    name = 'postgres'
+
+    def _queryset(self, query: str, k: int, since: Optional[datetime]):
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+        terms = tokenize(query)
+        if not terms:
+            return None
+        Context = apps.get_model('context', 'Context')
+        vector = SearchVector('content', config='english')
+        # Any term may match (OR); terms are plain alphanumerics, safe for a raw tsquery
+        ts_query = SearchQuery(' | '.join(sorted(set(terms))), config='english', search_type='raw')
+        queryset = Context.objects.annotate(search=vector).filter(search=ts_query)
+        if since is not None:
+            queryset = queryset.filter(created_at__gte=since)
+        return queryset.annotate(
+            rank=SearchRank(vector, ts_query, cover_density=True)
+        ).order_by('-rank', '-created_at')[:k]
+
+    def index(self, ctx):
+        pass
+
+    def remove(self, pk):
+        pass
+
+    def search(self, query: str, k: int, since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        queryset = self._queryset(query, k, since)
+        if queryset is None:
+            return []
+        return [format_context(ctx, ctx.rank) for ctx in queryset]
+
+    async def asearch(self, query: str, k: int, since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        queryset = self._queryset(query, k, since)
+        if queryset is None:
+            return []
+        return [format_context(ctx, ctx.rank) async for ctx in queryset]
+
+    def stats(self) -> Dict[str, Any]:
+        return {'backend': self.name}
+
+
+_search = None
+_search_lock = threading.Lock()
+
+
+def context_search_since() -> Optional[datetime]:
+    """Oldest context considered, or None to search all of it"""
+    days = getattr(settings, 'AI_CONTEXT_SEARCH_WINDOW_DAYS', CONTEXT_SEARCH_WINDOW_DAYS)
+    return timezone.now() - timedelta(days=days) if days else None
+
+
+def get_context_search():
+    """
+    Process-wide context search backend, chosen by AI_CONTEXT_SEARCH_BACKEND:
+    'postgres', 'memory', 'off' (newest rows only), or None to use Postgres
+    when the database is Postgres and the in-memory index otherwise
+    """
+    global _search
+    if _search is None:
+        with _search_lock:
+            if _search is None:
+                backend = getattr(settings, 'AI_CONTEXT_SEARCH_BACKEND', CONTEXT_SEARCH_BACKEND)
+                if backend is None:
+                    backend = 'postgres' if connection.vendor == 'postgresql' else 'memory'
+                if backend == 'off':
+                    return None
+                if backend not in ('postgres', 'memory'):
+                    raise ValueError(f"Unknown AI_CONTEXT_SEARCH_BACKEND '{backend}'")
+                _search = PostgresContextSearch() if backend == 'postgres' else InMemoryContextSearch()
+    return _search
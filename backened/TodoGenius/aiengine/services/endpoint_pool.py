@@ -0,0 +1,162 @@
+import itertools
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from django.conf import settings
+from ..constants import (
+    HEALTH_MONITOR, HEDGING, HEDGE_PERCENTILE, HEDGE_MIN_SAMPLES, HEDGE_MIN_DELAY, LATENCY_WINDOW
+)
+from .circuit_breaker import get_circuit_breaker, get_health_monitor
+
+
+class Endpoint:
+    """One inference server: its circuit breaker, health monitor and load"""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip('/')
+        self.breaker = get_circuit_breaker(self.base_url)
+        self.monitor = None
+        self.outstanding = 0
+        self.requests = 0
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'base_url': self.base_url,
+            'outstanding': self.outstanding,
+            'requests': self.requests,
+            'circuit': self.breaker.snapshot(),
+        }
+
+
+class EndpointPool:
+    """
+    Least-outstanding-requests routing over several inference servers
+
+    acquire() picks the endpoint with the fewest requests in flight whose
+    circuit lets a request through (rotating between ties), and release()
+    returns it. Latencies of successful calls are kept per kind ('response'
+    for whole generations, 'ttft' for time to first streamed token) so the
+    client can hedge a slow call after the pool's p95.
+    """
+
+    def __init__(self, base_urls: Iterable[str]):
+        self.endpoints: List[Endpoint] = [Endpoint(url) for url in base_urls]
+        self._lock = threading.Lock()
+        self._rotation = itertools.count()
+        self.hedging = getattr(settings, 'AI_HEDGING', HEDGING)
+        self.hedge_percentile = getattr(settings, 'AI_HEDGE_PERCENTILE', HEDGE_PERCENTILE)
+        self.hedge_min_samples = getattr(settings, 'AI_HEDGE_MIN_SAMPLES', HEDGE_MIN_SAMPLES)
+        self.hedge_min_delay = getattr(settings, 'AI_HEDGE_MIN_DELAY', HEDGE_MIN_DELAY)
+        window = getattr(settings, 'AI_LATENCY_WINDOW', LATENCY_WINDOW)
+        self._latencies = {'response': deque(maxlen=window), 'ttft': deque(maxlen=window)}
+        self._hedge_stats = {'hedged': 0, 'hedge_won': 0}
+
+    def __iter__(self):
+        return iter(self.endpoints)
+
+    def __len__(self):
+        return len(self.endpoints)
+
+    def start_health_monitors(self, make_probe: Callable[[Endpoint], Callable[[], Dict[str, Any]]]):
+        if not getattr(settings, 'AI_HEALTH_MONITOR', HEALTH_MONITOR):
+            return
+        for endpoint in self.endpoints:
+            if endpoint.monitor is None:
+                endpoint.monitor = get_health_monitor(endpoint.base_url, make_probe(endpoint))
+
+    def acquire(self, exclude: Tuple[Endpoint, ...] = ()) -> Optional[Endpoint]:
+        """Reserve the least loaded endpoint that accepts requests, or None"""
+        with self._lock:
+            offset = next(self._rotation) % len(self.endpoints)
+            rotated = self.endpoints[offset:] + self.endpoints[:offset]
+            candidates = sorted(
+                (endpoint for endpoint in rotated if endpoint not in exclude),
+                key=lambda endpoint: endpoint.outstanding
+            )
+            for endpoint in candidates:
+                if endpoint.breaker.allow_request():
+                    endpoint.outstanding += 1
+                    endpoint.requests += 1
+                    return endpoint
+        return None
+
+    def release(self, endpoint: Endpoint, latency: Optional[float] = None, kind: str = 'response'):
+        """
+        Called in a finally around every request. A half-open trial whose
+        outcome was not recorded (cancelled, dropped) is cleared here so it
+        cannot hold the circuit half-open.
+        """
+        endpoint.breaker.cancel_trial()
+        with self._lock:
+            endpoint.outstanding -= 1
+            if latency is not None:
+                self._latencies[kind].append(latency)
+
+    def record_latency(self, latency: float, kind: str):
+        with self._lock:
+            self._latencies[kind].append(latency)
+
+    def hedge_delay(self, kind: str = 'response') -> Optional[float]:
+        """
+        Seconds to wait before sending a duplicate request, or None when
+        hedging is off, there is no second endpoint, or too few samples
+        """
+        if not self.hedging or len(self.endpoints) < 2:
+            return None
+        with self._lock:
+            samples = sorted(self._latencies[kind])
+        if len(samples) < self.hedge_min_samples:
+            return None
+        index = min(len(samples) - 1, int(len(samples) * self.hedge_percentile / 100))
+        return max(self.hedge_min_delay, samples[index])
+
+    def record_hedge(self, won: bool):
+        with self._lock:
+            self._hedge_stats['hedged'] += 1
+            if won:
+                self._hedge_stats['hedge_won'] += 1
+
+    def is_available(self, exclude: Tuple[Endpoint, ...] = ()) -> bool:
+        return any(not endpoint.breaker.is_open() for endpoint in self.endpoints if endpoint not in exclude)
+
+    def circuit_state(self) -> Dict[str, Any]:
+        """Pool-wide view: open only when every endpoint's circuit is open"""
+        snapshots = [endpoint.breaker.snapshot() for endpoint in self.endpoints]
+        states = {snapshot['state'] for snapshot in snapshots}
+        if states == {'open'}:
+            state = 'open'
+        elif 'closed' in states:
+            state = 'closed'
+        else:
+            state = 'half_open'
+        return {
+            'state': state,
+            'retry_after': min(snapshot['retry_after'] for snapshot in snapshots),
+            'endpoints': snapshots,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._hedge_stats)
+        stats['hedge_delay'] = {kind: self.hedge_delay(kind) for kind in self._latencies}
+        stats['endpoints'] = [endpoint.snapshot() for endpoint in self.endpoints]
+        return stats
+
+
+_pools: Dict[Tuple[str, ...], EndpointPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_endpoint_pool(base_urls: Iterable[str]) -> EndpointPool:
+    """Process-wide pool for a set of base URLs"""
+    key = tuple(url.rstrip('/') for url in base_urls)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = EndpointPool(key)
+    return pool
@@ -0,0 +1,210 @@
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from django.conf import settings
+from ..constants import (
+    ENHANCEMENT_CACHE, ENHANCEMENT_CACHE_TTL, ENHANCEMENT_CACHE_MAX_ENTRIES,
+    ENHANCEMENT_CACHE_DISK_SIZE_LIMIT
+)
+from ..utils.prompt_templates import ENHANCEMENT_SYSTEM_PROMPT
+
+
+class EnhancementCache:
+    """
+    Two-tier cache of finished enhancement results
+
+    Entries are content-addressed: the key hashes the normalised task name,
+    the model and sampling parameters, the system prompt and a fingerprint
+    of the tasks/context/categories snapshot the prompt was built from, so
+    any change to the inputs is a miss rather than a stale hit. A bounded
+    in-memory LRU serves repeats within a process; a diskcache tier with
+    its own size limit shares them across workers and restarts. Both tiers
+    expire entries after the TTL.
+
+    The disk tier is SQLite, so it never runs on an event loop: aget reads
+    it in a thread, and writes go to a background writer thread (the
+    memory tier serves the entry in the meantime).
+    """
+
+    _MISSING = object()
+
+    def __init__(self, ttl: Optional[float] = None, max_entries: Optional[int] = None,
+                 directory: Optional[str] = None, disk_size_limit: Optional[int] = None):
+        self.ttl = ttl if ttl is not None else getattr(settings, 'AI_ENHANCEMENT_CACHE_TTL', ENHANCEMENT_CACHE_TTL)
+        self.max_entries = max_entries or getattr(settings, 'AI_ENHANCEMENT_CACHE_MAX_ENTRIES', ENHANCEMENT_CACHE_MAX_ENTRIES)
+        self._memory: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        self._disk = self._open_disk_cache(
+            directory or getattr(settings, 'AI_ENHANCEMENT_CACHE_DIR', None)
+            or os.path.join(tempfile.gettempdir(), 'todogenius-enhancements'),
+            disk_size_limit or getattr(settings, 'AI_ENHANCEMENT_CACHE_DISK_SIZE_LIMIT', ENHANCEMENT_CACHE_DISK_SIZE_LIMIT)
+        )
+        # One thread keeps disk writes in order
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='enhancement-cache-writer') \
+            if self._disk is not None else None
+
+    @staticmethod
+    def _open_disk_cache(directory: str, size_limit: int):
+        try:
+            import diskcache
+            return diskcache.Cache(directory, size_limit=size_limit, eviction_policy='least-recently-used')
+        except Exception as e:
+            print(f"Enhancement disk cache unavailable, using memory only: {str(e)}")
+            return None
+
+    @staticmethod
+    def normalize_task_name(task_name: str) -> str:
+        return re.sub(r'\s+', ' ', task_name or '').strip().casefold()
+
+    @staticmethod
+    def fingerprint(*parts: Any) -> str:
+        """Stable hash of JSON-serialisable prompt inputs"""
+        payload = json.dumps(parts, sort_keys=True, default=str, separators=(',', ':'))
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def context_key(cls, engine, recent_tasks: List[Dict], recent_context: List[Dict],
+                    existing_categories: List[Dict]) -> str:
+        """Fingerprint of every prompt input except the task name"""
+        return cls.fingerprint(
+            type(engine).__name__,
+            engine.model_name,
+            engine.temperature,
+            engine.max_tokens,
+            engine.constrained_output,
+            cls.fingerprint(ENHANCEMENT_SYSTEM_PROMPT),
+            cls.fingerprint(recent_tasks, recent_context, existing_categories),
+        )
+
+    @classmethod
+    def make_key(cls, task_name: str, engine, recent_tasks: List[Dict],
+                 recent_context: List[Dict], existing_categories: List[Dict]) -> str:
+        return cls.fingerprint(
+            cls.normalize_task_name(task_name),
+            cls.context_key(engine, recent_tasks, recent_context, existing_categories),
+        )
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Return a copy of the cached result for `key` with a 'meta' entry
+        naming the tier that served it, or None on a miss
+        """
+        result = self._memory_get(key)
+        return result if result is not None else self._disk_lookup(key)
+
+    async def aget(self, key: str) -> Optional[Dict]:
+        """Async variant of get: memory hits are served at once, the disk tier is read in a thread"""
+        result = self._memory_get(key)
+        if result is not None:
+            return result
+        if self._disk is None:
+            return self._disk_lookup(key)
+        return await asyncio.to_thread(self._disk_lookup, key)
+
+    def _memory_get(self, key: str) -> Optional[Dict]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._stats['memory_hits'] += 1
+                    return self._hit(value, 'memory')
+                del self._memory[key]
+        return None
+
+    def _disk_lookup(self, key: str) -> Optional[Dict]:
+        """The disk tier's copy, promoted to memory, or None counted as a miss"""
+        value = self._disk_get(key)
+        if value is not None:
+            self._remember(key, value)
+            with self._lock:
+                self._stats['disk_hits'] += 1
+            return self._hit(value, 'disk')
+
+        with self._lock:
+            self._stats['misses'] += 1
+        return None
+
+    def set(self, key: str, value: Dict):
+        """Store `value`; the disk write runs in the background and never blocks the caller"""
+        stored = copy.deepcopy(value)
+        self._remember(key, stored)
+        if self._disk is not None:
+            # Stored values are never mutated (hits are copies), so the writer may pickle this one
+            self._writer.submit(self._disk_set, key, stored)
+        with self._lock:
+            self._stats['stores'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if self._disk is not None:
+            # After the writes already queued, so none of them survives the clear
+            self._writer.submit(self._disk.clear).result()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._memory)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups, 4) if lookups else 0.0
+        stats['disk_enabled'] = self._disk is not None
+        return stats
+
+    def _remember(self, key: str, value: Dict):
+        with self._lock:
+            self._memory[key] = (time.monotonic() + self.ttl, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def _disk_set(self, key: str, value: Dict):
+        try:
+            self._disk.set(key, value, expire=self.ttl)
+        except Exception as e:
+            print(f"Enhancement disk cache write failed: {str(e)}")
+
+    def _disk_get(self, key: str) -> Optional[Dict]:
+        if self._disk is None:
+            return None
+        try:
+            value = self._disk.get(key, default=self._MISSING)
+        except Exception as e:
+            print(f"Enhancement disk cache read failed: {str(e)}")
+            return None
+        return None if value is self._MISSING else value
+
+    @staticmethod
+    def _hit(value: Dict, tier: str) -> Dict:
+        result = copy.deepcopy(value)
+        result['meta'] = dict(result.get('meta', {}), cache=tier)
+        return result
+
+
+_cache: Optional[EnhancementCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_enhancement_cache() -> Optional[EnhancementCache]:
+    """Process-wide EnhancementCache, or None when AI_ENHANCEMENT_CACHE is off"""
+    global _cache
+    if not getattr(settings, 'AI_ENHANCEMENT_CACHE', ENHANCEMENT_CACHE):
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EnhancementCache()
+    return _cache
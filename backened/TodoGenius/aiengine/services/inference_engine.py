@@ -0,0 +1,247 @@
+import asyncio
+import threading
+from typing import AsyncIterator, Callable, Dict, Any, Iterator, List, Optional
+from django.conf import settings
+from ..constants import (
+    MAX_TOKENS, TEMPERATURE, CONSTRAINED_OUTPUT, PROMPT_CACHE, INFERENCE_ENGINE
+)
+from ..utils.prompt_assembler import estimate_tokens
+from ..utils.prompt_templates import PromptTemplates
+
+
+class BaseInferenceEngine:
+    """
+    Interface shared by every inference backend used by TaskProcessor.
+
+    Backends return OpenAI-shaped results ({'success', 'text'/'content',
+    'processing_time', 'token_usage'}) and stream plain text deltas. Async
+    variants default to running the sync implementation in a worker thread;
+    network backends override them with native async I/O.
+    """
+
+    # True when generate_completion_batch decodes its prompts together; the
+    # batch scheduler is only used with such backends
+    native_batching = False
+
+    def __init__(self):
+        self.max_tokens = getattr(settings, 'AI_MAX_TOKENS', MAX_TOKENS)
+        self.temperature = getattr(settings, 'AI_TEMPERATURE', TEMPERATURE)
+        # 'json_schema' for LM Studio / OpenAI-compatible servers, 'gbnf' for llama.cpp
+        self.constrained_output = getattr(settings, 'AI_CONSTRAINED_OUTPUT', CONSTRAINED_OUTPUT)
+        # Reuse the KV cache for the static prompt prefix
+        self.prompt_cache = getattr(settings, 'AI_PROMPT_CACHE', PROMPT_CACHE)
+        self.model_name = ''
+
+    @property
+    def is_constrained(self) -> bool:
+        return bool(self.constrained_output)
+
+    # Sync interface
+
+    def generate_completion(self, prompt: str, max_tokens: Optional[int] = None,
+                            schema: Optional[Dict] = None) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def generate_chat_completion(self, messages: list, max_tokens: Optional[int] = None,
+                                 schema: Optional[Dict] = None) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def stream_completion(self, prompt: str, max_tokens: Optional[int] = None,
+                          schema: Optional[Dict] = None) -> Iterator[str]:
+        raise NotImplementedError
+
+    def stream_chat_completion(self, messages: list, max_tokens: Optional[int] = None,
+                               schema: Optional[Dict] = None) -> Iterator[str]:
+        raise NotImplementedError
+
+    def check_health(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def is_available(self) -> bool:
+        """False when requests would be refused without reaching the backend"""
+        return True
+
+    def circuit_state(self) -> Optional[Dict[str, Any]]:
+        """Circuit breaker snapshot for backends that have one"""
+        return None
+
+    def count_tokens(self, text: str) -> int:
+        """Prompt tokens in `text`; backends with a local tokenizer use it"""
+        return estimate_tokens(text)
+
+    def chat_template(self) -> Optional[Dict[str, str]]:
+        """
+        The model's chat template as {'template', 'bos_token', 'eos_token'},
+        used to render messages as one completion prompt for batching.
+        Backends that can read it from the model override this; otherwise
+        it comes from AI_CHAT_TEMPLATE, or None if that is unset.
+        """
+        template = getattr(settings, 'AI_CHAT_TEMPLATE', None)
+        return {'template': template, 'bos_token': '', 'eos_token': ''} if template else None
+
+    def render_chat_prompt(self, messages: List[Dict]) -> str:
+        """Chat messages as one completion prompt, in the model's chat template"""
+        return PromptTemplates._render_instruct_prompt(messages, self.chat_template())
+
+    def generate_completion_batch(self, prompts: List[str], max_tokens: Optional[int] = None,
+                                  schema: Optional[Dict] = None) -> List[Dict[str, Any]]:
+        """
+        Complete several prompts with the same parameters, one result per
+        prompt in order. Backends that can decode a batch at once override
+        this; the default runs the prompts one after another.
+        """
+        return [self.generate_completion(prompt, max_tokens, schema) for prompt in prompts]
+
+    # Async interface
+
+    async def agenerate_completion(self, prompt: str, max_tokens: Optional[int] = None,
+                                   schema: Optional[Dict] = None) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.generate_completion, prompt, max_tokens, schema)
+
+    async def agenerate_chat_completion(self, messages: list, max_tokens: Optional[int] = None,
+                                        schema: Optional[Dict] = None) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.generate_chat_completion, messages, max_tokens, schema)
+
+    def astream_completion(self, prompt: str, max_tokens: Optional[int] = None,
+                           schema: Optional[Dict] = None) -> AsyncIterator[str]:
+        return self._aiterate_in_thread(lambda: self.stream_completion(prompt, max_tokens, schema))
+
+    def astream_chat_completion(self, messages: list, max_tokens: Optional[int] = None,
+                                schema: Optional[Dict] = None) -> AsyncIterator[str]:
+        return self._aiterate_in_thread(lambda: self.stream_chat_completion(messages, max_tokens, schema))
+
+    async def acheck_health(self) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.check_health)
+
+    @staticmethod
+    async def _aiterate_in_thread(make_iterator: Callable[[], Iterator]) -> AsyncIterator:
+        """
+        Drive a blocking iterator in a worker thread and yield its items on
+        the event loop. Closing the async generator stops the worker at the
+        next item and closes the underlying iterator.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+        done = object()
+
+        def put(item):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                # Event loop already closed; nobody is listening any more
+                stop.set()
+
+        def worker():
+            iterator = None
+            try:
+                iterator = make_iterator()
+                for item in iterator:
+                    if stop.is_set():
+                        break
+                    put(('item', item))
+                put(('done', done))
+            except Exception as e:
+                put(('error', e))
+            finally:
+                close = getattr(iterator, 'close', None)
+                if close is not None:
+                    close()
+
+        worker_future = loop.run_in_executor(None, worker)
+        try:
+            while True:
+                kind, value = await queue.get()
+                if kind == 'done':
+                    break
+                if kind == 'error':
+                    raise value
+                yield value
+        finally:
+            stop.set()
+            if worker_future.done():
+                worker_future.result()
+
+    # Helpers for OpenAI-shaped responses, shared by all backends
+
+    @staticmethod
+    def _error_result(error: str, processing_time: float) -> Dict[str, Any]:
+        return {
+            'success': False,
+            'error': error,
+            'processing_time': processing_time,
+            'token_usage': 0
+        }
+
+    @staticmethod
+    def _parse_completion(response: Dict[str, Any], processing_time: float) -> Dict[str, Any]:
+        if 'error' in response:
+            return BaseInferenceEngine._error_result(response['error'], processing_time)
+
+        try:
+            text = response.get('choices', [{}])[0].get('text', '').strip()
+
+            token_usage = response.get('usage', {}).get('total_tokens', 0)
+
+            return {
+                'success': True,
+                'text': text,
+                'processing_time': processing_time,
+                'token_usage': token_usage,
+                'full_response': response
+            }
+        except Exception as e:
+            return BaseInferenceEngine._error_result(f"Failed to parse response: {str(e)}", processing_time)
+
+    @staticmethod
+    def _parse_chat_completion(response: Dict[str, Any], processing_time: float) -> Dict[str, Any]:
+        if 'error' in response:
+            return BaseInferenceEngine._error_result(response['error'], processing_time)
+
+        try:
+            message = response.get('choices', [{}])[0].get('message', {})
+            content = (message.get('content') or '').strip()
+            token_usage = response.get('usage', {}).get('total_tokens', 0)
+
+            return {
+                'success': True,
+                'content': content,
+                'processing_time': processing_time,
+                'token_usage': token_usage,
+                'full_response': response
+            }
+        except Exception as e:
+            return BaseInferenceEngine._error_result(f"Failed to parse response: {str(e)}", processing_time)
+
+    @staticmethod
+    def _stream_delta_text(chunk: Dict[str, Any]) -> str:
+        """Pull the generated text out of a completions or chat stream chunk"""
+        choice = (chunk.get('choices') or [{}])[0]
+        if 'text' in choice:
+            return choice.get('text') or ''
+        return (choice.get('delta') or {}).get('content') or ''
+
+
+def _engine_registry() -> Dict[str, Callable[[], BaseInferenceEngine]]:
+    # Imported lazily: the backends import this module for the base class
+    from .lm_studio_client import LMStudioClient
+    from .llama_cpp_engine import LlamaCppEngine
+    from .llama_cpp_pool import LlamaCppPoolEngine
+    return {
+        'lm_studio': LMStudioClient,
+        'llama_cpp': LlamaCppEngine,
+        'llama_cpp_pool': LlamaCppPoolEngine,
+    }
+
+
+def available_engines() -> List[str]:
+    return list(_engine_registry())
+
+
+def get_inference_engine(name: Optional[str] = None) -> BaseInferenceEngine:
+    """Create the inference engine selected by the AI_INFERENCE_ENGINE setting"""
+    name = name or getattr(settings, 'AI_INFERENCE_ENGINE', INFERENCE_ENGINE)
+    registry = _engine_registry()
+    if name not in registry:
+        raise ValueError(f"Unknown inference engine '{name}', expected one of {list(registry)}")
+    return registry[name]()
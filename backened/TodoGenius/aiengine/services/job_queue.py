@@ -0,0 +1,137 @@
+import os
+import socket
+from datetime import timedelta
+from typing import Dict, List, Optional
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from ..constants import JOB_MAX_ATTEMPTS, JOB_VISIBILITY_TIMEOUT, JOB_RETRY_BACKOFF, JOB_RESULT_TTL
+from ..models import EnhancementJob
+
+
+class EnhancementJobQueue:
+    """
+    Enhancement jobs queued in the database
+
+    Postgres is the broker: claim() locks due rows with FOR UPDATE SKIP
+    LOCKED, so concurrent workers never pick the same job and never wait
+    on each other, then marks them running under a lease. Every later
+    state change is conditional on this worker still holding the lease,
+    so a worker whose lease lapsed cannot overwrite the job's new owner.
+    """
+
+    def __init__(self, worker_id: Optional[str] = None, visibility_timeout: Optional[float] = None):
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.visibility_timeout = timedelta(seconds=visibility_timeout or getattr(
+            settings, 'AI_JOB_VISIBILITY_TIMEOUT', JOB_VISIBILITY_TIMEOUT
+        ))
+
+    @staticmethod
+    def _new_job(task_name: str) -> EnhancementJob:
+        return EnhancementJob(
+            task_name=task_name,
+            max_attempts=getattr(settings, 'AI_JOB_MAX_ATTEMPTS', JOB_MAX_ATTEMPTS)
+        )
+
+    @classmethod
+    def submit(cls, task_name: str) -> EnhancementJob:
+        job = cls._new_job(task_name)
+        job.save()
+        return job
+
+    @classmethod
+    async def asubmit(cls, task_name: str) -> EnhancementJob:
+        job = cls._new_job(task_name)
+        await job.asave()
+        return job
+
+    def claim(self, limit: int = 1) -> List[EnhancementJob]:
+        """
+        Lease up to `limit` due jobs: queued jobs whose backoff has passed,
+        and running jobs whose worker let the lease lapse. A lapsed job out
+        of attempts is failed instead.
+        """
+        now = timezone.now()
+        claimed = []
+        with transaction.atomic():
+            due = (EnhancementJob.objects
+                   .select_for_update(skip_locked=True)
+                   .filter(Q(status='queued', available_at__lte=now) | Q(status='running', locked_until__lt=now))
+                   .order_by('available_at')[:limit])
+            for job in due:
+                if job.status == 'running' and job.attempts >= job.max_attempts:
+                    self._finish(job, 'failed', error=f"Lease expired on attempt {job.attempts}, no attempts left")
+                    continue
+                job.status = 'running'
+                job.attempts += 1
+                job.locked_by = self.worker_id
+                job.locked_until = now + self.visibility_timeout
+                job.save(update_fields=['status', 'attempts', 'locked_by', 'locked_until', 'updated_at'])
+                claimed.append(job)
+        return claimed
+
+    def heartbeat(self, job_ids: List) -> int:
+        """Extend the lease of jobs this worker is still running"""
+        if not job_ids:
+            return 0
+        return EnhancementJob.objects.filter(
+            pk__in=job_ids, status='running', locked_by=self.worker_id
+        ).update(locked_until=timezone.now() + self.visibility_timeout, updated_at=timezone.now())
+
+    def complete(self, job: EnhancementJob, result: Dict) -> bool:
+        """Store a successful result; False when the lease was lost meanwhile"""
+        return self._update_leased(job, status='succeeded', result=result, error='')
+
+    def retry(self, job: EnhancementJob, error: str, delay: Optional[float] = None,
+              result: Optional[Dict] = None) -> bool:
+        """
+        Requeue a failed attempt after the backoff (or `delay`, e.g. a
+        Retry-After), or fail the job when it is out of attempts. `result`
+        is kept as the job's answer if it ends up failed.
+        """
+        if job.attempts >= job.max_attempts:
+            return self._update_leased(job, status='failed', result=result, error=error)
+        backoff = getattr(settings, 'AI_JOB_RETRY_BACKOFF', JOB_RETRY_BACKOFF) * 2 ** (job.attempts - 1)
+        available_at = timezone.now() + timedelta(seconds=max(backoff, delay or 0))
+        updated = EnhancementJob.objects.filter(pk=job.pk, status='running', locked_by=self.worker_id).update(
+            status='queued', available_at=available_at, locked_by='', locked_until=None,
+            error=error, updated_at=timezone.now()
+        )
+        return bool(updated)
+
+    def _update_leased(self, job: EnhancementJob, status: str, result: Optional[Dict], error: str) -> bool:
+        now = timezone.now()
+        updated = EnhancementJob.objects.filter(pk=job.pk, status='running', locked_by=self.worker_id).update(
+            status=status, result=result, error=error, locked_by='', locked_until=None,
+            finished_at=now, expires_at=now + self._result_ttl(), updated_at=now
+        )
+        if not updated:
+            print(f"Enhancement job {job.pk} lease lost, result dropped")
+        return bool(updated)
+
+    def _finish(self, job: EnhancementJob, status: str, error: str):
+        now = timezone.now()
+        job.status = status
+        job.error = error
+        job.locked_by = ''
+        job.locked_until = None
+        job.finished_at = now
+        job.expires_at = now + self._result_ttl()
+        job.save(update_fields=['status', 'error', 'locked_by', 'locked_until', 'finished_at', 'expires_at', 'updated_at'])
+
+    @staticmethod
+    def _result_ttl() -> timedelta:
+        return timedelta(seconds=getattr(settings, 'AI_JOB_RESULT_TTL', JOB_RESULT_TTL))
+
+    @staticmethod
+    def purge_expired() -> int:
+        """Delete finished jobs past their result TTL"""
+        deleted, _ = EnhancementJob.objects.filter(expires_at__lt=timezone.now()).delete()
+        return deleted
+
+    @staticmethod
+    def depth() -> Dict[str, int]:
+        """Number of jobs per status"""
+        counts = EnhancementJob.objects.values('status').annotate(count=Count('pk')).order_by()
+        return {row['status']: row['count'] for row in counts}
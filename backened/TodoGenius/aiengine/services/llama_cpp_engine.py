@@ -0,0 +1,201 @@
+import os
+import threading
+import time
+from typing import Dict, Any, Iterator, Optional, Tuple
+from django.conf import settings
+from ..constants import LLAMA_N_CTX, LLAMA_N_GPU_LAYERS
+from ..utils.output_schema import OutputSchema
+from .inference_engine import BaseInferenceEngine
+
+
+class LlamaCppEngine(BaseInferenceEngine):
+    """
+    In-process inference with llama_cpp.Llama
+
+    Removes the HTTP/JSON hop to LM Studio and gives direct access to the
+    KV cache and grammars. The model is loaded once per process and shared
+    by every engine instance; a llama.cpp context is not thread-safe, so
+    decodes on the same model are serialised with a lock.
+    """
+
+    # (model path, n_ctx, n_threads, n_gpu_layers) -> (Llama, inference lock)
+    _models: Dict[Tuple, Tuple[Any, threading.Lock]] = {}
+    _load_lock = threading.Lock()
+    _grammars: Dict[str, Any] = {}
+
+    def __init__(self):
+        super().__init__()
+        self.model_path = getattr(settings, 'AI_LLAMA_MODEL_PATH', '')
+        self.n_ctx = getattr(settings, 'AI_LLAMA_N_CTX', LLAMA_N_CTX)
+        self.n_threads = getattr(settings, 'AI_LLAMA_N_THREADS', None)
+        self.n_gpu_layers = getattr(settings, 'AI_LLAMA_N_GPU_LAYERS', LLAMA_N_GPU_LAYERS)
+        self.chat_format = getattr(settings, 'AI_LLAMA_CHAT_FORMAT', None)
+        self.model_name = os.path.basename(self.model_path) if self.model_path else ''
+
+    @staticmethod
+    def _import_llama_cpp():
+        try:
+            import llama_cpp
+        except ImportError as e:
+            raise RuntimeError(
+                "The 'llama_cpp' inference engine requires llama_cpp_python to be installed"
+            ) from e
+        return llama_cpp
+
+    def _model_key(self) -> Tuple:
+        return (self.model_path, self.n_ctx, self.n_threads, self.n_gpu_layers)
+
+    def _get_model(self) -> Tuple[Any, threading.Lock]:
+        """Load the GGUF model on first use and return it with its inference lock"""
+        key = self._model_key()
+        model = self._models.get(key)
+        if model is not None:
+            return model
+
+        with self._load_lock:
+            model = self._models.get(key)
+            if model is None:
+                if not self.model_path or not os.path.exists(self.model_path):
+                    raise RuntimeError(f"AI_LLAMA_MODEL_PATH does not point to a model file: '{self.model_path}'")
+
+                llama_cpp = self._import_llama_cpp()
+                print(f"Loading llama.cpp model from {self.model_path}")
+                llm = llama_cpp.Llama(
+                    model_path=self.model_path,
+                    n_ctx=self.n_ctx,
+                    n_threads=self.n_threads,
+                    n_gpu_layers=self.n_gpu_layers,
+                    chat_format=self.chat_format,
+                    use_mmap=True,
+                    verbose=False,
+                )
+                if self.prompt_cache:
+                    # Keep KV state for previously seen prompt prefixes in RAM
+                    llm.set_cache(llama_cpp.LlamaRAMCache())
+                model = (llm, threading.Lock())
+                self._models[key] = model
+        return model
+
+    def _get_tokenizer(self):
+        """Llama instance used to count prompt tokens"""
+        return self._get_model()[0]
+
+    def chat_template(self) -> Optional[Dict[str, str]]:
+        """The chat template stored in the GGUF file, with the model's BOS/EOS tokens"""
+        tokenizer = self._get_tokenizer()
+        template = (tokenizer.metadata or {}).get('tokenizer.chat_template')
+        if not template:
+            return super().chat_template()
+
+        def token_text(token_id: int) -> str:
+            if token_id < 0:
+                return ''
+            return tokenizer.detokenize([token_id], special=True).decode('utf-8', errors='ignore')
+
+        return {
+            'template': template,
+            'bos_token': token_text(tokenizer.token_bos()),
+            'eos_token': token_text(tokenizer.token_eos()),
+        }
+
+    def count_tokens(self, text: str) -> int:
+        """Count with the model's own tokenizer, falling back to the estimate"""
+        try:
+            return len(self._get_tokenizer().tokenize(text.encode('utf-8'), add_bos=False, special=True))
+        except Exception:
+            return super().count_tokens(text)
+
+    def _grammar(self, schema: Optional[Dict]):
+        """
+        LlamaGrammar for `schema` when constrained output is enabled.
+
+        In-process decoding always uses a GBNF grammar, whichever
+        AI_CONSTRAINED_OUTPUT mode is configured.
+        """
+        if not self.is_constrained or schema is None:
+            return None
+        gbnf = OutputSchema.to_gbnf(schema)
+        grammar = self._grammars.get(gbnf)
+        if grammar is None:
+            grammar = self._import_llama_cpp().LlamaGrammar.from_string(gbnf, verbose=False)
+            self._grammars[gbnf] = grammar
+        return grammar
+
+    def _sampling_params(self, max_tokens: Optional[int], schema: Optional[Dict]) -> Dict[str, Any]:
+        return {
+            'max_tokens': max_tokens or self.max_tokens,
+            'temperature': self.temperature,
+            'grammar': self._grammar(schema),
+        }
+
+    def generate_completion(self, prompt: str, max_tokens: Optional[int] = None,
+                            schema: Optional[Dict] = None) -> Dict[str, Any]:
+        """Generate text completion with the in-process model"""
+        start_time = time.time()
+        try:
+            llm, lock = self._get_model()
+            with lock:
+                response = llm.create_completion(prompt=prompt, **self._sampling_params(max_tokens, schema))
+        except Exception as e:
+            print(f"llama.cpp completion failed: {str(e)}")
+            response = {'error': f"llama.cpp completion failed: {str(e)}"}
+        return self._parse_completion(response, time.time() - start_time)
+
+    def generate_chat_completion(self, messages: list, max_tokens: Optional[int] = None,
+                                 schema: Optional[Dict] = None) -> Dict[str, Any]:
+        """Generate chat completion with the in-process model"""
+        start_time = time.time()
+        try:
+            llm, lock = self._get_model()
+            with lock:
+                response = llm.create_chat_completion(messages=messages, **self._sampling_params(max_tokens, schema))
+        except Exception as e:
+            print(f"llama.cpp chat completion failed: {str(e)}")
+            response = {'error': f"llama.cpp chat completion failed: {str(e)}"}
+        return self._parse_chat_completion(response, time.time() - start_time)
+
+    def _stream_chunks(self, create, **kwargs) -> Iterator[str]:
+        """
+        Yield text deltas from a llama.cpp streaming call. Closing this
+        generator stops the decode loop and releases the model.
+        """
+        llm, lock = self._get_model()
+        with lock:
+            chunks = create(llm)(stream=True, **kwargs)
+            try:
+                for chunk in chunks:
+                    text = self._stream_delta_text(chunk)
+                    if text:
+                        yield text
+            finally:
+                chunks.close()
+
+    def stream_completion(self, prompt: str, max_tokens: Optional[int] = None,
+                          schema: Optional[Dict] = None) -> Iterator[str]:
+        """Stream completion text deltas as they are decoded"""
+        return self._stream_chunks(
+            lambda llm: llm.create_completion,
+            prompt=prompt, **self._sampling_params(max_tokens, schema)
+        )
+
+    def stream_chat_completion(self, messages: list, max_tokens: Optional[int] = None,
+                               schema: Optional[Dict] = None) -> Iterator[str]:
+        """Stream chat completion text deltas as they are decoded"""
+        return self._stream_chunks(
+            lambda llm: llm.create_chat_completion,
+            messages=messages, **self._sampling_params(max_tokens, schema)
+        )
+
+    def check_health(self) -> Dict[str, Any]:
+        """Report whether the model file is present and loaded"""
+        if not self.model_path or not os.path.exists(self.model_path):
+            return {
+                'status': 'unhealthy',
+                'error': f"Model file not found: '{self.model_path}'"
+            }
+        return {
+            'status': 'healthy',
+            'available_models': [self.model_name],
+            'current_model': self.model_name,
+            'loaded': self._model_key() in self._models
+        }
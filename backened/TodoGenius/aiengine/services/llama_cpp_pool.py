@@ -0,0 +1,334 @@
+import atexit
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Iterator, List, Optional
+from django.conf import settings
+from ..constants import LLAMA_THREADS_PER_WORKER
+from ..utils.output_schema import OutputSchema
+from .inference_engine import BaseInferenceEngine
+from .llama_cpp_engine import LlamaCppEngine
+
+
+def physical_core_count() -> int:
+    """
+    Number of physical CPU cores available to this process. Hyper-threads
+    add little to llama.cpp decode throughput, so pools are sized on cores.
+    """
+    try:
+        allowed = os.sched_getaffinity(0)
+    except AttributeError:
+        allowed = set(range(os.cpu_count() or 1))
+
+    try:
+        cores = set()
+        processor = physical_id = core_id = None
+        with open('/proc/cpuinfo') as cpuinfo:
+            for line in list(cpuinfo) + ['']:
+                key, _, value = line.partition(':')
+                key = key.strip()
+                if key == 'processor':
+                    processor = int(value)
+                elif key == 'physical id':
+                    physical_id = value.strip()
+                elif key == 'core id':
+                    core_id = value.strip()
+                elif not key:
+                    if processor in allowed and core_id is not None:
+                        cores.add((physical_id, core_id))
+                    processor = physical_id = core_id = None
+        if cores:
+            return len(cores)
+    except (OSError, ValueError):
+        pass
+    return max(1, len(allowed))
+
+
+def default_pool_size(threads_per_worker: int) -> int:
+    return max(1, physical_core_count() // max(1, threads_per_worker))
+
+
+# Worker-process side. Each worker holds its own llama.cpp context; the model
+# file is memory-mapped, so the weight pages live once in the OS page cache
+# and are shared by every worker.
+
+_worker_state: Dict[str, Any] = {}
+
+
+def _init_worker(config: Dict[str, Any]):
+    import llama_cpp
+
+    llm = llama_cpp.Llama(
+        model_path=config['model_path'],
+        n_ctx=config['n_ctx'],
+        n_threads=config['n_threads'],
+        n_gpu_layers=config['n_gpu_layers'],
+        chat_format=config['chat_format'],
+        use_mmap=True,
+        verbose=False,
+    )
+    if config['prompt_cache']:
+        llm.set_cache(llama_cpp.LlamaRAMCache())
+    _worker_state['llm'] = llm
+    _worker_state['grammars'] = {}
+
+
+def _worker_grammar(gbnf: Optional[str]):
+    if not gbnf:
+        return None
+    grammars = _worker_state['grammars']
+    if gbnf not in grammars:
+        import llama_cpp
+        grammars[gbnf] = llama_cpp.LlamaGrammar.from_string(gbnf, verbose=False)
+    return grammars[gbnf]
+
+
+def _worker_run(kind: str, request: Dict[str, Any], gbnf: Optional[str],
+                token_queue=None, cancel_event=None) -> Optional[Dict[str, Any]]:
+    """
+    Run one generation in a worker. Without a token queue the full response
+    dict is returned; with one, text deltas are pushed to it followed by a
+    None sentinel, and the decode stops once cancel_event is set.
+    """
+    llm = _worker_state['llm']
+    create = llm.create_chat_completion if kind == 'chat' else llm.create_completion
+    grammar = _worker_grammar(gbnf)
+
+    if token_queue is None:
+        return create(grammar=grammar, **request)
+
+    chunks = create(grammar=grammar, stream=True, **request)
+    try:
+        for chunk in chunks:
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            text = BaseInferenceEngine._stream_delta_text(chunk)
+            if text:
+                token_queue.put(text)
+    finally:
+        chunks.close()
+        token_queue.put(None)
+    return None
+
+
+class LlamaCppPoolEngine(LlamaCppEngine):
+    """
+    llama.cpp inference spread over a pool of worker processes
+
+    A single process serialises every decode on one context and leaves cores
+    idle. This engine keeps N spawned workers, each with its own context
+    over the same memory-mapped GGUF file, and dispatches requests to them
+    through the executor's call queue. Pool size defaults to physical cores
+    divided by AI_LLAMA_THREADS_PER_WORKER.
+    """
+
+    # Batches are spread over the workers, which decode in parallel
+    native_batching = True
+
+    _executor: Optional[ProcessPoolExecutor] = None
+    _manager = None
+    # Vocabulary-only model in the web process, for counting prompt tokens;
+    # loaded on a background thread so no request waits on it
+    _tokenizer = None
+    _tokenizer_loader: Optional[threading.Thread] = None
+    _pool_lock = threading.Lock()
+
+    def __init__(self):
+        super().__init__()
+        self.threads_per_worker = getattr(settings, 'AI_LLAMA_THREADS_PER_WORKER', LLAMA_THREADS_PER_WORKER)
+        self.pool_size = (
+            getattr(settings, 'AI_LLAMA_POOL_WORKERS', None)
+            or default_pool_size(self.threads_per_worker)
+        )
+        self.timeout = getattr(settings, 'LM_STUDIO_TIMEOUT', 300)
+        self._start_tokenizer_load()
+
+    def _worker_config(self) -> Dict[str, Any]:
+        return {
+            'model_path': self.model_path,
+            'n_ctx': self.n_ctx,
+            'n_threads': self.threads_per_worker,
+            'n_gpu_layers': self.n_gpu_layers,
+            'chat_format': self.chat_format,
+            'prompt_cache': self.prompt_cache,
+        }
+
+    def _get_pool(self):
+        """Start the worker pool on first use; it is shared by the whole process"""
+        cls = type(self)
+        if cls._executor is None:
+            with cls._pool_lock:
+                if cls._executor is None:
+                    if not self.model_path or not os.path.exists(self.model_path):
+                        raise RuntimeError(f"AI_LLAMA_MODEL_PATH does not point to a model file: '{self.model_path}'")
+                    self._import_llama_cpp()
+
+                    # Spawn rather than fork: the web process already runs threads
+                    context = multiprocessing.get_context('spawn')
+                    print(f"Starting {self.pool_size} llama.cpp workers with "
+                          f"{self.threads_per_worker} threads each")
+                    cls._manager = context.Manager()
+                    cls._executor = ProcessPoolExecutor(
+                        max_workers=self.pool_size,
+                        mp_context=context,
+                        initializer=_init_worker,
+                        initargs=(self._worker_config(),),
+                    )
+                    atexit.register(cls.shutdown)
+        return cls._executor, cls._manager
+
+    def _start_tokenizer_load(self):
+        """Read the vocabulary on a thread, once per process, as soon as an engine is created"""
+        cls = type(self)
+        if cls._tokenizer is not None or cls._tokenizer_loader is not None:
+            return
+        if not self.model_path or not os.path.exists(self.model_path):
+            return
+        with cls._pool_lock:
+            if cls._tokenizer_loader is None:
+                cls._tokenizer_loader = threading.Thread(target=self._load_tokenizer, name='llama-tokenizer', daemon=True)
+                cls._tokenizer_loader.start()
+
+    def _load_tokenizer(self):
+        try:
+            self._get_tokenizer()
+        except Exception as e:
+            print(f"Loading the llama.cpp vocabulary failed, estimating prompt tokens: {str(e)}")
+
+    def count_tokens(self, text: str) -> int:
+        """
+        Count with the vocabulary once it is loaded and estimate until then:
+        this runs on the event loop (prompt assembly), which must not wait
+        on a GGUF load
+        """
+        if type(self)._tokenizer is None:
+            return BaseInferenceEngine.count_tokens(self, text)
+        return super().count_tokens(text)
+
+    def _get_tokenizer(self):
+        """Load just the GGUF vocabulary; the weights stay in the workers"""
+        cls = type(self)
+        if cls._tokenizer is None:
+            with cls._pool_lock:
+                if cls._tokenizer is None:
+                    llama_cpp = self._import_llama_cpp()
+                    cls._tokenizer = llama_cpp.Llama(model_path=self.model_path, vocab_only=True, verbose=False)
+        return cls._tokenizer
+
+    @classmethod
+    def shutdown(cls):
+        with cls._pool_lock:
+            if cls._executor is not None:
+                cls._executor.shutdown(wait=False, cancel_futures=True)
+                cls._executor = None
+            if cls._manager is not None:
+                cls._manager.shutdown()
+                cls._manager = None
+
+    def _request(self, max_tokens: Optional[int]) -> Dict[str, Any]:
+        return {
+            'max_tokens': max_tokens or self.max_tokens,
+            'temperature': self.temperature,
+        }
+
+    def _gbnf(self, schema: Optional[Dict]) -> Optional[str]:
+        if not self.is_constrained or schema is None:
+            return None
+        return OutputSchema.to_gbnf(schema)
+
+    def _run(self, kind: str, request: Dict[str, Any], schema: Optional[Dict]) -> Dict[str, Any]:
+        try:
+            executor, _ = self._get_pool()
+            future = executor.submit(_worker_run, kind, request, self._gbnf(schema))
+            return future.result(timeout=self.timeout)
+        except Exception as e:
+            print(f"llama.cpp worker pool request failed: {str(e)}")
+            return {'error': f"llama.cpp worker pool request failed: {str(e)}"}
+
+    def _stream(self, kind: str, request: Dict[str, Any], schema: Optional[Dict]) -> Iterator[str]:
+        """
+        Stream text deltas from a worker. Closing the generator sets the
+        cancel event, which stops the worker's decode at the next token.
+        """
+        executor, manager = self._get_pool()
+        token_queue = manager.Queue()
+        cancel_event = manager.Event()
+        future = executor.submit(_worker_run, kind, request, self._gbnf(schema), token_queue, cancel_event)
+        deadline = time.monotonic() + self.timeout
+        try:
+            while True:
+                try:
+                    text = token_queue.get(timeout=0.5)
+                except queue.Empty:
+                    if future.done():
+                        future.result()
+                        break
+                    if time.monotonic() > deadline:
+                        raise TimeoutError(f"llama.cpp worker produced no result within {self.timeout} seconds")
+                    continue
+                if text is None:
+                    break
+                yield text
+            future.result(timeout=self.timeout)
+        finally:
+            cancel_event.set()
+
+    def generate_completion(self, prompt: str, max_tokens: Optional[int] = None,
+                            schema: Optional[Dict] = None) -> Dict[str, Any]:
+        """Generate text completion on a pool worker"""
+        start_time = time.time()
+        request = dict(self._request(max_tokens), prompt=prompt)
+        return self._parse_completion(self._run('completion', request, schema), time.time() - start_time)
+
+    def generate_chat_completion(self, messages: list, max_tokens: Optional[int] = None,
+                                 schema: Optional[Dict] = None) -> Dict[str, Any]:
+        """Generate chat completion on a pool worker"""
+        start_time = time.time()
+        request = dict(self._request(max_tokens), messages=messages)
+        return self._parse_chat_completion(self._run('chat', request, schema), time.time() - start_time)
+
+    def generate_completion_batch(self, prompts: List[str], max_tokens: Optional[int] = None,
+                                  schema: Optional[Dict] = None) -> List[Dict[str, Any]]:
+        """Spread the batch over the pool so every worker decodes in parallel"""
+        start_time = time.time()
+        try:
+            executor, _ = self._get_pool()
+            gbnf = self._gbnf(schema)
+            futures = [
+                executor.submit(_worker_run, 'completion', dict(self._request(max_tokens), prompt=prompt), gbnf)
+                for prompt in prompts
+            ]
+        except Exception as e:
+            print(f"llama.cpp worker pool request failed: {str(e)}")
+            return [self._error_result(f"llama.cpp worker pool request failed: {str(e)}", 0.0) for _ in prompts]
+
+        results = []
+        for future in futures:
+            try:
+                response = future.result(timeout=self.timeout)
+            except Exception as e:
+                response = {'error': f"llama.cpp worker pool request failed: {str(e)}"}
+            results.append(self._parse_completion(response, time.time() - start_time))
+        return results
+
+    def stream_completion(self, prompt: str, max_tokens: Optional[int] = None,
+                          schema: Optional[Dict] = None) -> Iterator[str]:
+        return self._stream('completion', dict(self._request(max_tokens), prompt=prompt), schema)
+
+    def stream_chat_completion(self, messages: list, max_tokens: Optional[int] = None,
+                               schema: Optional[Dict] = None) -> Iterator[str]:
+        return self._stream('chat', dict(self._request(max_tokens), messages=messages), schema)
+
+    def check_health(self) -> Dict[str, Any]:
+        health = super().check_health()
+        health.pop('loaded', None)
+        health.update({
+            'workers': self.pool_size,
+            'threads_per_worker': self.threads_per_worker,
+            'physical_cores': physical_core_count(),
+            'running': type(self)._executor is not None,
+        })
+        return health
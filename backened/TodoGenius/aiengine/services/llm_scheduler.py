@@ -0,0 +1,282 @@
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Dict, Optional
+from django.conf import settings
+from ..constants import (
+    ADMISSION_MAX_IN_FLIGHT, ADMISSION_MAX_QUEUE, ADMISSION_QUEUE_TIMEOUT,
+    SCHEDULER_WEIGHTS, SCHEDULER_BATCH_MAX_SLOTS, SCHEDULER_STARVATION_TIMEOUT,
+    SCHEDULER_BATCH_MAX_QUEUE
+)
+
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+JOB_CLASSES = (INTERACTIVE, BATCH)
+
+
+class AdmissionRejected(Exception):
+    """The model is saturated: the request was not admitted"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Enhancement not admitted ({reason}), retry in {retry_after} seconds")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    """A queued job; woken from whichever thread grants it a slot"""
+
+    def __init__(self, job_class: str, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.job_class = job_class
+        self.loop = loop
+        self.granted = False
+        self.enqueued_at = time.monotonic()
+        self.event = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(True)
+
+
+class _ClassState:
+    """Queue, limits and metrics of one priority class"""
+
+    def __init__(self, name: str, weight: float, max_slots: int, max_queue: int,
+                 queue_timeout: Optional[float]):
+        self.name = name
+        self.weight = weight
+        self.max_slots = max_slots
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.waiters: deque = deque()
+        self.in_flight = 0
+        self.waits = deque(maxlen=500)
+        self.counts = {'dispatched': 0, 'rejected_queue_full': 0, 'rejected_timeout': 0,
+                       'abandoned': 0, 'starvation_promotions': 0}
+
+
+class LLMScheduler:
+    """
+    Slot scheduler for every LLM generation in the process
+
+    A fixed number of slots (AI_ADMISSION_MAX_IN_FLIGHT) is shared by two
+    priority classes. 'interactive' is a user waiting on enhance_task;
+    'batch' is background work (bulk enhancement, backfills). A slot is
+    handed out at each dispatch point, i.e. whenever a job finishes:
+    generations are never interrupted, but a waiting interactive job
+    always goes ahead of queued batch work.
+
+    - Weighted fair sharing: while both classes have jobs queued, batch
+      gets one dispatch after every weight[interactive] / weight[batch]
+      interactive ones (AI_SCHEDULER_WEIGHTS, 8 : 1 by default).
+    - Batch work never holds more than AI_SCHEDULER_BATCH_MAX_SLOTS slots,
+      so an interactive request finds a free slot within one generation.
+    - Starvation protection: a batch job queued longer than
+      AI_SCHEDULER_STARVATION_TIMEOUT is dispatched next regardless.
+    - Interactive jobs have a bounded queue and wait deadline and are
+      rejected with AdmissionRejected beyond them; batch jobs just wait.
+    """
+
+    def __init__(self, slots: Optional[int] = None):
+        self.slots = slots or getattr(settings, 'AI_ADMISSION_MAX_IN_FLIGHT', ADMISSION_MAX_IN_FLIGHT)
+        weights = dict(SCHEDULER_WEIGHTS, **getattr(settings, 'AI_SCHEDULER_WEIGHTS', {}))
+        batch_slots = getattr(settings, 'AI_SCHEDULER_BATCH_MAX_SLOTS', SCHEDULER_BATCH_MAX_SLOTS)
+        if batch_slots is None:
+            batch_slots = max(1, self.slots - 1)
+        self.starvation_timeout = getattr(settings, 'AI_SCHEDULER_STARVATION_TIMEOUT', SCHEDULER_STARVATION_TIMEOUT)
+        self.classes: Dict[str, _ClassState] = {
+            INTERACTIVE: _ClassState(
+                INTERACTIVE, weights[INTERACTIVE], self.slots,
+                getattr(settings, 'AI_ADMISSION_MAX_QUEUE', ADMISSION_MAX_QUEUE),
+                getattr(settings, 'AI_ADMISSION_QUEUE_TIMEOUT', ADMISSION_QUEUE_TIMEOUT),
+            ),
+            BATCH: _ClassState(
+                BATCH, weights[BATCH], min(batch_slots, self.slots),
+                getattr(settings, 'AI_SCHEDULER_BATCH_MAX_QUEUE', SCHEDULER_BATCH_MAX_QUEUE),
+                None,
+            ),
+        }
+        self.batch_every = max(1, round(weights[INTERACTIVE] / weights[BATCH]))
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        # Interactive dispatches in a row while batch work was waiting
+        self._streak = 0
+        # Exponentially weighted mean generation time, for Retry-After
+        self._service_time = 5.0
+
+    def _state(self, job_class: str) -> _ClassState:
+        if job_class not in self.classes:
+            raise ValueError(f"Unknown job class '{job_class}', expected one of {JOB_CLASSES}")
+        return self.classes[job_class]
+
+    def retry_after(self, job_class: str = INTERACTIVE) -> int:
+        """Seconds until the class's current backlog should have drained"""
+        backlog = len(self.classes[job_class].waiters) + 1
+        return max(1, math.ceil(self._service_time * backlog / self.slots))
+
+    def _next_class(self) -> Optional[_ClassState]:
+        """Pick the class to serve at this dispatch point; must hold the lock"""
+        eligible = [state for state in self.classes.values()
+                    if state.waiters and state.in_flight < state.max_slots]
+        if not eligible:
+            return None
+
+        interactive, batch = self.classes[INTERACTIVE], self.classes[BATCH]
+        if batch not in eligible:
+            return interactive
+        if interactive not in eligible:
+            return batch
+        if time.monotonic() - batch.waiters[0].enqueued_at >= self.starvation_timeout:
+            batch.counts['starvation_promotions'] += 1
+            return batch
+        return batch if self._streak >= self.batch_every else interactive
+
+    def _dispatch(self):
+        """Hand free slots to waiting jobs; must hold the lock. Returns waiters to wake."""
+        woken = []
+        while self._in_flight < self.slots:
+            state = self._next_class()
+            if state is None:
+                break
+            waiter = state.waiters.popleft()
+            waiter.granted = True
+            self._in_flight += 1
+            state.in_flight += 1
+            if state.name == BATCH or not self.classes[BATCH].waiters:
+                self._streak = 0
+            else:
+                self._streak += 1
+            state.counts['dispatched'] += 1
+            state.waits.append(time.monotonic() - waiter.enqueued_at)
+            woken.append(waiter)
+        return woken
+
+    def _enqueue(self, job_class: str, loop=None) -> _Waiter:
+        state = self._state(job_class)
+        with self._lock:
+            if len(state.waiters) >= state.max_queue:
+                state.counts['rejected_queue_full'] += 1
+                raise AdmissionRejected('queue_full', self.retry_after(job_class))
+            waiter = _Waiter(job_class, loop)
+            state.waiters.append(waiter)
+            woken = self._dispatch()
+        for other in woken:
+            if other is not waiter:
+                other.wake()
+        return waiter
+
+    def _abandon(self, waiter: _Waiter, outcome: str) -> bool:
+        """Drop a waiter that gave up; True if it was granted a slot meanwhile"""
+        state = self.classes[waiter.job_class]
+        with self._lock:
+            if waiter.granted:
+                return True
+            state.waiters.remove(waiter)
+            state.counts[outcome] += 1
+            return False
+
+    def acquire(self, job_class: str = INTERACTIVE):
+        """Block until the job is granted a slot, or raise AdmissionRejected"""
+        waiter = self._enqueue(job_class)
+        if waiter.granted:
+            return
+        timeout = self.classes[job_class].queue_timeout
+        if not waiter.event.wait(timeout) and not self._abandon(waiter, 'rejected_timeout'):
+            raise AdmissionRejected('timeout', self.retry_after(job_class))
+
+    async def aacquire(self, job_class: str = INTERACTIVE):
+        """Async variant of acquire; waits on the event loop, not a thread"""
+        waiter = self._enqueue(job_class, asyncio.get_running_loop())
+        if waiter.granted:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.classes[job_class].queue_timeout)
+        except asyncio.TimeoutError:
+            if not self._abandon(waiter, 'rejected_timeout'):
+                raise AdmissionRejected('timeout', self.retry_after(job_class))
+        except asyncio.CancelledError:
+            # Client went away while queued: give back a slot it may have been handed
+            if self._abandon(waiter, 'abandoned'):
+                self.release(job_class)
+            raise
+
+    def release(self, job_class: str = INTERACTIVE, service_time: Optional[float] = None):
+        """Free a slot and dispatch the next job"""
+        with self._lock:
+            if service_time is not None:
+                self._service_time = 0.8 * self._service_time + 0.2 * service_time
+            self._in_flight -= 1
+            self.classes[job_class].in_flight -= 1
+            woken = self._dispatch()
+        for waiter in woken:
+            waiter.wake()
+
+    @contextmanager
+    def slot(self, job_class: str = INTERACTIVE):
+        self.acquire(job_class)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(job_class, time.monotonic() - started)
+
+    @asynccontextmanager
+    async def aslot(self, job_class: str = INTERACTIVE):
+        await self.aacquire(job_class)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(job_class, time.monotonic() - started)
+
+    @staticmethod
+    def _class_stats(state: _ClassState) -> Dict[str, Any]:
+        waits = sorted(state.waits)
+        stats = dict(
+            state.counts,
+            queue_depth=len(state.waiters),
+            in_flight=state.in_flight,
+            max_slots=state.max_slots,
+            weight=state.weight,
+        )
+        if waits:
+            stats['mean_wait_ms'] = round(sum(waits) / len(waits) * 1000, 2)
+            stats['p95_wait_ms'] = round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 2)
+            stats['max_wait_ms'] = round(waits[-1] * 1000, 2)
+        if state.waiters:
+            stats['oldest_wait_ms'] = round((time.monotonic() - state.waiters[0].enqueued_at) * 1000, 2)
+        return stats
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'slots': self.slots,
+                'in_flight': self._in_flight,
+                'mean_service_time': round(self._service_time, 3),
+                'starvation_timeout': self.starvation_timeout,
+                'classes': {name: self._class_stats(state) for name, state in self.classes.items()},
+            }
+
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    """Process-wide scheduler shared by every LLM generation"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler()
+    return _scheduler
@@ -1,129 +1,313 @@
-import requests
+import asyncio
 import json
+import threading
 import time
-from typing import Dict, Any, Optional
+import weakref
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import AsyncIterator, Dict, Any, Iterator, List, Optional, Tuple, Union
+
+import httpx
 from django.conf import settings
-from ..constants import LM_STUDIO_BASE_URL, MAX_TOKENS, TEMPERATURE, MODEL_NAME
+from ..constants import (
+    LM_STUDIO_BASE_URL, MODEL_NAME,
+    HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE_CONNECTIONS, HTTP_KEEPALIVE_EXPIRY,
+    HEALTH_CHECK_TIMEOUT
+)
+from ..utils.output_schema import OutputSchema
+from .circuit_breaker import CircuitOpenError
+from .endpoint_pool import Endpoint, get_endpoint_pool
+from .inference_engine import BaseInferenceEngine
+
+class LMStudioClient(BaseInferenceEngine):
+    """Client for interacting with LM Studio local API (HTTP inference engine)"""
+
+    # Connection pools are shared by every client instance so keep-alive
+    # connections to LM Studio survive across requests. httpx.AsyncClient is
+    # bound to the event loop it was first used on, so one is kept per loop.
+    _sync_client: Optional[httpx.Client] = None
+    _async_clients = weakref.WeakKeyDictionary()
+    _hedge_executor: Optional[ThreadPoolExecutor] = None
+    _pool_lock = threading.Lock()
 
-class LMStudioClient:
-    """Client for interacting with LM Studio local API"""
-    
     def __init__(self):
+        super().__init__()
         self.base_url = getattr(settings, 'LM_STUDIO_BASE_URL', LM_STUDIO_BASE_URL)
-        self.max_tokens = getattr(settings, 'AI_MAX_TOKENS', MAX_TOKENS)
-        self.temperature = getattr(settings, 'AI_TEMPERATURE', TEMPERATURE)
+        # Several inference servers may be listed; requests are routed to the
+        # least loaded one and LM_STUDIO_BASE_URL is then only a fallback
+        self.base_urls = list(getattr(settings, 'LM_STUDIO_BASE_URLS', None) or [self.base_url])
         self.model_name = getattr(settings, 'AI_MODEL_NAME', MODEL_NAME)
         # Increased timeout for slower models
-        self.timeout = getattr(settings, 'LM_STUDIO_TIMEOUT', 300)  # 2 minutes default
-    
-    def _make_request(self, endpoint: str, data: Dict[str, Any]) -> Dict[str, Any]:
-        """Make HTTP request to LM Studio API"""
+        self.timeout = getattr(settings, 'LM_STUDIO_TIMEOUT', 300)  # 5 minutes default
+        self.health_timeout = getattr(settings, 'AI_HEALTH_CHECK_TIMEOUT', HEALTH_CHECK_TIMEOUT)
+        # Shared per process: every endpoint has its own circuit breaker, so
+        # a dead server fails fast while the others keep serving
+        self.endpoints = get_endpoint_pool(self.base_urls)
+        self.endpoints.start_health_monitors(self._health_probe)
+        # LM Studio answers a prompt list one prompt at a time; servers that
+        # decode it as a batch (llama-server, vLLM) opt in so AI_BATCHING
+        # takes effect. Set AI_CHAT_TEMPLATE to the model's template with it.
+        self.native_batching = getattr(settings, 'LM_STUDIO_BATCH_PROMPTS', False)
+
+    @staticmethod
+    def _pool_limits() -> httpx.Limits:
+        """Connection pool limits shared by the sync and async clients"""
+        return httpx.Limits(
+            max_connections=getattr(settings, 'LM_STUDIO_MAX_CONNECTIONS', HTTP_MAX_CONNECTIONS),
+            max_keepalive_connections=getattr(
+                settings, 'LM_STUDIO_MAX_KEEPALIVE_CONNECTIONS', HTTP_MAX_KEEPALIVE_CONNECTIONS
+            ),
+            keepalive_expiry=getattr(settings, 'LM_STUDIO_KEEPALIVE_EXPIRY', HTTP_KEEPALIVE_EXPIRY),
+        )
+
+    @classmethod
+    def _get_sync_client(cls) -> httpx.Client:
+        """Return the process-wide pooled sync HTTP client"""
+        if cls._sync_client is None:
+            with cls._pool_lock:
+                if cls._sync_client is None:
+                    cls._sync_client = httpx.Client(limits=cls._pool_limits())
+        return cls._sync_client
+
+    @classmethod
+    def _get_async_client(cls) -> httpx.AsyncClient:
+        """Return the pooled async HTTP client for the running event loop"""
+        loop = asyncio.get_running_loop()
+        client = cls._async_clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(limits=cls._pool_limits())
+            cls._async_clients[loop] = client
+        return client
+
+    @classmethod
+    def _get_hedge_executor(cls) -> ThreadPoolExecutor:
+        """Threads running duplicate sync requests when hedging"""
+        if cls._hedge_executor is None:
+            with cls._pool_lock:
+                if cls._hedge_executor is None:
+                    cls._hedge_executor = ThreadPoolExecutor(thread_name_prefix='lm-studio-hedge')
+        return cls._hedge_executor
+
+    @staticmethod
+    def _request_headers() -> Dict[str, str]:
+        return {
+            'Content-Type': 'application/json',
+            'Accept': 'application/json'
+        }
+
+    def _request_error(self, e: Exception, base_url: Optional[str] = None) -> Dict[str, Any]:
+        """Translate a transport exception into the client's error dict"""
+        if isinstance(e, httpx.TimeoutException):
+            error_msg = f"Request timed out after {self.timeout} seconds: {str(e)}"
+        elif isinstance(e, httpx.ConnectError):
+            error_msg = f"Connection error - is LM Studio running on {base_url or self.base_url}? {str(e)}"
+        elif isinstance(e, httpx.HTTPError):
+            error_msg = f"LM Studio API request failed: {str(e)}"
+        else:
+            error_msg = f"Unexpected error in LM Studio client: {str(e)}"
+        print(error_msg)
+        return {
+            'error': error_msg,
+            'success': False
+        }
+
+    @staticmethod
+    def _record_outcome(node: Endpoint, error: Optional[Exception] = None):
+        """Feed the endpoint's circuit breaker; client errors (4xx) mean the server is up"""
+        if error is None or (
+            isinstance(error, httpx.HTTPStatusError) and error.response.status_code < 500
+        ):
+            node.breaker.record_success()
+        else:
+            node.breaker.record_failure(str(error))
+
+    def _circuit_open_error(self) -> Dict[str, Any]:
+        retry_after = self.endpoints.circuit_state()['retry_after']
+        return {
+            'error': f"LM Studio circuit is open, retry in {retry_after:.0f} seconds",
+            'success': False,
+            'circuit_open': True
+        }
+
+    def _acquire_endpoint(self, exclude: Tuple[Endpoint, ...] = ()) -> Endpoint:
+        node = self.endpoints.acquire(exclude=exclude)
+        if node is None:
+            raise CircuitOpenError('LM Studio', self.endpoints.circuit_state()['retry_after'])
+        return node
+
+    def is_available(self) -> bool:
+        return self.endpoints.is_available()
+
+    def circuit_state(self) -> Dict[str, Any]:
+        return self.endpoints.circuit_state()
+
+    def _attempt(self, node: Endpoint, endpoint: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """POST to one endpoint; always releases the node"""
+        started = time.monotonic()
+        latency = None
         try:
-            url = f"{self.base_url.rstrip('/')}/{endpoint.lstrip('/')}"
-            headers = {
-                'Content-Type': 'application/json',
-                'Accept': 'application/json'
-            }
-            
+            url = node.url(endpoint)
+
             # Add debug logging
             print(f"Making request to: {url}")
             print(f"Request data: {json.dumps(data, indent=2)}")
-            
-            response = requests.post(
-                url, 
-                json=data, 
-                headers=headers,
+
+            response = self._get_sync_client().post(
+                url,
+                json=data,
+                headers=self._request_headers(),
                 timeout=self.timeout
             )
-            
+
             response.raise_for_status()
             result = response.json()
+            self._record_outcome(node)
+            latency = time.monotonic() - started
             print(f"Response received: {json.dumps(result, indent=2)}")
             return result
-            
-        except requests.exceptions.Timeout as e:
-            error_msg = f"Request timed out after {self.timeout} seconds: {str(e)}"
-            print(error_msg)
-            return {
-                'error': error_msg,
-                'success': False
-            }
-        except requests.exceptions.ConnectionError as e:
-            error_msg = f"Connection error - is LM Studio running on {self.base_url}? {str(e)}"
-            print(error_msg)
-            return {
-                'error': error_msg,
-                'success': False
-            }
-        except requests.exceptions.RequestException as e:
-            error_msg = f"LM Studio API request failed: {str(e)}"
-            print(error_msg)
-            return {
-                'error': error_msg,
-                'success': False
-            }
+
         except Exception as e:
-            error_msg = f"Unexpected error in LM Studio client: {str(e)}"
-            print(error_msg)
-            return {
-                'error': error_msg,
-                'success': False
-            }
-    
-    def generate_completion(self, prompt: str, max_tokens: Optional[int] = None) -> Dict[str, Any]:
-        """Generate text completion using LM Studio"""
-        start_time = time.time()
-        
+            self._record_outcome(node, e)
+            return self._request_error(e, node.base_url)
+        finally:
+            self.endpoints.release(node, latency)
+
+    async def _aattempt(self, endpoint: str, data: Dict[str, Any], exclude: Tuple[Endpoint, ...] = (),
+                        nodes: Optional[List[Endpoint]] = None) -> Dict[str, Any]:
+        """
+        Async variant of _attempt that reserves its own endpoint, so a task
+        cancelled before it starts holds none; the endpoint is appended to
+        `nodes`. Cancelling it closes the connection.
+        """
+        node = self.endpoints.acquire(exclude=exclude)
+        if node is None:
+            return self._circuit_open_error()
+        if nodes is not None:
+            nodes.append(node)
+        started = time.monotonic()
+        latency = None
+        try:
+            url = node.url(endpoint)
+            print(f"Making async request to: {url}")
+
+            response = await self._get_async_client().post(
+                url,
+                json=data,
+                headers=self._request_headers(),
+                timeout=self.timeout
+            )
+
+            response.raise_for_status()
+            result = response.json()
+            self._record_outcome(node)
+            latency = time.monotonic() - started
+            print(f"Response received: {json.dumps(result, indent=2)}")
+            return result
+
+        except Exception as e:
+            self._record_outcome(node, e)
+            return self._request_error(e, node.base_url)
+        finally:
+            self.endpoints.release(node, latency)
+
+    def _make_request(self, endpoint: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Make HTTP request to LM Studio API on the least loaded endpoint.
+
+        With hedging on, a request still running after the pool's p95
+        latency is duplicated to a second endpoint and the first successful
+        answer wins. A blocking httpx call cannot be interrupted, so the
+        losing sync request runs to completion and its answer is dropped;
+        the async path cancels it.
+        """
+        node = self.endpoints.acquire()
+        if node is None:
+            return self._circuit_open_error()
+
+        delay = self.endpoints.hedge_delay()
+        if delay is None:
+            return self._attempt(node, endpoint, data)
+
+        executor = self._get_hedge_executor()
+        primary = executor.submit(self._attempt, node, endpoint, data)
+        try:
+            return primary.result(timeout=delay)
+        except FutureTimeoutError:
+            pass
+
+        backup_node = self.endpoints.acquire(exclude=(node,))
+        if backup_node is None:
+            return primary.result()
+
+        print(f"Hedging request to {backup_node.base_url} after {delay:.2f}s")
+        backup = executor.submit(self._attempt, backup_node, endpoint, data)
+        pending = {primary, backup}
+        result = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if 'error' not in result:
+                    self.endpoints.record_hedge(won=future is backup)
+                    return result
+        self.endpoints.record_hedge(won=False)
+        return result
+
+    async def _amake_request(self, endpoint: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Make HTTP request to LM Studio API without blocking the event loop"""
+        delay = self.endpoints.hedge_delay()
+        if delay is None:
+            return await self._aattempt(endpoint, data)
+
+        nodes: List[Endpoint] = []
+        primary = asyncio.ensure_future(self._aattempt(endpoint, data, nodes=nodes))
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if done or not self.endpoints.is_available(exclude=tuple(nodes)):
+                return await primary
+
+            print(f"Hedging request after {delay:.2f}s")
+            backup = asyncio.ensure_future(self._aattempt(endpoint, data, exclude=tuple(nodes)))
+            pending.add(backup)
+            result = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if 'error' not in result:
+                        self.endpoints.record_hedge(won=task is backup)
+                        return result
+            self.endpoints.record_hedge(won=False)
+            return result
+        finally:
+            # Cancel the loser (or everything, if we were cancelled) so its
+            # server stops generating, and wait for it to release its endpoint
+            pending = [task for task in pending if not task.done()]
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def _build_completion_payload(self, prompt: Union[str, List[str]], max_tokens: Optional[int] = None,
+                                  schema: Optional[Dict] = None) -> Dict[str, Any]:
         # Match your successful Postman request format
         data = {
             "model": self.model_name,
             "prompt": prompt,
             "max_tokens": max_tokens or self.max_tokens,
             "temperature": self.temperature,
-            "reset": True,  # This matches your Postman request
             # Remove parameters that might not be supported
-            # "cache_prompt": False,
             # "top_p": 0.9,
             # "frequency_penalty": 0.0,
             # "presence_penalty": 0.0,
             # "stop": ["</response>", "\n\n---"]
         }
-        
-        response = self._make_request("completions", data)
-        processing_time = time.time() - start_time
-        
-        if 'error' in response:
-            return {
-                'success': False,
-                'error': response['error'],
-                'processing_time': processing_time,
-                'token_usage': 0
-            }
-        
-        try:
-            text = response.get('choices', [{}])[0].get('text', '').strip()
-            
-            token_usage = response.get('usage', {}).get('total_tokens', 0)
-            
-            return {
-                'success': True,
-                'text': text,
-                'processing_time': processing_time,
-                'token_usage': token_usage,
-                'full_response': response
-            }
-        except Exception as e:
-            return {
-                'success': False,
-                'error': f"Failed to parse response: {str(e)}",
-                'processing_time': processing_time,
-                'token_usage': 0
-            }
-    
-    def generate_chat_completion(self, messages: list, max_tokens: Optional[int] = None) -> Dict[str, Any]:
-        """Generate chat completion using LM Studio"""
-        start_time = time.time()
-        
+        data.update(self._cache_params())
+        data.update(self._constraint_params(schema))
+        return data
+
+    def _build_chat_payload(self, messages: list, max_tokens: Optional[int] = None,
+                            schema: Optional[Dict] = None) -> Dict[str, Any]:
         data = {
             "model": self.model_name,
             "messages": messages,
@@ -131,83 +315,359 @@ class LMStudioClient:
             "temperature": self.temperature,
             "stream": False
         }
-        
-        response = self._make_request("chat/completions", data)
+        data.update(self._cache_params())
+        data.update(self._constraint_params(schema))
+        return data
+
+    def _cache_params(self) -> Dict[str, Any]:
+        """
+        Ask the server to keep the KV cache of the previous prompt so a
+        shared prefix is not prefilled again (llama.cpp `cache_prompt`).
+        With caching off the server is told to start from an empty cache.
+        """
+        if self.prompt_cache:
+            return {"cache_prompt": True}
+        return {"cache_prompt": False, "reset": True}
+
+    def _constraint_params(self, schema: Optional[Dict]) -> Dict[str, Any]:
+        """response_format / grammar parameters when constrained output is enabled"""
+        return OutputSchema.request_params(self.constrained_output, schema)
+
+    def generate_completion(self, prompt: str, max_tokens: Optional[int] = None,
+                            schema: Optional[Dict] = None) -> Dict[str, Any]:
+        """Generate text completion using LM Studio"""
+        start_time = time.time()
+        response = self._make_request("completions", self._build_completion_payload(prompt, max_tokens, schema))
+        return self._parse_completion(response, time.time() - start_time)
+
+    def generate_completion_batch(self, prompts: List[str], max_tokens: Optional[int] = None,
+                                  schema: Optional[Dict] = None) -> List[Dict[str, Any]]:
+        """
+        Send all prompts in one /completions request (OpenAI-style prompt
+        list) and split the choices back out by index. Only used with
+        LM_STUDIO_BATCH_PROMPTS on; falls back to one request per prompt if
+        the server does not answer with a choice for every prompt.
+        """
+        start_time = time.time()
+        response = self._make_request("completions", self._build_completion_payload(prompts, max_tokens, schema))
         processing_time = time.time() - start_time
-        
-        if 'error' in response:
-            return {
-                'success': False,
-                'error': response['error'],
-                'processing_time': processing_time,
-                'token_usage': 0
-            }
-        
+
+        choices = response.get('choices') or []
+        if 'error' in response or len(choices) != len(prompts):
+            print(f"Batched completion not supported by server, sending {len(prompts)} prompts individually")
+            return super().generate_completion_batch(prompts, max_tokens, schema)
+
+        ordered = sorted(choices, key=lambda choice: choice.get('index', 0))
+        return [
+            self._parse_completion({'choices': [choice], 'usage': {}}, processing_time)
+            for choice in ordered
+        ]
+
+    async def agenerate_completion(self, prompt: str, max_tokens: Optional[int] = None,
+                                   schema: Optional[Dict] = None) -> Dict[str, Any]:
+        """Async variant of generate_completion"""
+        start_time = time.time()
+        response = await self._amake_request("completions", self._build_completion_payload(prompt, max_tokens, schema))
+        return self._parse_completion(response, time.time() - start_time)
+
+    def generate_chat_completion(self, messages: list, max_tokens: Optional[int] = None,
+                                 schema: Optional[Dict] = None) -> Dict[str, Any]:
+        """Generate chat completion using LM Studio"""
+        start_time = time.time()
+        response = self._make_request("chat/completions", self._build_chat_payload(messages, max_tokens, schema))
+        return self._parse_chat_completion(response, time.time() - start_time)
+
+    async def agenerate_chat_completion(self, messages: list, max_tokens: Optional[int] = None,
+                                        schema: Optional[Dict] = None) -> Dict[str, Any]:
+        """Async variant of generate_chat_completion"""
+        start_time = time.time()
+        response = await self._amake_request("chat/completions", self._build_chat_payload(messages, max_tokens, schema))
+        return self._parse_chat_completion(response, time.time() - start_time)
+
+    @classmethod
+    def _stream_headers(cls) -> Dict[str, str]:
+        headers = cls._request_headers()
+        headers['Accept'] = 'text/event-stream'
+        return headers
+
+    @staticmethod
+    def _parse_stream_line(line: str) -> Optional[Dict[str, Any]]:
+        """Decode one Server-Sent Events line from an OpenAI-style stream.
+
+        Returns the chunk dict, None for keep-alives/comments, and
+        {'done': True} for the terminating [DONE] marker.
+        """
+        line = line.strip()
+        if not line.startswith('data:'):
+            return None
+        payload = line[len('data:'):].strip()
+        if payload == '[DONE]':
+            return {'done': True}
         try:
-            message = response.get('choices', [{}])[0].get('message', {})
-            content = message.get('content', '').strip()
-            token_usage = response.get('usage', {}).get('total_tokens', 0)
-            
-            return {
-                'success': True,
-                'content': content,
-                'processing_time': processing_time,
-                'token_usage': token_usage,
-                'full_response': response
-            }
+            return json.loads(payload)
+        except json.JSONDecodeError:
+            print(f"Skipping malformed stream chunk: {payload[:100]}")
+            return None
+
+    def _stream(self, endpoint: str, data: Dict[str, Any]) -> Iterator[str]:
+        """Stream text deltas for an OpenAI-style streaming request.
+
+        Closing the generator early closes the upstream HTTP stream, which
+        makes LM Studio stop generating. Raises CircuitOpenError without
+        connecting while every endpoint's circuit is open.
+        """
+        node = self._acquire_endpoint()
+        url = node.url(endpoint)
+        print(f"Streaming request to: {url}")
+        data = dict(data, stream=True)
+        started = time.monotonic()
+        first_token = True
+        try:
+            with self._get_sync_client().stream(
+                'POST', url, json=data, headers=self._stream_headers(), timeout=self.timeout
+            ) as response:
+                response.raise_for_status()
+                self._record_outcome(node)
+                for line in response.iter_lines():
+                    chunk = self._parse_stream_line(line)
+                    if chunk is None:
+                        continue
+                    if chunk.get('done'):
+                        break
+                    text = self._stream_delta_text(chunk)
+                    if text:
+                        if first_token:
+                            first_token = False
+                            self.endpoints.record_latency(time.monotonic() - started, 'ttft')
+                        yield text
         except Exception as e:
+            self._record_outcome(node, e)
+            self._request_error(e, node.base_url)
+            raise
+        finally:
+            self.endpoints.release(node)
+
+    async def _astream_from(self, endpoint: str, data: Dict[str, Any], exclude: Tuple[Endpoint, ...] = (),
+                            nodes: Optional[List[Endpoint]] = None) -> AsyncIterator[str]:
+        """
+        Stream from one endpoint, reserved on the first step so a stream
+        closed before it starts holds none; the endpoint is appended to
+        `nodes` and always released.
+        """
+        node = self._acquire_endpoint(exclude)
+        if nodes is not None:
+            nodes.append(node)
+        url = node.url(endpoint)
+        print(f"Streaming request to: {url}")
+        data = dict(data, stream=True)
+        started = time.monotonic()
+        first_token = True
+        try:
+            async with self._get_async_client().stream(
+                'POST', url, json=data, headers=self._stream_headers(), timeout=self.timeout
+            ) as response:
+                response.raise_for_status()
+                self._record_outcome(node)
+                async for line in response.aiter_lines():
+                    chunk = self._parse_stream_line(line)
+                    if chunk is None:
+                        continue
+                    if chunk.get('done'):
+                        break
+                    text = self._stream_delta_text(chunk)
+                    if text:
+                        if first_token:
+                            first_token = False
+                            self.endpoints.record_latency(time.monotonic() - started, 'ttft')
+                        yield text
+        except Exception as e:
+            self._record_outcome(node, e)
+            self._request_error(e, node.base_url)
+            raise
+        finally:
+            self.endpoints.release(node)
+
+    async def _astream(self, endpoint: str, data: Dict[str, Any]) -> AsyncIterator[str]:
+        """
+        Async variant of _stream. With hedging on, a stream that has not
+        produced its first token after the pool's p95 time-to-first-token
+        is raced against a duplicate on a second endpoint; the first to
+        produce a token is kept and the other is closed.
+        """
+        nodes: List[Endpoint] = []
+        stream = self._astream_from(endpoint, data, nodes=nodes)
+        contenders = {asyncio.ensure_future(stream.__anext__()): stream}
+        try:
+            delay = self.endpoints.hedge_delay('ttft')
+            if delay is not None:
+                done, _ = await asyncio.wait(set(contenders), timeout=delay)
+                if not done and self.endpoints.is_available(exclude=tuple(nodes)):
+                    print(f"Hedging stream after {delay:.2f}s")
+                    backup_stream = self._astream_from(endpoint, data, exclude=tuple(nodes))
+                    contenders[asyncio.ensure_future(backup_stream.__anext__())] = backup_stream
+
+            winner, text = await self._first_token(contenders)
+            if len(contenders) > 1:
+                self.endpoints.record_hedge(won=winner is not stream)
+            if text is None:
+                return
+            yield text
+            async for text in winner:
+                yield text
+        finally:
+            # Also runs when we are cancelled or closed before a winner is
+            # known: stop every __anext__ still running, then close every
+            # stream so each releases its endpoint
+            pending = [task for task in contenders if not task.done()]
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            for contender in contenders.values():
+                await contender.aclose()
+
+    @staticmethod
+    async def _first_token(contenders: Dict[asyncio.Future, AsyncIterator[str]]):
+        """
+        Wait for the first contender to produce a token (or finish cleanly)
+        and close the rest. Returns (stream, first text or None).
+        """
+        pending = set(contenders)
+        winner = None
+        error = None
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    exception = task.exception()
+                    if winner is None and (exception is None or isinstance(exception, StopAsyncIteration)):
+                        winner = task
+                    elif exception is not None and not isinstance(exception, StopAsyncIteration):
+                        error = exception
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            for task, stream in contenders.items():
+                if task is not winner:
+                    await stream.aclose()
+
+        if winner is None:
+            raise error
+        if winner.exception() is not None:
+            # Stream ended without producing any text
+            return contenders[winner], None
+        return contenders[winner], winner.result()
+
+    def stream_completion(self, prompt: str, max_tokens: Optional[int] = None,
+                          schema: Optional[Dict] = None) -> Iterator[str]:
+        """Stream completion text deltas from LM Studio as they are decoded"""
+        return self._stream("completions", self._build_completion_payload(prompt, max_tokens, schema))
+
+    def astream_completion(self, prompt: str, max_tokens: Optional[int] = None,
+                           schema: Optional[Dict] = None) -> AsyncIterator[str]:
+        """Async variant of stream_completion"""
+        return self._astream("completions", self._build_completion_payload(prompt, max_tokens, schema))
+
+    def stream_chat_completion(self, messages: list, max_tokens: Optional[int] = None,
+                               schema: Optional[Dict] = None) -> Iterator[str]:
+        """Stream chat completion text deltas from LM Studio as they are decoded"""
+        return self._stream("chat/completions", self._build_chat_payload(messages, max_tokens, schema))
+
+    def astream_chat_completion(self, messages: list, max_tokens: Optional[int] = None,
+                                schema: Optional[Dict] = None) -> AsyncIterator[str]:
+        """Async variant of stream_chat_completion"""
+        return self._astream("chat/completions", self._build_chat_payload(messages, max_tokens, schema))
+
+    def _health_result(self, response: httpx.Response) -> Dict[str, Any]:
+        if response.status_code == 200:
+            models = response.json().get('data', [])
             return {
-                'success': False,
-                'error': f"Failed to parse response: {str(e)}",
-                'processing_time': processing_time,
-                'token_usage': 0
+                'status': 'healthy',
+                'available_models': [model.get('id', 'unknown') for model in models],
+                'current_model': self.model_name
             }
-    
-    def check_health(self) -> Dict[str, Any]:
-        """Check if LM Studio is running and accessible"""
-        try:
-            # Try to get models list
-            response = requests.get(
-                f"{self.base_url}/models",
-                timeout=10  # Shorter timeout for health check
-            )
-            
-            if response.status_code == 200:
-                models = response.json().get('data', [])
-                return {
-                    'status': 'healthy',
-                    'available_models': [model.get('id', 'unknown') for model in models],
-                    'current_model': self.model_name
-                }
-            else:
+        return {
+            'status': 'unhealthy',
+            'error': f"HTTP {response.status_code}"
+        }
+
+    def _health_probe(self, node: Endpoint):
+        """Probe for one endpoint, run periodically by its background health monitor"""
+        def probe() -> Dict[str, Any]:
+            try:
+                # Try to get models list
+                response = self._get_sync_client().get(
+                    node.url("models"),
+                    timeout=self.health_timeout  # Shorter timeout for health check
+                )
+                return self._health_result(response)
+            except Exception as e:
                 return {
                     'status': 'unhealthy',
-                    'error': f"HTTP {response.status_code}"
+                    'error': str(e)
                 }
-        except Exception as e:
-            return {
-                'status': 'unhealthy',
-                'error': str(e)
-            }
-    
+        return probe
+
+    def _combine_health(self, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Overall health is the first healthy endpoint's, plus every endpoint's detail"""
+        endpoints = [
+            dict(result, **node.snapshot())
+            for node, result in zip(self.endpoints, results)
+        ]
+        healthy = [result for result in results if result.get('status') == 'healthy']
+        overall = dict(healthy[0] if healthy else results[0])
+        overall['endpoints'] = endpoints
+        overall['circuit'] = self.endpoints.circuit_state()
+        return overall
+
+    def check_health(self) -> Dict[str, Any]:
+        """
+        Check if LM Studio is running and accessible. Uses each endpoint's
+        cached background probe when there is one, so this never blocks on
+        the network in the request path.
+        """
+        results = []
+        for node in self.endpoints:
+            cached = node.monitor.cached_result() if node.monitor else None
+            results.append(cached if cached is not None else self._health_probe(node)())
+        return self._combine_health(results)
+
+    async def acheck_health(self) -> Dict[str, Any]:
+        """Async variant of check_health"""
+        results = []
+        for node in self.endpoints:
+            cached = node.monitor.cached_result() if node.monitor else None
+            if cached is not None:
+                results.append(cached)
+                continue
+            try:
+                response = await self._get_async_client().get(node.url("models"), timeout=self.health_timeout)
+                results.append(self._health_result(response))
+            except Exception as e:
+                results.append({
+                    'status': 'unhealthy',
+                    'error': str(e)
+                })
+        return self._combine_health(results)
+
     def test_simple_completion(self) -> Dict[str, Any]:
         """Test with a simple completion request"""
         return self.generate_completion("Hello", max_tokens=10)
-    
+
     def extract_json_from_response(self, text: str) -> Optional[Dict]:
         """Extract JSON from AI response text"""
         try:
             # Try to find JSON in the response
             start_markers = ['{', '[']
             end_markers = ['}', ']']
-            
+
             for start_marker in start_markers:
                 start_idx = text.find(start_marker)
                 if start_idx != -1:
                     # Find the matching closing marker
                     bracket_count = 0
                     end_idx = start_idx
-                    
+
                     for i, char in enumerate(text[start_idx:], start_idx):
                         if char in start_markers:
                             bracket_count += 1
@@ -216,15 +676,15 @@ class LMStudioClient:
                             if bracket_count == 0:
                                 end_idx = i
                                 break
-                    
+
                     if end_idx > start_idx:
                         json_str = text[start_idx:end_idx + 1]
                         try:
                             return json.loads(json_str)
                         except json.JSONDecodeError:
                             continue
-            
+
             return None
         except Exception as e:
             print(f"Error extracting JSON: {str(e)}")
-            return None
\ No newline at end of file
+            return None
@@ -0,0 +1,144 @@
+import asyncio
+import threading
+import time
+import weakref
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from django.conf import settings
+from django.core.cache import cache
+from ..constants import PROMPT_CONTEXT_SNAPSHOT, PROMPT_CONTEXT_MAX_AGE
+
+VERSION_KEY = 'aiengine:prompt-context:version'
+
+# {'recent_tasks': [...], 'recent_context': [...], 'categories': [...]}
+Loader = Callable[[], Dict[str, List[Dict]]]
+
+
+class PromptContextSnapshot:
+    """Recent tasks, recent context and categories as of one version; never mutated"""
+
+    def __init__(self, version: int, recent_tasks: List[Dict], recent_context: List[Dict], categories: List[Dict]):
+        self.version = version
+        self.recent_tasks = recent_tasks
+        self.recent_context = recent_context
+        self.categories = categories
+        self.built_at = time.monotonic()
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.built_at
+
+
+class PromptContextStore:
+    """
+    Process-wide snapshot of the context every enhancement prompt starts from
+
+    Saving or deleting a Task, Category or Context bumps a version counter
+    in the Django cache (see signals.py). A request compares the counter
+    with its snapshot's version and only reloads from the database when
+    they differ, so in steady state building a prompt reads no rows. With
+    a per-process cache (the default LocMemCache) other processes' writes
+    are not seen, so a snapshot is also reloaded once it is older than
+    AI_PROMPT_CONTEXT_MAX_AGE seconds. Point CACHES at Redis or Memcached
+    to share the counter between processes.
+    """
+
+    def __init__(self, max_age: Optional[float] = None):
+        self.max_age = max_age if max_age is not None else getattr(settings, 'AI_PROMPT_CONTEXT_MAX_AGE', PROMPT_CONTEXT_MAX_AGE)
+        self._snapshot: Optional[PromptContextSnapshot] = None
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        # asyncio.Lock is bound to one event loop, so aget keeps one per loop
+        self._async_rebuild_locks = weakref.WeakKeyDictionary()
+        self._stats = {'hits': 0, 'rebuilds': 0, 'invalidations': 0}
+
+    @staticmethod
+    def invalidate():
+        """Bump the version so every process reloads on its next request"""
+        if not cache.add(VERSION_KEY, 1, timeout=None):
+            try:
+                cache.incr(VERSION_KEY)
+            except ValueError:
+                # Evicted between add and incr
+                cache.set(VERSION_KEY, 1, timeout=None)
+
+    def _current(self, version: int) -> Optional[PromptContextSnapshot]:
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == version and snapshot.age < self.max_age:
+            with self._lock:
+                self._stats['hits'] += 1
+            return snapshot
+        return None
+
+    def _store(self, version: int, loaded: Dict[str, List[Dict]]) -> PromptContextSnapshot:
+        snapshot = PromptContextSnapshot(version, loaded['recent_tasks'], loaded['recent_context'], loaded['categories'])
+        with self._lock:
+            if self._snapshot is not None and self._snapshot.version != version:
+                self._stats['invalidations'] += 1
+            self._stats['rebuilds'] += 1
+            # A slower rebuild of an older version may land last; its version
+            # no longer matches, so the next request simply reloads
+            self._snapshot = snapshot
+        return snapshot
+
+    def get(self, load: Loader) -> PromptContextSnapshot:
+        """The current snapshot, reloaded with `load` when stale"""
+        # Read the version before loading: a write during the load leaves the
+        # snapshot one version behind, so the next request reloads again
+        version = cache.get(VERSION_KEY, 0)
+        snapshot = self._current(version)
+        if snapshot is not None:
+            return snapshot
+        # One thread reloads; the others wait for it instead of querying too
+        with self._rebuild_lock:
+            snapshot = self._current(version)
+            if snapshot is not None:
+                return snapshot
+            return self._store(version, load())
+
+    def _async_rebuild_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            lock = self._async_rebuild_locks.get(loop)
+            if lock is None:
+                lock = self._async_rebuild_locks[loop] = asyncio.Lock()
+        return lock
+
+    async def aget(self, aload: Callable[[], Awaitable[Dict[str, List[Dict]]]]) -> PromptContextSnapshot:
+        """Async variant of get"""
+        version = await cache.aget(VERSION_KEY, 0)
+        snapshot = self._current(version)
+        if snapshot is not None:
+            return snapshot
+        # One coroutine reloads; the others on the loop wait for it
+        async with self._async_rebuild_lock():
+            snapshot = self._current(version)
+            if snapshot is not None:
+                return snapshot
+            return self._store(version, await aload())
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        with self._lock:
+            return dict(
+                self._stats,
+                version=snapshot.version if snapshot is not None else None,
+                age=round(snapshot.age, 1) if snapshot is not None else None,
+                recent_tasks=len(snapshot.recent_tasks) if snapshot is not None else 0,
+                categories=len(snapshot.categories) if snapshot is not None else 0,
+            )
+
+
+_store: Optional[PromptContextStore] = None
+_store_lock = threading.Lock()
+
+
+def get_prompt_context_store() -> Optional[PromptContextStore]:
+    """Process-wide PromptContextStore, or None when AI_PROMPT_CONTEXT_SNAPSHOT is off"""
+    global _store
+    if not getattr(settings, 'AI_PROMPT_CONTEXT_SNAPSHOT', PROMPT_CONTEXT_SNAPSHOT):
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = PromptContextStore()
+    return _store
@@ -0,0 +1,176 @@
+import asyncio
+import math
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from django.conf import settings
+from django.db import close_old_connections
+from ..constants import (
+    PROVISIONAL_MAX_WORKERS, PROVISIONAL_MAX_PENDING, PROVISIONAL_RESULT_TTL, PROVISIONAL_MAX_ENTRIES
+)
+from .admission import AdmissionRejected
+
+
+class _Upgrade:
+    """One background enhancement replacing a provisional answer"""
+
+    def __init__(self, future: Future, key: Optional[str]):
+        self.future = future
+        self.key = key
+        self.started = time.monotonic()
+        self.finished: Optional[float] = None
+
+
+class UpgradeRegistry:
+    """
+    Background LLM enhancements behind provisional answers
+
+    A provisional response is built from rules, history and the caches
+    without waiting on the model; the full enhancement is submitted here
+    and runs on a small thread pool, so it survives the request that
+    started it whether the app is served over ASGI or WSGI. Clients fetch
+    the upgraded result by id (see views.enhancement_upgrade). Finished
+    results are kept for AI_PROVISIONAL_RESULT_TTL seconds.
+
+    A newer submission with the same request key cancels the previous
+    upgrade if it has not started yet, so a debounced form does not queue
+    one generation per keystroke. Once AI_PROVISIONAL_MAX_PENDING upgrades
+    are queued or running, submit raises AdmissionRejected.
+
+    The registry is per process: a poll served by another worker process
+    answers 404. Deployments with several processes need sticky routing
+    for the upgrade URL, or the job queue (EnhancementJob) instead.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, ttl: Optional[float] = None,
+                 max_entries: Optional[int] = None, max_pending: Optional[int] = None):
+        self.ttl = ttl if ttl is not None else getattr(settings, 'AI_PROVISIONAL_RESULT_TTL', PROVISIONAL_RESULT_TTL)
+        self.max_entries = max_entries or getattr(settings, 'AI_PROVISIONAL_MAX_ENTRIES', PROVISIONAL_MAX_ENTRIES)
+        self.max_pending = max_pending or getattr(settings, 'AI_PROVISIONAL_MAX_PENDING', PROVISIONAL_MAX_PENDING)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or getattr(settings, 'AI_PROVISIONAL_MAX_WORKERS', PROVISIONAL_MAX_WORKERS),
+            thread_name_prefix='enhancement-upgrade'
+        )
+        self._lock = threading.Lock()
+        self._upgrades: 'OrderedDict[str, _Upgrade]' = OrderedDict()
+        self._keys: Dict[str, str] = {}
+        self._pending = 0
+        self._upgrade_seconds = 0.0
+        self._stats = {'submitted': 0, 'ready': 0, 'failed': 0, 'superseded': 0, 'evicted': 0, 'rejected': 0}
+
+    def submit(self, work: Callable[[], Dict], key: Optional[str] = None) -> str:
+        """
+        Run `work` (returning an enhancement result) in the background;
+        returns the upgrade id. Raises AdmissionRejected while
+        max_pending upgrades are already queued or running.
+        """
+        upgrade_id = uuid.uuid4().hex
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._stats['rejected'] += 1
+                ready = self._stats['ready']
+                mean = self._upgrade_seconds / ready if ready else 1.0
+                raise AdmissionRejected('upgrades_full', max(1, math.ceil(mean)))
+            self._prune()
+            previous = self._upgrades.get(self._keys.get(key)) if key else None
+            upgrade = _Upgrade(self._executor.submit(self._run, work), key)
+            self._upgrades[upgrade_id] = upgrade
+            if key:
+                self._keys[key] = upgrade_id
+            self._pending += 1
+            self._stats['submitted'] += 1
+        if previous is not None and previous.future.cancel():
+            with self._lock:
+                self._stats['superseded'] += 1
+        upgrade.future.add_done_callback(lambda _: self._finished(upgrade))
+        return upgrade_id
+
+    @staticmethod
+    def _run(work: Callable[[], Dict]) -> Dict:
+        try:
+            return work()
+        finally:
+            # Pool threads outlive requests, so nothing else closes their connections
+            close_old_connections()
+
+    def _finished(self, upgrade: _Upgrade):
+        with self._lock:
+            upgrade.finished = time.monotonic()
+            self._pending -= 1
+            if upgrade.future.cancelled():
+                return
+            error = upgrade.future.exception()
+            if error is None and upgrade.future.result().get('success'):
+                self._stats['ready'] += 1
+                self._upgrade_seconds += upgrade.finished - upgrade.started
+            else:
+                self._stats['failed'] += 1
+
+    def _prune(self):
+        """Drop expired results, then the oldest finished ones beyond max_entries. Caller holds the lock."""
+        now = time.monotonic()
+        for upgrade_id, upgrade in list(self._upgrades.items()):
+            expired = upgrade.finished is not None and now - upgrade.finished > self.ttl
+            if expired or (len(self._upgrades) >= self.max_entries and upgrade.future.done()):
+                del self._upgrades[upgrade_id]
+                if upgrade.key and self._keys.get(upgrade.key) == upgrade_id:
+                    del self._keys[upgrade.key]
+                self._stats['evicted'] += 1
+
+    @staticmethod
+    def _describe(upgrade: _Upgrade) -> Dict[str, Any]:
+        future = upgrade.future
+        if future.cancelled():
+            return {'status': 'superseded'}
+        if not future.done():
+            return {'status': 'pending', 'elapsed': round(time.monotonic() - upgrade.started, 3)}
+        error = future.exception()
+        if isinstance(error, AdmissionRejected):
+            return {'status': 'failed', 'reason': error.reason, 'retry_after': error.retry_after}
+        if error is not None:
+            return {'status': 'failed', 'reason': str(error)}
+        result = future.result()
+        return {'status': 'ready' if result.get('success') else 'failed', 'result': result}
+
+    async def await_upgrade(self, upgrade_id: str, timeout: float = 0) -> Optional[Dict[str, Any]]:
+        """
+        Status of an upgrade: pending, ready (with the result), failed or
+        superseded; None for an unknown or expired id. With a timeout, waits
+        up to that long for a pending upgrade to finish (long polling).
+        """
+        with self._lock:
+            upgrade = self._upgrades.get(upgrade_id)
+        if upgrade is None:
+            return None
+        if timeout > 0 and not upgrade.future.done():
+            waiter = asyncio.wrap_future(upgrade.future)
+            # Errors are reported by _describe; retrieve them so asyncio does not log them
+            waiter.add_done_callback(lambda done: done.cancelled() or done.exception())
+            # asyncio.wait never cancels, so a poll timing out leaves the upgrade running
+            await asyncio.wait({waiter}, timeout=timeout)
+        return self._describe(upgrade)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            ready = self._stats['ready']
+            return dict(
+                self._stats, pending=self._pending, max_pending=self.max_pending, stored=len(self._upgrades),
+                mean_upgrade_seconds=round(self._upgrade_seconds / ready, 3) if ready else None
+            )
+
+
+_registry: Optional[UpgradeRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_upgrade_registry() -> UpgradeRegistry:
+    """Process-wide UpgradeRegistry, created on first use"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = UpgradeRegistry()
+    return _registry
@@ -0,0 +1,219 @@
+import re
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+from django.conf import settings
+from ..constants import (
+    ENHANCEMENT_CACHE_MAX_ENTRIES, ENHANCEMENT_CACHE_TTL, SEMANTIC_CACHE, SEMANTIC_CACHE_DIMENSIONS,
+    SEMANTIC_CACHE_THRESHOLD
+)
+from ..utils.temporal_parser import DAYPART_HOURS, MONTHS, WEEKDAYS
+from .enhancement_cache import get_enhancement_cache
+
+# Shorthand common in quickly typed task names
+ABBREVIATIONS = {
+    'tmrw': 'tomorrow', 'tmr': 'tomorrow', 'tmw': 'tomorrow', '2moro': 'tomorrow',
+    'tdy': 'today', 'tonite': 'tonight', 'mtg': 'meeting', 'appt': 'appointment',
+    'docs': 'documents', 'bday': 'birthday', 'wk': 'week', 'asap': 'urgent',
+}
+
+# Words that carry no meaning of their own in a task name
+FILLER_WORDS = frozenset('a an the to do go get need must should some my for of and with'.split())
+
+# Words that turn a task into its opposite ("do not pay invoice"); "don't"
+# and "can't" split into "don"/"can" and "t"
+NEGATIONS = frozenset('not no never dont don cannot cant t without'.split())
+
+# Words naming when rather than what; the deadline is settled from them
+# separately, so two names may differ in these and still be the same task
+TIME_WORDS = frozenset(WEEKDAYS) | frozenset(MONTHS) | frozenset(DAYPART_HOURS) | frozenset(
+    'today tomorrow tonight day week month next this by on at before until till eod eow eom am pm'.split()
+)
+
+_SUFFIXES = (('ies', 'y'), ('ing', ''), ('al', ''), ('es', ''), ('s', ''))
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_CLOCK_RE = re.compile(r"\d{1,2}(?:am|pm)?")
+
+
+class HashedNgramEmbedder:
+    """
+    Embed short task names without a model
+
+    Words are normalised (shorthand expanded, filler words dropped) and
+    hashed into a fixed number of signed buckets as whole words and as
+    character trigrams of each word, so "grocery" and "groceries" share
+    most of their features. Vectors are L2-normalised, making the dot
+    product the cosine similarity.
+    """
+
+    def __init__(self, dimensions: int = SEMANTIC_CACHE_DIMENSIONS):
+        self.dimensions = dimensions
+
+    @staticmethod
+    def stem(word: str) -> str:
+        """Strip one common suffix: groceries -> grocery, cleaning -> clean"""
+        for suffix, replacement in _SUFFIXES:
+            if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+                return word[:-len(suffix)] + replacement
+        return word
+
+    @classmethod
+    def words(cls, text: str):
+        return [ABBREVIATIONS.get(word, word) for word in _WORD_RE.findall((text or '').casefold())]
+
+    @classmethod
+    def normalize(cls, text: str):
+        words = cls.words(text)
+        meaningful = [word for word in words if word not in FILLER_WORDS]
+        return [cls.stem(word) for word in meaningful or words]
+
+    @classmethod
+    def content(cls, text: str) -> Tuple[frozenset, bool]:
+        """(stemmed words saying what the task is, whether it is negated)"""
+        words = cls.words(text)
+        content = frozenset(
+            cls.stem(word) for word in words
+            if word not in FILLER_WORDS and word not in NEGATIONS and word not in TIME_WORDS
+            and not _CLOCK_RE.fullmatch(word)
+        )
+        return content, any(word in NEGATIONS for word in words)
+
+    def features(self, text: str):
+        for word in self.normalize(text):
+            yield 'w:' + word, 1.0
+            padded = f'<{word}>'
+            for i in range(len(padded) - 2):
+                yield 'c:' + padded[i:i + 3], 0.5
+
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for feature, weight in self.features(text):
+            digest = zlib.crc32(feature.encode('utf-8'))
+            sign = 1.0 if digest & 0x80000000 else -1.0
+            vector[digest % self.dimensions] += sign * weight
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class SemanticCache:
+    """
+    Near-duplicate lookup in front of EnhancementCache
+
+    Every stored enhancement adds its task-name vector to a fixed-size
+    NumPy matrix (a ring buffer, oldest rows overwritten) together with the
+    fingerprint of everything else the prompt was built from. A lookup
+    takes the most similar row with the same context fingerprint and, when
+    the cosine similarity reaches the threshold, returns that row's exact
+    cache key; the value itself stays in EnhancementCache with its TTL.
+
+    Similar is not enough: a name that adds words to the cached one
+    ("call dentist urgent" after "call dentist") or negates it ("do not
+    pay invoice") asks for something else and is never served the
+    cached result. Only words about when may differ.
+    """
+
+    def __init__(self, threshold: Optional[float] = None, capacity: Optional[int] = None,
+                 embedder: Optional[HashedNgramEmbedder] = None, ttl: Optional[float] = None):
+        self.threshold = threshold if threshold is not None else getattr(
+            settings, 'AI_SEMANTIC_CACHE_THRESHOLD', SEMANTIC_CACHE_THRESHOLD)
+        self.capacity = capacity or getattr(settings, 'AI_ENHANCEMENT_CACHE_MAX_ENTRIES', ENHANCEMENT_CACHE_MAX_ENTRIES)
+        self.ttl = ttl if ttl is not None else getattr(settings, 'AI_ENHANCEMENT_CACHE_TTL', ENHANCEMENT_CACHE_TTL)
+        self.embedder = embedder or HashedNgramEmbedder()
+        self._lock = threading.Lock()
+        self._vectors = np.zeros((self.capacity, self.embedder.dimensions), dtype=np.float32)
+        # Per row: context fingerprint id, expiry (monotonic), exact cache key
+        self._contexts = np.full(self.capacity, -1, dtype=np.int64)
+        self._expires = np.zeros(self.capacity, dtype=np.float64)
+        self._keys = [None] * self.capacity
+        self._contents = [None] * self.capacity
+        self._context_ids: Dict[str, int] = {}
+        self._next = 0
+        self._stats = {'lookups': 0, 'hits': 0, 'stores': 0, 'rejected_changed_words': 0}
+
+    def _context_id(self, context_key: str) -> int:
+        context_id = self._context_ids.get(context_key)
+        if context_id is None:
+            context_id = self._context_ids[context_key] = len(self._context_ids)
+        return context_id
+
+    @staticmethod
+    def reusable(content: Tuple[frozenset, bool], cached_content: Tuple[frozenset, bool]) -> bool:
+        """Whether a name with `content` may reuse the result of one with `cached_content`"""
+        words, negated = content
+        cached_words, cached_negated = cached_content
+        return negated == cached_negated and words <= cached_words
+
+    def add(self, task_name: str, context_key: str, cache_key: str):
+        vector = self.embedder.embed(task_name)
+        content = self.embedder.content(task_name)
+        with self._lock:
+            row = self._next % self.capacity
+            self._next += 1
+            self._vectors[row] = vector
+            self._contexts[row] = self._context_id(context_key)
+            self._expires[row] = time.monotonic() + self.ttl
+            self._keys[row] = cache_key
+            self._contents[row] = content
+            self._stats['stores'] += 1
+            if len(self._context_ids) > 4 * self.capacity:
+                self._compact_context_ids()
+
+    def _compact_context_ids(self):
+        """Forget fingerprints no row refers to any more; must hold the lock"""
+        live = set(self._contexts[self._contexts >= 0].tolist())
+        remap = {old: new for new, old in enumerate(sorted(live))}
+        self._context_ids = {key: remap[old] for key, old in self._context_ids.items() if old in remap}
+        self._contexts = np.array([remap.get(old, -1) for old in self._contexts.tolist()], dtype=np.int64)
+
+    def lookup(self, task_name: str, context_key: str) -> Optional[Tuple[str, float]]:
+        """(exact cache key, similarity) of the closest usable entry, or None"""
+        vector = self.embedder.embed(task_name)
+        content = self.embedder.content(task_name)
+        with self._lock:
+            self._stats['lookups'] += 1
+            context_id = self._context_ids.get(context_key)
+            if context_id is None:
+                return None
+            usable = (self._contexts == context_id) & (self._expires > time.monotonic())
+            if not usable.any():
+                return None
+            similarities = np.where(usable, self._vectors @ vector, -1.0)
+            for row in np.argsort(-similarities).tolist():
+                similarity = float(similarities[row])
+                if similarity < self.threshold:
+                    return None
+                if self.reusable(content, self._contents[row]):
+                    self._stats['hits'] += 1
+                    return self._keys[row], similarity
+                self._stats['rejected_changed_words'] += 1
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = min(self._next, self.capacity)
+        stats['hit_rate'] = round(stats['hits'] / stats['lookups'], 4) if stats['lookups'] else 0.0
+        stats['threshold'] = self.threshold
+        return stats
+
+
+_semantic_cache: Optional[SemanticCache] = None
+_semantic_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> Optional[SemanticCache]:
+    """
+    Process-wide SemanticCache, or None when AI_SEMANTIC_CACHE is off or
+    the exact enhancement cache (which holds the values) is disabled
+    """
+    global _semantic_cache
+    if not getattr(settings, 'AI_SEMANTIC_CACHE', SEMANTIC_CACHE) or get_enhancement_cache() is None:
+        return None
+    if _semantic_cache is None:
+        with _semantic_cache_lock:
+            if _semantic_cache is None:
+                _semantic_cache = SemanticCache()
+    return _semantic_cache
@@ -0,0 +1,190 @@
+import asyncio
+import copy
+import threading
+import weakref
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class _Call:
+    """One in-flight call shared by every thread asking for the same key"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class FlightAbandoned(Exception):
+    """A stream registered with AsyncSingleFlight.lead ended without a result"""
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical calls across threads
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight block until it finishes and get a copy of the same result
+    (or the same exception). Nothing is remembered once the call returns;
+    that is the job of EnhancementCache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._stats = {'leaders': 0, 'coalesced': 0}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Return (result, shared); shared is True when another caller did the work"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self._stats['leaders'] += 1
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result), True
+
+        try:
+            result = fn()
+            # Followers copy from a snapshot so the leader may mutate its own result
+            call.result = copy.deepcopy(result)
+            return result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._calls))
+
+
+class AsyncSingleFlight:
+    """
+    Coalesce concurrent identical coroutines on an event loop
+
+    The leader's coroutine runs as its own task and every caller awaits it
+    through asyncio.shield, so a caller that disconnects does not cancel
+    the generation the others are waiting on. Once the last caller is
+    cancelled nobody wants the result, and the task is cancelled too.
+
+    A caller that drives the generation itself (a stream) registers with
+    lead() and settles the returned future; others join it the same way.
+    """
+
+    def __init__(self):
+        self._calls: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Future]]' = weakref.WeakKeyDictionary()
+        self._waiting: Dict[asyncio.Future, int] = {}
+        # Where each in-flight call is registered: (calls of its loop, key)
+        self._registered: Dict[asyncio.Future, Tuple[Dict[str, asyncio.Future], str]] = {}
+        self._stats = {'leaders': 0, 'coalesced': 0, 'abandoned': 0}
+
+    def _loop_calls(self) -> Dict[str, asyncio.Future]:
+        loop = asyncio.get_running_loop()
+        calls = self._calls.get(loop)
+        if calls is None:
+            calls = self._calls[loop] = {}
+        return calls
+
+    def join(self, key: str) -> Optional[asyncio.Future]:
+        """The in-flight call for `key` on the running loop, if any"""
+        return self._loop_calls().get(key)
+
+    def lead(self, key: str) -> Optional[asyncio.Future]:
+        """
+        Register the caller as running `key` itself, or None when a call is
+        already in flight. The returned future must be passed to settle()
+        whatever happens.
+        """
+        calls = self._loop_calls()
+        if key in calls:
+            return None
+        self._stats['leaders'] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._register(calls, key, future)
+        return future
+
+    @staticmethod
+    def settle(future: asyncio.Future, result: Any = None):
+        """Resolve a future from lead() with `result`, or as abandoned when None"""
+        if future.done():
+            return
+        if result is None:
+            future.set_exception(FlightAbandoned())
+        else:
+            future.set_result(copy.deepcopy(result))
+
+    async def do(self, key: str, make_coro: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Return (result, shared); shared is True when another caller did the work"""
+        calls = self._loop_calls()
+        while True:
+            task = calls.get(key)
+            shared = task is not None
+            if shared:
+                self._stats['coalesced'] += 1
+            else:
+                self._stats['leaders'] += 1
+                task = asyncio.ensure_future(make_coro())
+                self._register(calls, key, task)
+
+            try:
+                result = await self.wait(task)
+            except FlightAbandoned:
+                # The stream we joined went away: run it, or join whoever did
+                continue
+            # Every caller gets its own copy; the task result is shared
+            return copy.deepcopy(result), shared
+
+    async def wait(self, task: asyncio.Future) -> Any:
+        """Await an in-flight call as one of its callers"""
+        self._waiting[task] = self._waiting.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # A stream's future belongs to its leader, who still wants it
+            if self._waiting[task] == 1 and not task.done() and isinstance(task, asyncio.Task):
+                # Unregistered at once: a caller arriving before the task has
+                # unwound starts a new call instead of joining a cancelled one
+                self._unregister(task)
+                task.cancel()
+                self._stats['abandoned'] += 1
+            raise
+        finally:
+            self._waiting[task] -= 1
+            if not self._waiting[task]:
+                del self._waiting[task]
+
+    def _register(self, calls: Dict[str, asyncio.Future], key: str, task: asyncio.Future):
+        calls[key] = task
+        self._registered[task] = (calls, key)
+        task.add_done_callback(self._finish)
+
+    def _unregister(self, task: asyncio.Future):
+        calls, key = self._registered.pop(task, (None, None))
+        if calls is not None and calls.get(key) is task:
+            del calls[key]
+
+    def _finish(self, task: asyncio.Future):
+        self._unregister(task)
+        if not task.cancelled():
+            # Mark the exception retrieved even if every caller went away
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        in_flight = sum(len(calls) for calls in self._calls.values())
+        return dict(self._stats, in_flight=in_flight)
+
+
+# Process-wide groups for enhancement generations, keyed on the EnhancementCache key
+enhancement_flights = SingleFlight()
+async_enhancement_flights = AsyncSingleFlight()
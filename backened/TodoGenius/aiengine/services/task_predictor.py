@@ -0,0 +1,260 @@
+import json
+import os
+import random
+import tempfile
+import threading
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from django.conf import settings
+from ..constants import PREDICTOR_DIMENSIONS, PREDICTOR_MIN_SAMPLES
+from .semantic_cache import HashedNgramEmbedder
+
+# (title, category name or None, priority score)
+Example = Tuple[str, Optional[str], float]
+
+_TEMPERATURES = np.concatenate([np.arange(0.2, 3.0, 0.1), np.arange(3.0, 10.5, 0.5)])
+
+
+class TaskPredictor:
+    """
+    Category and priority of a task from its title, learnt from past tasks
+
+    Titles become sparse hashed features (normalised words, word pairs and
+    character trigrams, L2-normalised). A softmax head over the known
+    categories and a sigmoid head for the priority score are trained by
+    SGD, one example at a time, so new rows can be learnt without starting
+    over. Softmax scores are temperature-scaled on held-out tasks so that
+    the reported confidence matches how often predictions are right.
+    """
+
+    def __init__(self, dimensions: int = PREDICTOR_DIMENSIONS, learning_rate: float = 0.5, l2: float = 1e-5):
+        self.dimensions = dimensions
+        self.learning_rate = learning_rate
+        self.l2 = l2
+        self.categories: List[str] = []
+        self._category_index: Dict[str, int] = {}
+        self.category_weights = np.zeros((0, dimensions), dtype=np.float32)
+        self.category_bias = np.zeros(0, dtype=np.float32)
+        self.priority_weights = np.zeros(dimensions, dtype=np.float32)
+        self.priority_bias = 0.0
+        self.temperature = 1.0
+        # Held-out quality, set by calibrate()
+        self.category_accuracy: Optional[float] = None
+        self.priority_error: Optional[float] = None
+        self.samples = 0
+        # ISO timestamp of the newest row learnt, for incremental training
+        self.trained_until: Optional[str] = None
+
+    def features(self, title: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(bucket indices, weights) of the title's hashed features"""
+        words = HashedNgramEmbedder.normalize(title)
+        buckets: Dict[int, float] = {}
+        grams = [('w:' + word, 1.0) for word in words]
+        grams += [('b:' + first + ' ' + second, 1.0) for first, second in zip(words, words[1:])]
+        for word in words:
+            padded = f'<{word}>'
+            grams += [('c:' + padded[i:i + 3], 0.5) for i in range(len(padded) - 2)]
+        for gram, weight in grams:
+            bucket = zlib.crc32(gram.encode('utf-8')) % self.dimensions
+            buckets[bucket] = buckets.get(bucket, 0.0) + weight
+        indices = np.fromiter(buckets.keys(), dtype=np.int64, count=len(buckets))
+        values = np.fromiter(buckets.values(), dtype=np.float32, count=len(buckets))
+        norm = np.linalg.norm(values)
+        return indices, values / norm if norm else values
+
+    def _category_id(self, name: str) -> int:
+        index = self._category_index.get(name)
+        if index is None:
+            index = self._category_index[name] = len(self.categories)
+            self.categories.append(name)
+            self.category_weights = np.vstack([self.category_weights, np.zeros((1, self.dimensions), dtype=np.float32)])
+            self.category_bias = np.append(self.category_bias, np.float32(0.0))
+        return index
+
+    def _category_scores(self, indices: np.ndarray, values: np.ndarray) -> np.ndarray:
+        return self.category_weights[:, indices] @ values + self.category_bias
+
+    @staticmethod
+    def _softmax(scores: np.ndarray) -> np.ndarray:
+        exp = np.exp(scores - scores.max())
+        return exp / exp.sum()
+
+    def partial_fit(self, examples: Sequence[Example], epochs: int = 1, seed: int = 0):
+        """Learn from `examples`, continuing from the current weights"""
+        rng = random.Random(seed)
+        order = list(range(len(examples)))
+        featurized = [self.features(title) for title, _, _ in examples]
+        for epoch in range(epochs):
+            rng.shuffle(order)
+            rate = self.learning_rate / (1 + epoch)
+            for i in order:
+                _, category, priority = examples[i]
+                indices, values = featurized[i]
+                decay = 1 - rate * self.l2
+                if category:
+                    target = self._category_id(category)
+                    gradient = self._softmax(self._category_scores(indices, values))
+                    gradient[target] -= 1.0
+                    self.category_weights[:, indices] *= decay
+                    self.category_weights[:, indices] -= rate * np.outer(gradient, values)
+                    self.category_bias -= rate * gradient
+                if priority is not None:
+                    predicted = 1 / (1 + np.exp(-(self.priority_weights[indices] @ values + self.priority_bias)))
+                    error = predicted - min(1.0, max(0.0, priority))
+                    self.priority_weights[indices] *= decay
+                    self.priority_weights[indices] -= rate * error * values
+                    self.priority_bias -= float(rate * error)
+        self.samples += len(examples)
+
+    def predict(self, title: str, temperature: Optional[float] = None) -> Dict[str, Any]:
+        """{'category', 'category_confidence', 'priority_score'} for a title"""
+        indices, values = self.features(title)
+        priority = 1 / (1 + np.exp(-(self.priority_weights[indices] @ values + self.priority_bias)))
+        result = {'category': None, 'category_confidence': 0.0, 'priority_score': round(float(priority), 3)}
+        if self.categories:
+            scores = self._category_scores(indices, values) / (temperature or self.temperature)
+            probabilities = self._softmax(scores)
+            best = int(np.argmax(probabilities))
+            result['category'] = self.categories[best]
+            result['category_confidence'] = round(float(probabilities[best]), 4)
+        return result
+
+    def _held_out_scores(self, examples: Sequence[Example]) -> Tuple[np.ndarray, np.ndarray]:
+        """Raw scores of the labelled examples with known categories, and their targets"""
+        rows, targets = [], []
+        for title, category, _ in examples:
+            if category in self._category_index:
+                rows.append(self._category_scores(*self.features(title)))
+                targets.append(self._category_index[category])
+        return np.array(rows).reshape(len(rows), len(self.categories)), np.array(targets, dtype=np.int64)
+
+    def calibrate(self, held_out: Sequence[Example]):
+        """Fit the softmax temperature and record accuracy and priority error on held-out tasks"""
+        scores, targets = self._held_out_scores(held_out)
+        if len(targets):
+            best_nll = None
+            for temperature in _TEMPERATURES:
+                scaled = scores / temperature
+                scaled -= scaled.max(axis=1, keepdims=True)
+                log_probabilities = scaled - np.log(np.exp(scaled).sum(axis=1, keepdims=True))
+                nll = -log_probabilities[np.arange(len(targets)), targets].mean()
+                if best_nll is None or nll < best_nll:
+                    best_nll, self.temperature = nll, float(temperature)
+            self.category_accuracy = round(float((scores.argmax(axis=1) == targets).mean()), 4)
+        errors = [abs(self.predict(title)['priority_score'] - priority)
+                  for title, _, priority in held_out if priority is not None]
+        if errors:
+            self.priority_error = round(float(np.mean(errors)), 4)
+
+    def evaluate(self, examples: Sequence[Example], thresholds: Iterable[float] = (0.5, 0.7, 0.8, 0.9, 0.95)) -> Dict[str, Any]:
+        """
+        Held-out metrics: category accuracy, expected calibration error
+        (gap between confidence and accuracy over ten bins), priority mean
+        absolute error, and per confidence threshold the share of tasks
+        predicted (coverage) and how many of those were right
+        """
+        predictions = [(self.predict(title), category, priority) for title, category, priority in examples]
+        labelled = [(p, category) for p, category, _ in predictions if category in self._category_index]
+        report: Dict[str, Any] = {'examples': len(examples), 'labelled': len(labelled)}
+        if labelled:
+            confidences = np.array([p['category_confidence'] for p, _ in labelled])
+            correct = np.array([p['category'] == category for p, category in labelled])
+            report['accuracy'] = round(float(correct.mean()), 4)
+            bins = np.minimum((confidences * 10).astype(int), 9)
+            report['ece'] = round(float(sum(
+                abs(confidences[bins == b].mean() - correct[bins == b].mean()) * (bins == b).sum()
+                for b in range(10) if (bins == b).any()
+            ) / len(labelled)), 4)
+            report['thresholds'] = []
+            for threshold in thresholds:
+                covered = confidences >= threshold
+                report['thresholds'].append({
+                    'threshold': threshold,
+                    'coverage': round(float(covered.mean()), 4),
+                    'accuracy': round(float(correct[covered].mean()), 4) if covered.any() else None,
+                })
+        errors = [abs(p['priority_score'] - priority) for p, _, priority in predictions if priority is not None]
+        if errors:
+            report['priority_mae'] = round(float(np.mean(errors)), 4)
+        return report
+
+    def save(self, path: str):
+        meta = {
+            'dimensions': self.dimensions, 'learning_rate': self.learning_rate, 'l2': self.l2,
+            'categories': self.categories, 'priority_bias': float(self.priority_bias), 'temperature': self.temperature,
+            'category_accuracy': self.category_accuracy, 'priority_error': self.priority_error,
+            'samples': self.samples, 'trained_until': self.trained_until,
+        }
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # Write then rename so a serving process never loads a half-written file
+        handle, temporary = tempfile.mkstemp(dir=directory, suffix='.npz')
+        with os.fdopen(handle, 'wb') as file:
+            np.savez_compressed(
+                file, meta=np.array(json.dumps(meta)), category_weights=self.category_weights,
+                category_bias=self.category_bias, priority_weights=self.priority_weights,
+            )
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'TaskPredictor':
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            predictor = cls(meta['dimensions'], meta['learning_rate'], meta['l2'])
+            predictor.category_weights = data['category_weights'].astype(np.float32)
+            predictor.category_bias = data['category_bias'].astype(np.float32)
+            predictor.priority_weights = data['priority_weights'].astype(np.float32)
+        predictor.categories = list(meta['categories'])
+        predictor._category_index = {name: i for i, name in enumerate(predictor.categories)}
+        for key in ('priority_bias', 'temperature', 'category_accuracy', 'priority_error', 'samples', 'trained_until'):
+            setattr(predictor, key, meta[key])
+        return predictor
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'samples': self.samples,
+            'categories': len(self.categories),
+            'category_accuracy': self.category_accuracy,
+            'priority_error': self.priority_error,
+            'temperature': round(self.temperature, 2),
+            'trained_until': self.trained_until,
+        }
+
+
+def task_predictor_path() -> str:
+    return getattr(settings, 'AI_TASK_PREDICTOR_PATH', None) or os.path.join(
+        tempfile.gettempdir(), 'todogenius-task-predictor.npz'
+    )
+
+
+_predictor: Optional[TaskPredictor] = None
+_predictor_mtime: Optional[float] = None
+_predictor_lock = threading.Lock()
+
+
+def get_task_predictor() -> Optional[TaskPredictor]:
+    """
+    Process-wide TaskPredictor loaded from AI_TASK_PREDICTOR_PATH, reloaded
+    when `manage.py train_task_predictor` rewrites the file; None until a
+    model trained on at least AI_PREDICTOR_MIN_SAMPLES tasks exists
+    """
+    global _predictor, _predictor_mtime
+    path = task_predictor_path()
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    if mtime != _predictor_mtime:
+        with _predictor_lock:
+            if mtime != _predictor_mtime:
+                try:
+                    _predictor = TaskPredictor.load(path)
+                    print(f"Task predictor loaded: {_predictor.stats()}")
+                except Exception as e:
+                    print(f"Task predictor could not be loaded: {str(e)}")
+                    _predictor = None
+                _predictor_mtime = mtime
+    if _predictor is None or _predictor.samples < getattr(settings, 'AI_PREDICTOR_MIN_SAMPLES', PREDICTOR_MIN_SAMPLES):
+        return None
+    return _predictor
@@ -1,12 +1,35 @@
 
 from ..utils.prompt_templates import PromptTemplates
+from ..utils.prompt_assembler import PromptAssembler
+import asyncio
+import copy
 import json
-from typing import Dict, List, Any, Optional
+import time
+from contextlib import aclosing, closing
+from typing import AsyncIterator, Dict, List, Any, Optional
 from datetime import datetime, timedelta
 from django.utils import timezone
-from .lm_studio_client import LMStudioClient
+from .inference_engine import get_inference_engine
+from .enhancement_cache import EnhancementCache, get_enhancement_cache
+from .semantic_cache import HashedNgramEmbedder, get_semantic_cache
+from .single_flight import FlightAbandoned, enhancement_flights, async_enhancement_flights
+from .batch_scheduler import get_batch_scheduler
+from .admission import AdmissionRejected, get_admission_controller
+from .circuit_breaker import CircuitOpenError
+from .cancellation import enhancement_cancellations
+from .context_search import context_search_since, format_context, get_context_search
+from .task_predictor import get_task_predictor
+from .provisional import get_upgrade_registry
+from .prompt_context import get_prompt_context_store
 from ..utils.data_formatter import DataFormatter
-from ..constants import PRIORITY_RANGES
+from ..utils.json_stream_parser import StreamingJSONParser
+from ..utils.output_schema import OutputSchema
+from ..utils.temporal_parser import TemporalParser
+from ..constants import (
+    PRIORITY_RANGES, DEADLINE_TIMEFRAMES, CONTEXT_SEARCH_TOP_K, TEMPORAL_PARSER, TEMPORAL_MIN_CONFIDENCE,
+    ENHANCEMENT_MODE, PREDICTOR_MIN_CONFIDENCE, PREDICTOR_MAX_PRIORITY_ERROR, BATCH_ENHANCEMENT_CONCURRENCY
+)
+from django.conf import settings
 from django.apps import apps
 import random
 import traceback
@@ -14,89 +37,729 @@ import traceback
 class TaskProcessor:
     """Process tasks for description enhancement and categorization"""
     
-    def __init__(self):
-        self.client = LMStudioClient()
+    def __init__(self, priority: str = 'interactive'):
+        # Inference backend selected by AI_INFERENCE_ENGINE (LM Studio over HTTP by default)
+        self.client = get_inference_engine()
         self.formatter = DataFormatter()
         self.used_colors = set()  # Track colors to avoid duplicates
+        # Schema sent for constrained decoding; None when the model runs unconstrained
+        self.output_schema = OutputSchema.enhancement_schema() if self.client.is_constrained else None
+        # Category/priority learnt from past tasks; None until one is trained
+        self.predictor = get_task_predictor()
+        # Finished results keyed on the task name and context snapshot; None when disabled
+        self.cache = get_enhancement_cache()
+        # Reuses a cached result for a reworded task name; None when disabled
+        self.semantic_cache = get_semantic_cache()
+        # Shared recent tasks/context/categories; None to query them per request
+        self.prompt_context = get_prompt_context_store()
+        # Cache key -> context fingerprint, for indexing stored results semantically
+        self._context_keys: Dict[str, str] = {}
+        # Micro-batches non-streaming generations when AI_BATCHING is on
+        self.batcher = get_batch_scheduler(self.client)
+        # Slot in the shared LLM scheduler: 'interactive' for users waiting on a
+        # response, 'batch' for background work. Cache hits and coalesced
+        # requests skip it.
+        self.admission = get_admission_controller(priority)
 
     
     def enhance_task(self, task_name: str) -> Dict:
         """
         Enhance a task with AI-generated insights based on context and history
         """
+        # Backend known to be down: answer before touching the database
+        if not self.client.is_available():
+            return self._circuit_open_fallback(task_name)
+        
         try:
             # Get recent tasks (last 10) with category colors
             recent_tasks = self.get_recent_tasks()
             
             # Get recent context (last 24 hours)
-            recent_context = self.get_existing_context()
+            recent_context = self.get_existing_context(task_name)
             
             # Get existing categories with colors
             existing_categories = self._get_existing_categories()
             
-            # Prepare the prompt with all context including colors
-            prompt = PromptTemplates._build_enhancement_prompt(task_name, recent_tasks, recent_context, existing_categories)
+            # Fields settled without asking the model: a deadline written in
+            # the task ("by Friday"), a confidently predicted category
+            fixed = self._fixed_fields(task_name, recent_context, existing_categories)
+            fast = self._fast_enhancement(task_name, fixed)
+            if fast is not None:
+                return fast
+            
+            # Identical task name and context: answer from the cache
+            cache_key, cached = self._cache_lookup(task_name, recent_tasks, recent_context, existing_categories, fixed)
+            if cached is not None:
+                return cached
             
-            # Call AI model once with comprehensive prompt
-            response = self.client.generate_completion(prompt=prompt)
-            print("AI Response received:", response)
+            # Concurrent identical requests share one generation
+            result, shared = enhancement_flights.do(
+                cache_key,
+                lambda: self._run_enhancement(task_name, recent_tasks, recent_context, existing_categories, cache_key, fixed)
+            )
+            return self._mark_coalesced(result) if shared else result
             
-            # Parse and validate AI response with original task name
-            enhanced_data = self.formatter.parse_ai_response(response, task_name)
+        except AdmissionRejected:
+            # Overload is reported to the client, not papered over with a fallback
+            raise
+        except CircuitOpenError:
+            # Every endpoint's circuit opened after the availability check
+            return self._circuit_open_fallback(task_name)
+        except Exception as e:
+            return self._enhancement_failure(task_name, e)
+
+    def _run_enhancement(self, task_name: str, recent_tasks: List[Dict], recent_context: List[Dict],
+                         existing_categories: List[Dict], cache_key: str, fixed: Optional[Dict[str, Dict]] = None) -> Dict:
+        # Prepare the prompt with all context including colors: a static
+        # system prefix the server keeps cached plus a per-request message
+        messages, prompt_stats = self._build_messages(task_name, recent_tasks, recent_context, existing_categories, fixed)
+        schema = self._request_schema(fixed)
+        
+        with self.admission.slot():
+            if self.batcher is not None:
+                parser = self._batched_enhancement_json(messages, schema)
+            else:
+                # Stream the completion and stop as soon as the JSON object closes
+                parser = self._generate_enhancement_json(messages, schema)
+        print("AI Response received:", parser.raw_text)
+        
+        return self._finalize_enhancement(parser, task_name, existing_categories, cache_key, prompt_stats, fixed)
+
+    async def aenhance_task(self, task_name: str) -> Dict:
+        """
+        Async variant of enhance_task: ORM reads and the LM Studio call
+        yield to the event loop instead of holding a worker thread
+        """
+        if not self.client.is_available():
+            return self._circuit_open_fallback(task_name)
+        
+        recent_tasks = await self.aget_recent_tasks()
+        existing_categories = await self._aget_existing_categories()
+        return await self._aenhance_with_snapshot(task_name, recent_tasks, existing_categories)
+
+    async def _aenhance_with_snapshot(self, task_name: str, recent_tasks: List[Dict],
+                                      existing_categories: List[Dict]) -> Dict:
+        """aenhance_task with the recent tasks and categories already read, shared by a batch"""
+        try:
+            recent_context = await self.aget_existing_context(task_name)
+            fixed = self._fixed_fields(task_name, recent_context, existing_categories)
+            fast = self._fast_enhancement(task_name, fixed)
+            if fast is not None:
+                return fast
             
-            # Process category with color
-            enhanced_data = self._process_category_with_color(enhanced_data, existing_categories)
-            print("enhanced data" , enhanced_data)
-            # Sanitize the response
-            #sanitized_data = self.formatter.sanitize_ai_response(enhanced_data)
+            cache_key, cached = await self._acache_lookup(task_name, recent_tasks, recent_context, existing_categories, fixed)
+            if cached is not None:
+                return cached
             
-            return {
-                'success': True,
-                'data': enhanced_data
-            }
+            result, shared = await async_enhancement_flights.do(
+                cache_key,
+                lambda: self._arun_enhancement(task_name, recent_tasks, recent_context, existing_categories, cache_key, fixed)
+            )
+            return self._mark_coalesced(result) if shared else result
             
+        except AdmissionRejected:
+            raise
+        except CircuitOpenError:
+            return self._circuit_open_fallback(task_name)
         except Exception as e:
-            print(f"Error enhancing task: {str(e)}")
-            print(traceback.format_exc())
+            return self._enhancement_failure(task_name, e)
+
+    async def _arun_enhancement(self, task_name: str, recent_tasks: List[Dict], recent_context: List[Dict],
+                                existing_categories: List[Dict], cache_key: str, fixed: Optional[Dict[str, Dict]] = None) -> Dict:
+        messages, prompt_stats = self._build_messages(task_name, recent_tasks, recent_context, existing_categories, fixed)
+        schema = self._request_schema(fixed)
+        
+        async with self.admission.aslot():
+            if self.batcher is not None:
+                parser = await self._abatched_enhancement_json(messages, schema)
+            else:
+                parser = StreamingJSONParser()
+                async for _ in self._astream_enhancement_json(messages, parser, schema):
+                    pass
+        print("AI Response received:", parser.raw_text)
+        
+        return self._finalize_enhancement(parser, task_name, existing_categories, cache_key, prompt_stats, fixed)
+
+    @staticmethod
+    def _mark_coalesced(result: Dict) -> Dict:
+        result['meta'] = dict(result.get('meta', {}), coalesced=True)
+        return result
+
+    async def astream_enhancement(self, task_name: str) -> AsyncIterator[Dict]:
+        """
+        Stream an enhancement as events: 'token' for every decoded text delta,
+        'field' as soon as a top-level field parses, and a final 'result'
+        carrying the same payload as aenhance_task
+        """
+        if not self.client.is_available():
+            yield {'event': 'result', 'data': self._circuit_open_fallback(task_name)}
+            return
+        
+        flight = result = None
+        try:
+            recent_tasks = await self.aget_recent_tasks()
+            recent_context = await self.aget_existing_context(task_name)
+            existing_categories = await self._aget_existing_categories()
+            fixed = self._fixed_fields(task_name, recent_context, existing_categories)
+            fast = self._fast_enhancement(task_name, fixed)
             
-            # Return enhanced fallback with creative description
-            return {
-                'success': False,
-                'data': {
-                    'title': task_name,
-                    'descriptions': DataFormatter.generate_creative_description(task_name),
-                    'category': {'name': 'general', 'color': '#3B82F6', 'is_new': True},
-                    'priority_score': 0.5,
-                    'deadline': DataFormatter.days_to_datetime(3),
-                    'confidence': 0.0,
-                    'reasoning': 'AI enhancement failed, using intelligent fallback with creative description'
-                }
+            if fast is not None:
+                cache_key, cached = None, fast
+            else:
+                cache_key, cached = await self._acache_lookup(task_name, recent_tasks, recent_context, existing_categories, fixed)
+            
+            # An identical enhancement already running: wait for it instead
+            # of starting a second generation. Otherwise this stream leads,
+            # and requests for the same enhancement wait for it.
+            while cached is None:
+                in_flight = async_enhancement_flights.join(cache_key)
+                if in_flight is None:
+                    flight = async_enhancement_flights.lead(cache_key)
+                    break
+                try:
+                    cached = self._mark_coalesced(copy.deepcopy(await async_enhancement_flights.wait(in_flight)))
+                except FlightAbandoned:
+                    continue
+            
+            if cached is not None:
+                # Replay the finished fields so clients see the same event sequence
+                for name, value in cached['data'].items():
+                    yield {'event': 'field', 'data': {name: value}}
+                yield {'event': 'result', 'data': cached}
+                return
+            
+            messages, prompt_stats = self._build_messages(task_name, recent_tasks, recent_context, existing_categories, fixed)
+            schema = self._request_schema(fixed)
+            
+            parser = StreamingJSONParser()
+            # Held for the whole stream; a disconnecting client closes this
+            # generator, which releases the slot
+            async with self.admission.aslot(), aclosing(self._astream_enhancement_json(messages, parser, schema)) as stream:
+                # Known before the model starts; its own guesses, if any, are dropped
+                for name, entry in (fixed or {}).items():
+                    yield {'event': 'field', 'data': {name: entry['value']}}
+                
+                async for delta, completed in stream:
+                    yield {'event': 'token', 'data': {'text': delta}}
+                    
+                    for name in completed:
+                        if name in (fixed or {}):
+                            continue
+                        value = DataFormatter.format_partial_field(name, parser.fields[name])
+                        if value is None:
+                            continue
+                        if name == 'category':
+                            value = self._process_category_with_color({'category': value}, existing_categories)['category']
+                        yield {'event': 'field', 'data': {name: value}}
+            
+            result = self._finalize_enhancement(parser, task_name, existing_categories, cache_key, prompt_stats, fixed)
+            
+        except AdmissionRejected:
+            # Raised before the first event, so the view can still answer 503
+            raise
+        except CircuitOpenError:
+            result = self._circuit_open_fallback(task_name)
+        except Exception as e:
+            result = self._enhancement_failure(task_name, e)
+        finally:
+            # Rejected or closed by a disconnecting client: no result, and
+            # the callers waiting on this stream run their own generation
+            if flight is not None:
+                async_enhancement_flights.settle(flight, result)
+        
+        yield {'event': 'result', 'data': result}
+
+    async def astream_batch_enhancement(self, task_names: List[str], concurrency: Optional[int] = None) -> AsyncIterator[Dict]:
+        """
+        Enhance many tasks, yielding each result as soon as it is ready:
+        {'index', 'task_name', 'success', 'data', 'meta', 'elapsed'}, in
+        completion order. Recent tasks and categories are read once for the
+        whole batch. Up to `concurrency` tasks run at once, so with
+        AI_BATCHING on their generations share batched decodes. Ends with
+        {'summary': ...} holding the batch's wall time and throughput; an
+        item's elapsed includes its wait for a slot, so the items' times do
+        not add up to sequential calls (benchmark_batch_enhancement measures
+        those).
+        """
+        concurrency = concurrency or getattr(settings, 'AI_BATCH_ENHANCEMENT_CONCURRENCY', BATCH_ENHANCEMENT_CONCURRENCY)
+        started = time.perf_counter()
+        recent_tasks = await self.aget_recent_tasks()
+        existing_categories = await self._aget_existing_categories()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def enhance(index: int, task_name: str) -> Dict:
+            async with semaphore:
+                item_started = time.perf_counter()
+                if not self.client.is_available():
+                    result = self._circuit_open_fallback(task_name)
+                else:
+                    try:
+                        result = await self._aenhance_with_snapshot(task_name, recent_tasks, existing_categories)
+                    except AdmissionRejected as rejected:
+                        result = {'success': False, 'data': None,
+                                  'meta': {'rejected': rejected.reason, 'retry_after': rejected.retry_after}}
+                return dict(result, index=index, task_name=task_name,
+                            elapsed=round(time.perf_counter() - item_started, 3))
+
+        pending = [asyncio.ensure_future(enhance(index, name)) for index, name in enumerate(task_names)]
+        succeeded = 0
+        try:
+            for next_item in asyncio.as_completed(pending):
+                item = await next_item
+                succeeded += bool(item['success'])
+                yield item
+        finally:
+            # A disconnecting client closes the stream: stop the rest
+            for task in pending:
+                task.cancel()
+
+        elapsed = time.perf_counter() - started
+        summary = {
+            'items': len(task_names),
+            'succeeded': succeeded,
+            'concurrency': concurrency,
+            'elapsed': round(elapsed, 3),
+            'items_per_second': round(len(task_names) / elapsed, 2) if elapsed else None,
+        }
+        print(f"Batch enhancement: {summary}")
+        yield {'summary': summary}
+
+    async def aprovisional_enhancement(self, task_name: str, request_key: Optional[str] = None) -> Dict:
+        """
+        Stale-while-revalidate: answer at once without the model, from the
+        caches, the fixed fields and the most similar recent task, and run
+        the full enhancement in the background. The answer is marked
+        meta.provisional with the upgrade_id to fetch the result by. Cache
+        hits and fast-mode answers are final and start no upgrade.
+        """
+        if not self.client.is_available():
+            return self._circuit_open_fallback(task_name)
+
+        recent_tasks = await self.aget_recent_tasks()
+        recent_context = await self.aget_existing_context(task_name)
+        existing_categories = await self._aget_existing_categories()
+        fixed = self._fixed_fields(task_name, recent_context, existing_categories)
+        final = self._fast_enhancement(task_name, fixed)
+        if final is None:
+            _, final = await self._acache_lookup(task_name, recent_tasks, recent_context, existing_categories, fixed)
+        if final is not None:
+            return final
+
+        # A fresh processor: this one belongs to the request and is not thread-safe
+        upgrade_id = get_upgrade_registry().submit(lambda: TaskProcessor().enhance_task(task_name), request_key)
+        result = self._apply_fixed({
+            'success': True,
+            'data': self._provisional_data(task_name, recent_tasks, existing_categories)
+        }, fixed)
+        result['meta'] = dict(result.get('meta', {}), provisional=True, upgrade_id=upgrade_id)
+        print(f"Provisional enhancement for: {task_name}, upgrade {upgrade_id} queued")
+        return result
+
+    def _provisional_data(self, task_name: str, recent_tasks: List[Dict], existing_categories: List[Dict]) -> Dict:
+        """
+        Enhancement data without the model: category and priority of the
+        recent task sharing the most words with this one, the template
+        description, and a deadline following the priority
+        """
+        words = set(HashedNgramEmbedder.normalize(task_name))
+        best, best_overlap = None, 0.0
+        for task in recent_tasks:
+            other = set(HashedNgramEmbedder.normalize(task['title']))
+            overlap = len(words & other) / len(words | other) if words | other else 0.0
+            if overlap > best_overlap:
+                best, best_overlap = task, overlap
+
+        if best is not None:
+            category = {'name': best['category_name'], 'color': best['category_color'],
+                        'is_new': not any(cat['name'] == best['category_name'] for cat in existing_categories)}
+            priority = best['priority_score']
+            reasoning = f"Provisional: based on the similar task '{best['title']}', full enhancement in progress"
+        else:
+            category = {'name': 'general', 'color': '#3B82F6',
+                        'is_new': not any(cat['name'] == 'general' for cat in existing_categories)}
+            priority = 0.5
+            reasoning = 'Provisional: no similar past task, full enhancement in progress'
+        return {
+            'title': task_name,
+            'descriptions': DataFormatter.generate_creative_description(task_name),
+            'category': category,
+            'priority_score': priority,
+            'deadline': DataFormatter.days_to_datetime(self._deadline_days_for_priority(priority)),
+            'confidence': round(0.5 * best_overlap, 3),
+            'reasoning': reasoning
+        }
+
+    def _generate_enhancement_json(self, messages: List[Dict], schema: Optional[Dict] = None) -> StreamingJSONParser:
+        """
+        Feed the streamed completion into an incremental JSON parser and
+        close the upstream stream once the top-level object is balanced, so
+        the model stops spending tokens on trailing chatter
+        """
+        parser = StreamingJSONParser()
+        try:
+            with closing(self.client.stream_chat_completion(messages=messages, schema=schema)) as stream:
+                for delta in stream:
+                    parser.feed(delta)
+                    if parser.is_complete:
+                        break
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            if not parser.raw_text:
+                # Nothing generated (connection refused, HTTP error): a failure, not an answer
+                raise
+            # Keep whatever parsed before the failure; validation fills the
+            # rest and meta.complete reports it
+            print(f"Completion stream failed: {str(e)}")
+        return parser
+
+    async def _astream_enhancement_json(self, messages: List[Dict], parser: StreamingJSONParser,
+                                        schema: Optional[Dict] = None) -> AsyncIterator:
+        """
+        Async variant of _generate_enhancement_json that also yields each
+        text delta with the top-level fields it completed. Cancelling the
+        caller closes the upstream stream, which stops the decode.
+        """
+        # Backends stream one delta per decoded token
+        tokens = 0
+        try:
+            async with aclosing(self.client.astream_chat_completion(messages=messages, schema=schema)) as stream:
+                async for delta in stream:
+                    tokens += 1
+                    completed = parser.feed(delta)
+                    yield delta, completed
+                    if parser.is_complete:
+                        enhancement_cancellations.record_completed(tokens)
+                        break
+        except (asyncio.CancelledError, GeneratorExit):
+            if not parser.is_complete:
+                enhancement_cancellations.record_cancelled(tokens, self.client.max_tokens)
+            raise
+        except CircuitOpenError:
+            # Callers answer with _circuit_open_fallback, as when the check before the stream fails
+            raise
+        except Exception as e:
+            if not parser.raw_text:
+                # Nothing generated (connection refused, HTTP error): a failure, not an answer
+                raise
+            # Keep whatever parsed before the failure; validation fills the
+            # rest and meta.complete reports it
+            print(f"Completion stream failed: {str(e)}")
+
+    def _batched_enhancement_json(self, messages: List[Dict], schema: Optional[Dict] = None) -> StreamingJSONParser:
+        """Run the enhancement through the micro-batching scheduler"""
+        prompt = self.client.render_chat_prompt(messages)
+        return self._parse_batched_response(self.batcher.generate(prompt, schema=schema))
+
+    async def _abatched_enhancement_json(self, messages: List[Dict], schema: Optional[Dict] = None) -> StreamingJSONParser:
+        # The first render may read the template from the model file
+        prompt = await asyncio.to_thread(self.client.render_chat_prompt, messages)
+        return self._parse_batched_response(await self.batcher.agenerate(prompt, schema=schema))
+
+    @staticmethod
+    def _parse_batched_response(response: Dict) -> StreamingJSONParser:
+        if not response.get('success'):
+            # Timed out, worker failure or no result: a failure, not an
+            # answer, as when a stream generates nothing
+            raise RuntimeError(f"Batched completion failed: {response.get('error')}")
+        parser = StreamingJSONParser()
+        parser.feed(response['text'])
+        return parser
+
+    def _cache_lookup(self, task_name: str, recent_tasks: List[Dict], recent_context: List[Dict],
+                      existing_categories: List[Dict], fixed: Optional[Dict[str, Dict]] = None):
+        """
+        Return (cache key, cached result or None). The key is computed even
+        with caching off, since it also identifies coalesced requests. An
+        exact miss falls back to the semantic cache: a near-duplicate task
+        name enhanced with the same context. Fixed fields are re-applied to
+        every hit, since "tomorrow" moves.
+        """
+        cache_key, context_key = self._cache_keys(task_name, recent_tasks, recent_context, existing_categories)
+        if self.cache is None:
+            return cache_key, None
+        cached = self.cache.get(cache_key)
+        if cached is None and self.semantic_cache is not None:
+            match = self.semantic_cache.lookup(task_name, context_key)
+            if match is not None:
+                cached = self._semantic_hit(task_name, match[1], self.cache.get(match[0]), fixed)
+        return cache_key, self._cache_hit(task_name, cached, fixed)
+
+    async def _acache_lookup(self, task_name: str, recent_tasks: List[Dict], recent_context: List[Dict],
+                             existing_categories: List[Dict], fixed: Optional[Dict[str, Dict]] = None):
+        """Async variant of _cache_lookup that keeps the cache's disk tier off the event loop"""
+        cache_key, context_key = self._cache_keys(task_name, recent_tasks, recent_context, existing_categories)
+        if self.cache is None:
+            return cache_key, None
+        cached = await self.cache.aget(cache_key)
+        if cached is None and self.semantic_cache is not None:
+            match = self.semantic_cache.lookup(task_name, context_key)
+            if match is not None:
+                cached = self._semantic_hit(task_name, match[1], await self.cache.aget(match[0]), fixed)
+        return cache_key, self._cache_hit(task_name, cached, fixed)
+
+    def _cache_keys(self, task_name: str, recent_tasks: List[Dict], recent_context: List[Dict],
+                    existing_categories: List[Dict]):
+        """(exact cache key, context key) for a task name and its prompt inputs"""
+        context_key = EnhancementCache.context_key(self.client, recent_tasks, recent_context, existing_categories)
+        cache_key = EnhancementCache.fingerprint(EnhancementCache.normalize_task_name(task_name), context_key)
+        self._context_keys[cache_key] = context_key
+        return cache_key, context_key
+
+    def _cache_hit(self, task_name: str, cached: Optional[Dict], fixed: Optional[Dict[str, Dict]]) -> Optional[Dict]:
+        if cached is not None:
+            self._apply_fixed(cached, fixed)
+            print(f"Enhancement cache hit ({cached['meta']['cache']}) for: {task_name}")
+        return cached
+
+    @staticmethod
+    def _semantic_hit(task_name: str, similarity: float, cached: Optional[Dict],
+                      fixed: Optional[Dict[str, Dict]] = None) -> Optional[Dict]:
+        """The result cached for a near-duplicate name, adapted to this one, or None"""
+        if cached is None:
+            return None
+        if 'deadline' in cached['meta'].get('fixed', {}) and 'deadline' not in (fixed or {}):
+            # That deadline was parsed from the other wording ("call mom tonight")
+            return None
+        # The title is the task exactly as this user wrote it
+        cached['data']['title'] = task_name
+        cached['meta'] = dict(cached['meta'], cache='semantic', similarity=round(similarity, 4))
+        return cached
+
+    def _fixed_fields(self, task_name: str, recent_context: List[Dict],
+                      existing_categories: List[Dict]) -> Dict[str, Dict]:
+        """
+        Output fields settled before generation, each as {'value': API
+        value, 'prompt': how the prompt states it, 'meta': where it came from}
+        """
+        fixed = {}
+        deadline = self._resolve_deadline(task_name, recent_context)
+        if deadline is not None:
+            fixed['deadline'] = {
+                'value': DataFormatter.format_deadline(deadline['deadline']),
+                'prompt': f"{deadline['text']} ({deadline['deadline'].strftime('%A %Y-%m-%d %H:%M')})",
+                'meta': {'source': deadline['source'], 'text': deadline['text'], 'confidence': deadline['confidence']},
+            }
+        fixed.update(self._predict_fields(task_name, existing_categories))
+        return fixed
+
+    def _resolve_deadline(self, task_name: str, recent_context: List[Dict]) -> Optional[Dict]:
+        """
+        Deadline read by the temporal parser from the task name or its
+        context when confident enough to skip the model's guess, else None
+        """
+        if not getattr(settings, 'AI_TEMPORAL_PARSER', TEMPORAL_PARSER):
+            return None
+        deadline = TemporalParser.resolve_deadline(task_name, recent_context, timezone.localtime())
+        if deadline is None:
+            return None
+        if deadline['confidence'] < getattr(settings, 'AI_TEMPORAL_MIN_CONFIDENCE', TEMPORAL_MIN_CONFIDENCE):
+            print(f"Deadline '{deadline['text']}' too uncertain ({deadline['confidence']}), left to the model")
+            return None
+        print(f"Deadline fixed from {deadline['source']}: '{deadline['text']}' -> {deadline['deadline'].isoformat()}")
+        return deadline
+
+    def _predict_fields(self, task_name: str, existing_categories: List[Dict]) -> Dict[str, Dict]:
+        """
+        Category from the learnt predictor when its calibrated confidence is
+        high enough and the category still exists, plus the priority when
+        the predictor's held-out priority error is small enough
+        """
+        if self.predictor is None or getattr(settings, 'AI_ENHANCEMENT_MODE', ENHANCEMENT_MODE) == 'llm':
+            return {}
+        prediction = self.predictor.predict(task_name)
+        if prediction['category_confidence'] < getattr(settings, 'AI_PREDICTOR_MIN_CONFIDENCE', PREDICTOR_MIN_CONFIDENCE):
+            return {}
+        category = next((cat for cat in existing_categories if cat['name'] == prediction['category']), None)
+        if category is None:
+            return {}
+        
+        print(f"Predicted for '{task_name}': {prediction}")
+        fixed = {'category': {
+            'value': {'name': category['name'], 'color': category['color'], 'is_new': False},
+            'prompt': category['name'],
+            'meta': {'source': 'predictor', 'confidence': prediction['category_confidence']},
+        }}
+        error = self.predictor.priority_error
+        if error is not None and error <= getattr(settings, 'AI_PREDICTOR_MAX_PRIORITY_ERROR', PREDICTOR_MAX_PRIORITY_ERROR):
+            fixed['priority_score'] = {
+                'value': prediction['priority_score'],
+                'prompt': f"{prediction['priority_score']:.2f}",
+                'meta': {'source': 'predictor', 'error': error},
+            }
+        return fixed
+
+    def _fast_enhancement(self, task_name: str, fixed: Dict[str, Dict]) -> Optional[Dict]:
+        """
+        Answer without the model in AI_ENHANCEMENT_MODE 'fast' once category
+        and priority are both fixed. The description is the deterministic
+        template and the deadline, unless the task names one, follows the
+        priority.
+        """
+        if getattr(settings, 'AI_ENHANCEMENT_MODE', ENHANCEMENT_MODE) != 'fast':
+            return None
+        if 'category' not in fixed or 'priority_score' not in fixed:
+            return None
+        priority = fixed['priority_score']['value']
+        data = {
+            'title': task_name,
+            'descriptions': DataFormatter.generate_creative_description(task_name),
+            'category': None,
+            'priority_score': priority,
+            'deadline': DataFormatter.days_to_datetime(self._deadline_days_for_priority(priority)),
+            'confidence': fixed['category']['meta']['confidence'],
+            'reasoning': 'Category and priority predicted from similar past tasks'
+        }
+        print(f"Fast enhancement without the model for: {task_name}")
+        return self._apply_fixed({'success': True, 'data': data, 'meta': {'mode': 'fast'}}, fixed)
+
+    @staticmethod
+    def _deadline_days_for_priority(priority: float) -> int:
+        if priority >= 0.9:
+            return DEADLINE_TIMEFRAMES['urgent']
+        if priority >= PRIORITY_RANGES['high'][0]:
+            return DEADLINE_TIMEFRAMES['short']
+        if priority >= PRIORITY_RANGES['medium'][0]:
+            return DEADLINE_TIMEFRAMES['medium']
+        return DEADLINE_TIMEFRAMES['long']
+
+    def _request_schema(self, fixed: Optional[Dict[str, Dict]]) -> Optional[Dict]:
+        """Constrained-output schema for a request, without the fields already fixed"""
+        if not fixed or self.output_schema is None:
+            return self.output_schema
+        return OutputSchema.enhancement_schema(exclude=fixed)
+
+    @staticmethod
+    def _apply_fixed(result: Dict, fixed: Optional[Dict[str, Dict]]) -> Dict:
+        """Put the fixed fields over whatever the model suggested"""
+        if fixed:
+            for name, entry in fixed.items():
+                result['data'][name] = copy.deepcopy(entry['value'])
+            result['meta'] = dict(result.get('meta', {}), fixed={name: entry['meta'] for name, entry in fixed.items()})
+        return result
+
+    def _build_messages(self, task_name: str, recent_tasks: List[Dict], recent_context: List[Dict],
+                        existing_categories: List[Dict], fixed: Optional[Dict[str, Dict]] = None):
+        """
+        Assemble the enhancement messages within the per-section token
+        budgets. Returns (messages, prompt stats) where the stats hold the
+        prompt's token count and the tokens each context section used.
+        """
+        assembler = PromptAssembler(self.client.count_tokens)
+        fixed_fields = {name: entry['prompt'] for name, entry in (fixed or {}).items()}
+        messages = PromptTemplates._build_enhancement_messages(
+            task_name, recent_tasks, recent_context, existing_categories, assembler, fixed_fields
+        )
+        prompt_tokens = sum(self.client.count_tokens(message['content']) for message in messages)
+        print(f"Prompt assembled: {prompt_tokens} tokens {assembler.usage}")
+        return messages, {'prompt_tokens': prompt_tokens, 'prompt_sections': dict(assembler.usage)}
+
+    def _finalize_enhancement(self, parser: StreamingJSONParser, task_name: str, existing_categories: List[Dict],
+                              cache_key: str, prompt_stats: Optional[Dict] = None,
+                              fixed: Optional[Dict[str, Dict]] = None) -> Dict:
+        """Validate and colour the parsed model response, caching complete answers"""
+        # Validate AI response with original task name
+        enhanced_data = self.formatter.parse_streamed_response(parser, task_name, self._request_schema(fixed))
+        
+        # Process category with color
+        enhanced_data = self._process_category_with_color(enhanced_data, existing_categories)
+        print("enhanced data" , enhanced_data)
+        # Sanitize the response
+        #sanitized_data = self.formatter.sanitize_ai_response(enhanced_data)
+        
+        result = self._apply_fixed({
+            'success': True,
+            'data': enhanced_data
+        }, fixed)
+        
+        # Only cache answers the model actually finished; a truncated or
+        # failed stream should be retried next time
+        if self.cache is not None and parser.is_complete:
+            self.cache.set(cache_key, result)
+            if self.semantic_cache is not None and cache_key in self._context_keys:
+                self.semantic_cache.add(task_name, self._context_keys[cache_key], cache_key)
+        
+        # complete=False: the stream broke off or the JSON never closed, so
+        # the data is partly fallback; background callers retry instead of storing it
+        result['meta'] = dict(result.get('meta', {}), **(prompt_stats or {}), complete=parser.is_complete,
+                              cache='miss' if self.cache is not None else 'disabled')
+        return result
+
+    def _circuit_open_fallback(self, task_name: str) -> Dict:
+        """Deterministic fallback returned while the backend's circuit is open"""
+        data = DataFormatter.create_extreme_fallback(task_name)
+        data['category']['is_new'] = True
+        data['confidence'] = 0.0
+        data['reasoning'] = 'AI service unavailable, using intelligent fallback with creative description'
+        circuit = self.client.circuit_state() or {}
+        return {
+            'success': False,
+            'data': data,
+            'meta': {'circuit': circuit.get('state', 'open'), 'retry_after': circuit.get('retry_after', 0)}
+        }
+
+    @staticmethod
+    def _enhancement_failure(task_name: str, error: Exception) -> Dict:
+        print(f"Error enhancing task: {str(error)}")
+        print(traceback.format_exc())
+        
+        # Return enhanced fallback with creative description
+        return {
+            'success': False,
+            'data': {
+                'title': task_name,
+                'descriptions': DataFormatter.generate_creative_description(task_name),
+                'category': {'name': 'general', 'color': '#3B82F6', 'is_new': True},
+                'priority_score': 0.5,
+                'deadline': DataFormatter.days_to_datetime(3),
+                'confidence': 0.0,
+                'reasoning': 'AI enhancement failed, using intelligent fallback with creative description'
             }
+        }
 
     
     def _get_existing_categories(self) -> List[Dict]:
-        """Get all existing categories from database with colors"""
+        """Get all existing categories with colors, from the shared snapshot when enabled"""
         try:
-            Category = apps.get_model('tasks', 'Category')
-            
-            categories = Category.objects.all().order_by('-usage_frequency', 'name')
-            category_list = []
-            
-            for cat in categories:
-                category_list.append({
-                    'id': str(cat.id),
-                    'name': cat.name,
-                    'color': cat.color,
-                    'usage_frequency': cat.usage_frequency
-                })
-                self.used_colors.add(cat.color)
+            if self.prompt_context is not None:
+                categories = list(self.prompt_context.get(self._load_prompt_context).categories)
+            else:
+                categories = [self._format_category(cat) for cat in self._categories_queryset()]
+            self.used_colors.update(cat['color'] for cat in categories)
+            return categories
             
-            return category_list
+        except Exception as e:
+            print(f"Error getting categories: {str(e)}")
+            return []
+
+    async def _aget_existing_categories(self) -> List[Dict]:
+        """Async variant of _get_existing_categories"""
+        try:
+            if self.prompt_context is not None:
+                categories = list((await self.prompt_context.aget(self._aload_prompt_context)).categories)
+            else:
+                categories = [self._format_category(cat) async for cat in self._categories_queryset()]
+            self.used_colors.update(cat['color'] for cat in categories)
+            return categories
             
         except Exception as e:
             print(f"Error getting categories: {str(e)}")
             return []
 
+    @staticmethod
+    def _categories_queryset():
+        Category = apps.get_model('tasks', 'Category')
+        return Category.objects.all().order_by('-usage_frequency', 'name')
+
+    @staticmethod
+    def _format_category(cat) -> Dict:
+        return {
+            'id': str(cat.id),
+            'name': cat.name,
+            'color': cat.color,
+            'usage_frequency': cat.usage_frequency
+        }
+
     
     
     
@@ -223,50 +886,126 @@ class TaskProcessor:
     def get_recent_tasks(self) -> list:
         """Get last 10 tasks for context WITH CATEGORY COLORS"""
         try:
-            Task = apps.get_model('tasks', 'Task')
-            recent_tasks = Task.objects.select_related('category').order_by('-created_at')[:10]
+            if self.prompt_context is not None:
+                return list(self.prompt_context.get(self._load_prompt_context).recent_tasks)
+            return [self._format_task(task) for task in self._recent_tasks_queryset()]
             
-            formatted_tasks = []
-            for task in recent_tasks:
-                formatted_tasks.append({
-                    'title': task.title,
-                    'description': task.description,
-                    'category_name': task.category.name if task.category else 'general',
-                    'category_color': task.category.color if task.category else '#3B82F6',
-                    'priority_score': float(task.priority_score),
-                    'status': task.status,
-                    'created_at': task.created_at.isoformat() if task.created_at else None,
-                    'deadline': task.deadline.isoformat() if task.deadline else None
-                })
-            
-            return formatted_tasks
+        except Exception as e:
+            print(f"Error getting recent tasks: {str(e)}")
+            return []
+
+    async def aget_recent_tasks(self) -> list:
+        """Async variant of get_recent_tasks"""
+        try:
+            if self.prompt_context is not None:
+                return list((await self.prompt_context.aget(self._aload_prompt_context)).recent_tasks)
+            return [self._format_task(task) async for task in self._recent_tasks_queryset()]
             
         except Exception as e:
             print(f"Error getting recent tasks: {str(e)}")
             return []
 
+    def _load_prompt_context(self) -> Dict[str, List[Dict]]:
+        """Everything the shared prompt context snapshot holds, read from the database"""
+        top_k = getattr(settings, 'AI_CONTEXT_SEARCH_TOP_K', CONTEXT_SEARCH_TOP_K)
+        return {
+            'recent_tasks': [self._format_task(task) for task in self._recent_tasks_queryset()],
+            'recent_context': [self._format_context(ctx) for ctx in self._recent_context_queryset(top_k)],
+            'categories': [self._format_category(cat) for cat in self._categories_queryset()],
+        }
+
+    async def _aload_prompt_context(self) -> Dict[str, List[Dict]]:
+        top_k = getattr(settings, 'AI_CONTEXT_SEARCH_TOP_K', CONTEXT_SEARCH_TOP_K)
+        return {
+            'recent_tasks': [self._format_task(task) async for task in self._recent_tasks_queryset()],
+            'recent_context': [self._format_context(ctx) async for ctx in self._recent_context_queryset(top_k)],
+            'categories': [self._format_category(cat) async for cat in self._categories_queryset()],
+        }
+
+    @staticmethod
+    def _recent_tasks_queryset():
+        Task = apps.get_model('tasks', 'Task')
+        return Task.objects.select_related('category').order_by('-created_at')[:10]
+
+    @staticmethod
+    def _format_task(task) -> Dict:
+        return {
+            'title': task.title,
+            'description': task.description,
+            'category_name': task.category.name if task.category else 'general',
+            'category_color': task.category.color if task.category else '#3B82F6',
+            'priority_score': float(task.priority_score),
+            'status': task.status,
+            'created_at': task.created_at.isoformat() if task.created_at else None,
+            'deadline': task.deadline.isoformat() if task.deadline else None
+        }
+
+    @staticmethod
+    def _recent_context_queryset(limit: int = 10):
+        Context = apps.get_model('context', 'Context')
+        twenty_four_hours_ago = timezone.now() - timedelta(hours=24)
+        
+        return Context.objects.filter(
+            created_at__gte=twenty_four_hours_ago
+        ).order_by('-created_at')[:limit]
+
+    @staticmethod
+    def _recent_context_from(snapshot, limit: int) -> List[Dict]:
+        """The snapshot's newest context entries still inside the last 24 hours"""
+        cutoff = (timezone.now() - timedelta(hours=24)).isoformat()
+        return [ctx for ctx in snapshot.recent_context if ctx['created_at'] and ctx['created_at'] >= cutoff][:limit]
+
+    @staticmethod
+    def _merge_context(relevant: List[Dict], recent: List[Dict], limit: int) -> List[Dict]:
+        """Relevant entries first, topped up with the newest ones not already included"""
+        seen = {(ctx['content'], ctx['created_at']) for ctx in relevant}
+        merged = list(relevant)
+        for ctx in recent:
+            if len(merged) >= limit:
+                break
+            if (ctx['content'], ctx['created_at']) not in seen:
+                merged.append(ctx)
+        return merged
     
-    def get_existing_context(self) -> list:
-        """Get recent context for AI analysis"""
+    def get_existing_context(self, task_name: Optional[str] = None) -> list:
+        """
+        Get context for AI analysis: the entries most relevant to the task
+        from any time (see context_search), then the newest of the last 24 hours
+        """
         try:
-            Context = apps.get_model('context', 'Context')
-            twenty_four_hours_ago = timezone.now() - timedelta(hours=24)
-            
-            recent_context = Context.objects.filter(
-                created_at__gte=twenty_four_hours_ago
-            ).order_by('-created_at')[:10]
+            top_k = getattr(settings, 'AI_CONTEXT_SEARCH_TOP_K', CONTEXT_SEARCH_TOP_K)
+            search = get_context_search()
+            relevant = search.search(task_name, top_k, context_search_since()) if search and task_name else []
+            if len(relevant) >= top_k:
+                return relevant
+            if self.prompt_context is not None:
+                recent = self._recent_context_from(self.prompt_context.get(self._load_prompt_context), top_k)
+            else:
+                recent = [self._format_context(ctx) for ctx in self._recent_context_queryset(top_k)]
+            return self._merge_context(relevant, recent, top_k)
             
-            formatted_context = []
-            for ctx in recent_context:
-                formatted_context.append({
-                    'content': ctx.content,
-                    'source_type': ctx.source_type,
-                    'context_date': ctx.context_date.isoformat() if ctx.context_date else None,
-                    'created_at': ctx.created_at.isoformat() if ctx.created_at else None,
-                    'is_processed': ctx.is_processed
-                })
-            return formatted_context
+        except Exception as e:
+            print(f"Error getting recent context: {str(e)}")
+            return []
+
+    async def aget_existing_context(self, task_name: Optional[str] = None) -> list:
+        """Async variant of get_existing_context"""
+        try:
+            top_k = getattr(settings, 'AI_CONTEXT_SEARCH_TOP_K', CONTEXT_SEARCH_TOP_K)
+            search = get_context_search()
+            relevant = await search.asearch(task_name, top_k, context_search_since()) if search and task_name else []
+            if len(relevant) >= top_k:
+                return relevant
+            if self.prompt_context is not None:
+                recent = self._recent_context_from(await self.prompt_context.aget(self._aload_prompt_context), top_k)
+            else:
+                recent = [self._format_context(ctx) async for ctx in self._recent_context_queryset(top_k)]
+            return self._merge_context(relevant, recent, top_k)
             
         except Exception as e:
             print(f"Error getting recent context: {str(e)}")
-            return []
\ No newline at end of file
+            return []
+
+    @staticmethod
+    def _format_context(ctx) -> Dict:
+        return format_context(ctx)
@@ -0,0 +1,32 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .services.context_search import get_context_search
+from .services.prompt_context import PromptContextStore
+
+
+@receiver(post_save, sender='context.Context')
+def index_context(sender, instance, **kwargs):
+    """Keep the context search index current as entries are created or edited"""
+    search = get_context_search()
+    if search is not None:
+        transaction.on_commit(lambda: search.index(instance))
+
+
+@receiver(post_delete, sender='context.Context')
+def unindex_context(sender, instance, **kwargs):
+    search = get_context_search()
+    if search is not None:
+        pk = instance.pk
+        transaction.on_commit(lambda: search.remove(pk))
+
+
+@receiver(post_save, sender='tasks.Task')
+@receiver(post_delete, sender='tasks.Task')
+@receiver(post_save, sender='tasks.Category')
+@receiver(post_delete, sender='tasks.Category')
+@receiver(post_save, sender='context.Context')
+@receiver(post_delete, sender='context.Context')
+def invalidate_prompt_context(sender, **kwargs):
+    """Recent tasks, categories or context changed: prompts reload the shared snapshot"""
+    transaction.on_commit(PromptContextStore.invalidate)
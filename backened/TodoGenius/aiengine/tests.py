@@ -1,3 +1,894 @@
-from django.test import TestCase
+import asyncio
+import json
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import mock
+from django.apps import apps
+from django.db import connection, transaction
+from django.test import (
+    AsyncRequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+)
+from django.utils import timezone
+from .management.commands.run_enhancement_worker import Command
+from .models import BackfillCheckpoint, EnhancementJob
+from .services.admission import AdmissionController
+from .services.backfill import TaskBackfill
+from .services.cancellation import CancellationRegistry, RequestSuperseded
+from .services.circuit_breaker import CircuitBreaker
+from .services.enhancement_cache import EnhancementCache
+from .services.job_queue import EnhancementJobQueue
+from .services.llm_scheduler import BATCH, INTERACTIVE, AdmissionRejected, LLMScheduler
+from .services.provisional import UpgradeRegistry
+from .services.semantic_cache import SemanticCache, get_semantic_cache
+from .services.single_flight import AsyncSingleFlight, SingleFlight
+from .services.task_processor import TaskProcessor
+from .utils.temporal_parser import TemporalParser
+from . import views
 
-# Create your tests here.
+
+class CircuitBreakerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('aiengine.services.circuit_breaker.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker('test', failure_threshold=3, recovery_timeout=30)
+
+    def open_breaker(self):
+        for _ in range(3):
+            self.breaker.record_failure('boom')
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+    def test_opens_after_threshold_failures(self):
+        self.breaker.record_failure('boom')
+        self.breaker.record_failure('boom')
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.breaker.record_failure('boom')
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_half_open_lets_one_trial_through(self):
+        self.open_breaker()
+        self.now += 30
+        self.assertTrue(self.breaker.allow_request())
+        self.assertFalse(self.breaker.allow_request())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_failed_trial_reopens(self):
+        self.open_breaker()
+        self.now += 30
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.record_failure('still down')
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+    def test_cancelled_trial_lets_the_next_through(self):
+        self.open_breaker()
+        self.now += 30
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.cancel_trial()
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(self.breaker.allow_request())
+
+    def test_probe_success_replaces_a_stale_trial(self):
+        self.open_breaker()
+        self.now += 30
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.probe_succeeded()
+        self.assertFalse(self.breaker.allow_request())
+        self.now += 30
+        self.breaker.probe_succeeded()
+        self.assertTrue(self.breaker.allow_request())
+
+    def test_probe_success_moves_open_to_half_open(self):
+        self.open_breaker()
+        self.breaker.probe_succeeded()
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(self.breaker.allow_request())
+
+    def test_probe_failures_count_against_threshold(self):
+        self.breaker.probe_failed('timeout')
+        self.breaker.probe_failed('timeout')
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.breaker.probe_failed('timeout')
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+    def test_probe_success_resets_probe_failures(self):
+        self.breaker.probe_failed('timeout')
+        self.breaker.probe_failed('timeout')
+        self.breaker.probe_succeeded()
+        self.breaker.probe_failed('timeout')
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+
+class TemporalParserTests(SimpleTestCase):
+
+    now = datetime(2026, 10, 17, 10, 0, tzinfo=dt_timezone.utc)
+
+    def parse(self, text):
+        return TemporalParser.parse(text, self.now)
+
+    def test_bare_number_before_month_is_not_a_date(self):
+        self.assertIsNone(self.parse('top 10 dec deals'))
+        self.assertIsNone(self.parse('review the 3 mar report'))
+
+    def test_day_month_after_preposition(self):
+        self.assertEqual(self.parse('send invoices by 10 dec')['deadline'].date(), datetime(2026, 12, 10).date())
+        self.assertEqual(self.parse('call mum on 3 march')['deadline'].date(), datetime(2027, 3, 3).date())
+
+    def test_day_month_with_ordinal_of_or_year(self):
+        self.assertEqual(self.parse('party 10th dec')['deadline'].date(), datetime(2026, 12, 10).date())
+        self.assertEqual(self.parse('the 3rd of march')['deadline'].date(), datetime(2027, 3, 3).date())
+        self.assertEqual(self.parse('launch 3 mar 2027')['deadline'].date(), datetime(2027, 3, 3).date())
+
+    def test_month_day_is_still_read(self):
+        self.assertEqual(self.parse('dentist dec 10')['deadline'].date(), datetime(2026, 12, 10).date())
+
+
+class SupersededFlightTests(SimpleTestCase):
+
+    async def test_newer_request_does_not_join_the_cancelled_flight(self):
+        registry = CancellationRegistry()
+        flights = AsyncSingleFlight()
+        started = asyncio.Event()
+        generations = []
+
+        async def generate():
+            generations.append(len(generations))
+            started.set()
+            await asyncio.sleep(0.05)
+            return {'generation': len(generations)}
+
+        async def newer_request():
+            # The view reads recent tasks and context before joining the flight
+            for _ in range(2):
+                await asyncio.sleep(0)
+            return await flights.do('cache-key', generate)
+
+        first = asyncio.ensure_future(registry.run('user:1:key', flights.do('cache-key', generate)))
+        await started.wait()
+        second = asyncio.ensure_future(registry.run('user:1:key', newer_request()))
+
+        with self.assertRaises(RequestSuperseded):
+            await first
+        result, shared = await second
+        self.assertEqual(result, {'generation': 2})
+        self.assertFalse(shared)
+        self.assertEqual(len(generations), 2)
+
+
+class FailingBatcher:
+    """Batch scheduler whose generations all fail, as on a batch timeout"""
+
+    def generate(self, prompt, schema=None):
+        return {'success': False, 'text': '', 'error': 'Batched generation timed out'}
+
+    async def agenerate(self, prompt, schema=None):
+        return self.generate(prompt, schema)
+
+
+@override_settings(AI_HEALTH_MONITOR=False, AI_ENHANCEMENT_MODE='llm')
+class BatchedEnhancementTests(SimpleTestCase):
+
+    def setUp(self):
+        self.processor = TaskProcessor()
+        self.processor.cache = None
+        self.processor.batcher = FailingBatcher()
+        for name in ('get_recent_tasks', 'get_existing_context', '_get_existing_categories'):
+            patcher = mock.patch.object(self.processor, name, return_value=[])
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for name in ('aget_recent_tasks', 'aget_existing_context', '_aget_existing_categories'):
+            patcher = mock.patch.object(self.processor, name, new=mock.AsyncMock(return_value=[]))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(self.processor.client, 'is_available', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_failed_batched_generation_is_reported(self):
+        result = self.processor.enhance_task('write the quarterly report')
+        self.assertFalse(result['success'])
+
+    async def test_failed_async_batched_generation_is_reported(self):
+        result = await self.processor.aenhance_task('write the quarterly report')
+        self.assertFalse(result['success'])
+
+
+class EnhancementCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = EnhancementCache(ttl=60, max_entries=16, directory=directory.name)
+        self.addCleanup(self.cache._writer.shutdown)
+        self.result = {'success': True, 'data': {'title': 'water plants'}, 'meta': {}}
+
+    def test_disk_write_runs_on_writer_thread(self):
+        writers = []
+        with mock.patch.object(self.cache._disk, 'set', side_effect=lambda *args, **kwargs: writers.append(
+                threading.current_thread().name)):
+            self.cache.set('key', self.result)
+            self.cache._writer.submit(lambda: None).result()
+        self.assertEqual(len(writers), 1)
+        self.assertTrue(writers[0].startswith('enhancement-cache-writer'))
+
+    def test_stored_copy_is_not_the_callers_result(self):
+        self.cache.set('key', self.result)
+        self.result['meta']['coalesced'] = True
+        self.assertNotIn('coalesced', self.cache.get('key')['meta'])
+
+    async def test_async_disk_read_runs_in_thread(self):
+        self.cache.set('key', self.result)
+        self.cache._writer.submit(lambda: None).result()
+        self.cache._memory.clear()
+        readers = []
+        disk_get = self.cache._disk.get
+
+        def record(*args, **kwargs):
+            readers.append(threading.current_thread())
+            return disk_get(*args, **kwargs)
+
+        with mock.patch.object(self.cache._disk, 'get', side_effect=record):
+            result = await self.cache.aget('key')
+        self.assertEqual(result['meta']['cache'], 'disk')
+        self.assertIsNot(readers[0], threading.current_thread())
+        # Promoted: the next read is served from memory on the loop
+        self.assertEqual((await self.cache.aget('key'))['meta']['cache'], 'memory')
+
+    async def test_async_miss(self):
+        self.assertIsNone(await self.cache.aget('missing'))
+        self.assertEqual(self.cache.stats()['misses'], 1)
+
+
+class SemanticCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.cache = SemanticCache(threshold=0.75, capacity=16, ttl=60)
+
+    def reuses(self, cached_name, task_name):
+        self.cache.add(cached_name, 'context', cached_name)
+        return self.cache.lookup(task_name, 'context') is not None
+
+    def test_off_by_default(self):
+        self.assertIsNone(get_semantic_cache())
+
+    def test_reuses_rewording(self):
+        self.assertTrue(self.reuses('water the plants', 'water plants'))
+        self.assertTrue(self.reuses('dentist appointment', 'dentist appt'))
+
+    def test_refuses_name_that_adds_words(self):
+        self.assertFalse(self.reuses('call dentist', 'call dentist urgent'))
+        self.assertFalse(self.reuses('buy milk', 'buy milk and eggs'))
+        self.assertFalse(self.reuses('clean kitchen', 'clean kitchen sink'))
+
+    def test_refuses_negation_either_way(self):
+        self.assertFalse(self.reuses('pay invoice', 'do not pay invoice'))
+        self.assertFalse(self.reuses('do not pay rent', 'pay rent'))
+
+    def test_time_words_may_differ(self):
+        self.assertTrue(self.reuses('call mom', 'call mom tonight'))
+
+
+class SingleFlightTests(SimpleTestCase):
+
+    def test_followers_get_copies_of_the_result(self):
+        flights = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def generate():
+            calls.append(1)
+            release.wait(5)
+            return {'tags': ['a']}
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = [executor.submit(flights.do, 'key', generate) for _ in range(3)]
+            while flights.stats()['coalesced'] < 2:
+                time.sleep(0.001)
+            release.set()
+            results = [future.result() for future in futures]
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(shared for _, shared in results), [False, True, True])
+        results[0][0]['tags'].append('b')
+        self.assertEqual([result['tags'] for result, _ in results[1:]], [['a'], ['a']])
+
+    def test_exception_reaches_every_caller(self):
+        flights = SingleFlight()
+        release = threading.Event()
+
+        def generate():
+            release.wait(5)
+            raise ValueError('boom')
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(flights.do, 'key', generate) for _ in range(2)]
+            while flights.stats()['coalesced'] < 1:
+                time.sleep(0.001)
+            release.set()
+            for future in futures:
+                with self.assertRaises(ValueError):
+                    future.result()
+
+
+class AsyncSingleFlightTests(SimpleTestCase):
+
+    def setUp(self):
+        self.flights = AsyncSingleFlight()
+        self.calls = 0
+
+    async def generate(self):
+        self.calls += 1
+        await asyncio.sleep(0.02)
+        return {'tags': ['a']}
+
+    async def test_followers_get_copies_of_the_result(self):
+        results = await asyncio.gather(*(self.flights.do('key', self.generate) for _ in range(3)))
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(sorted(shared for _, shared in results), [False, True, True])
+        results[0][0]['tags'].append('b')
+        self.assertEqual([result['tags'] for result, _ in results[1:]], [['a'], ['a']])
+
+    async def test_leader_cancelled_only_when_last_caller_leaves(self):
+        first = asyncio.ensure_future(self.flights.do('key', self.generate))
+        second = asyncio.ensure_future(self.flights.do('key', self.generate))
+        await asyncio.sleep(0)
+        task = self.flights.join('key')
+
+        first.cancel()
+        await asyncio.sleep(0)
+        self.assertFalse(task.cancelled())
+        second.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await second
+        await asyncio.sleep(0)
+        self.assertTrue(task.cancelled())
+        self.assertEqual(self.flights.stats()['abandoned'], 1)
+        self.assertIsNone(self.flights.join('key'))
+
+    async def test_abandoned_stream_hands_over_to_a_waiter(self):
+        stream = self.flights.lead('key')
+        waiting = asyncio.ensure_future(self.flights.do('key', self.generate))
+        await asyncio.sleep(0)
+        self.flights.settle(stream, None)
+        result, shared = await waiting
+        self.assertEqual(result, {'tags': ['a']})
+        self.assertFalse(shared)
+        self.assertEqual(self.calls, 1)
+
+    async def test_settled_stream_result_reaches_waiters(self):
+        stream = self.flights.lead('key')
+        self.assertIsNone(self.flights.lead('key'))
+        waiting = asyncio.ensure_future(self.flights.do('key', self.generate))
+        await asyncio.sleep(0)
+        self.flights.settle(stream, {'tags': ['streamed']})
+        self.assertEqual(await waiting, ({'tags': ['streamed']}, True))
+        self.assertEqual(self.calls, 0)
+
+    async def test_exception_reaches_every_caller(self):
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError('boom')
+
+        results = await asyncio.gather(*(self.flights.do('key', fail) for _ in range(3)), return_exceptions=True)
+        self.assertEqual([type(result) for result in results], [ValueError] * 3)
+
+
+class CancellationRegistryTests(SimpleTestCase):
+
+    def setUp(self):
+        self.registry = CancellationRegistry()
+
+    @staticmethod
+    async def one_event(event):
+        yield event
+
+    async def test_newer_request_supersedes_the_older(self):
+        older = asyncio.ensure_future(self.registry.run('user:1:form', asyncio.sleep(5, result='old')))
+        await asyncio.sleep(0)
+        newer = asyncio.ensure_future(self.registry.run('user:1:form', asyncio.sleep(0.01, result='new')))
+
+        with self.assertRaises(RequestSuperseded):
+            await older
+        self.assertEqual(await newer, 'new')
+        self.assertEqual(self.registry.stats()['superseded'], 1)
+        self.assertEqual(self.registry.stats()['active_keys'], 0)
+
+    async def test_finished_request_releases_its_key(self):
+        self.assertEqual(await self.registry.run('user:1:form', asyncio.sleep(0, result='done')), 'done')
+        self.assertEqual(self.registry.stats()['active_keys'], 0)
+
+    async def test_disconnect_is_not_reported_as_superseded(self):
+        request = asyncio.ensure_future(self.registry.run('user:1:form', asyncio.sleep(5)))
+        await asyncio.sleep(0)
+        request.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await request
+        stats = self.registry.stats()
+        self.assertEqual((stats['disconnected'], stats['superseded'], stats['active_keys']), (1, 0, 0))
+
+    async def test_newer_stream_supersedes_the_older(self):
+        async def events():
+            yield 'first'
+            await asyncio.sleep(5)
+            yield 'never'
+
+        older = self.registry.stream('user:1:form', events())
+        self.assertEqual(await older.__anext__(), 'first')
+        pending = asyncio.ensure_future(older.__anext__())
+        await asyncio.sleep(0)
+        newer = [event async for event in self.registry.stream('user:1:form', self.one_event('latest'))]
+
+        with self.assertRaises(RequestSuperseded):
+            await pending
+        self.assertEqual(newer, ['latest'])
+        self.assertEqual(self.registry.stats()['active_keys'], 0)
+
+    async def test_requests_without_a_key_are_not_tracked(self):
+        self.assertEqual(await self.registry.run(None, asyncio.sleep(0, result='done')), 'done')
+        self.assertEqual(self.registry.stats()['active_keys'], 0)
+
+
+@override_settings(AI_ADMISSION_MAX_QUEUE=1, AI_ADMISSION_QUEUE_TIMEOUT=0.05)
+class AdmissionControllerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.scheduler = LLMScheduler(slots=1)
+        self.admission = AdmissionController(INTERACTIVE, self.scheduler)
+
+    def interactive_stats(self):
+        return self.scheduler.stats()['classes'][INTERACTIVE]
+
+    async def test_full_queue_is_rejected(self):
+        await self.admission.aacquire()
+        queued = asyncio.ensure_future(self.admission.aacquire())
+        await asyncio.sleep(0)
+
+        with self.assertRaises(AdmissionRejected) as rejected:
+            await self.admission.aacquire()
+        self.assertEqual(rejected.exception.reason, 'queue_full')
+        self.assertGreaterEqual(rejected.exception.retry_after, 1)
+
+        self.admission.release()
+        await queued
+        self.admission.release()
+        self.assertEqual(self.scheduler.stats()['in_flight'], 0)
+
+    async def test_wait_past_the_queue_timeout_is_rejected(self):
+        await self.admission.aacquire()
+        with self.assertRaises(AdmissionRejected) as rejected:
+            await self.admission.aacquire()
+        self.assertEqual(rejected.exception.reason, 'timeout')
+        self.assertEqual(self.interactive_stats()['rejected_timeout'], 1)
+        self.assertEqual(self.interactive_stats()['queue_depth'], 0)
+
+    def test_blocking_wait_past_the_queue_timeout_is_rejected(self):
+        self.admission.acquire()
+        with self.assertRaises(AdmissionRejected) as rejected:
+            self.admission.acquire()
+        self.assertEqual(rejected.exception.reason, 'timeout')
+        self.admission.release()
+
+    async def test_cancelled_waiter_leaves_the_queue(self):
+        await self.admission.aacquire()
+        queued = asyncio.ensure_future(self.admission.aacquire())
+        await asyncio.sleep(0)
+        queued.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await queued
+        self.assertEqual(self.interactive_stats()['abandoned'], 1)
+        self.admission.release()
+        self.assertEqual(self.scheduler.stats()['in_flight'], 0)
+
+    async def test_waiter_cancelled_after_its_grant_gives_the_slot_back(self):
+        await self.admission.aacquire()
+        queued = asyncio.ensure_future(self.admission.aacquire())
+        await asyncio.sleep(0)
+        # Granted, but cancelled before it wakes up to take the slot
+        self.admission.release()
+        queued.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await queued
+        self.assertEqual(self.interactive_stats()['abandoned'], 0)
+        self.assertEqual(self.scheduler.stats()['in_flight'], 0)
+
+    async def test_slot_is_released_when_the_holder_is_cancelled(self):
+        async def generate():
+            async with self.admission.aslot():
+                await asyncio.sleep(5)
+
+        holder = asyncio.ensure_future(generate())
+        await asyncio.sleep(0)
+        self.assertEqual(self.scheduler.stats()['in_flight'], 1)
+        holder.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await holder
+        self.assertEqual(self.scheduler.stats()['in_flight'], 0)
+
+    async def test_rejected_enhancement_answers_503_with_retry_after(self):
+        request = AsyncRequestFactory().post(
+            '/api/ai/enhance-task/', data={'task_name': 'buy groceries', 'provisional': False},
+            content_type='application/json'
+        )
+        with mock.patch('aiengine.views.TaskProcessor') as processor:
+            processor.return_value.aenhance_task = mock.AsyncMock(side_effect=AdmissionRejected('queue_full', 7))
+            response = await views.enhance_task(request)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '7')
+        self.assertEqual(json.loads(response.content)['reason'], 'queue_full')
+
+
+@override_settings(AI_SCHEDULER_WEIGHTS={'interactive': 2, 'batch': 1}, AI_SCHEDULER_STARVATION_TIMEOUT=60,
+                   AI_ADMISSION_MAX_QUEUE=20, AI_ADMISSION_QUEUE_TIMEOUT=5)
+class LLMSchedulerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.scheduler = LLMScheduler(slots=1)
+        self.order = []
+
+    async def job(self, name, job_class):
+        await self.scheduler.aacquire(job_class)
+        self.order.append(name)
+        self.scheduler.release(job_class)
+
+    async def run_queued(self, jobs):
+        """Queue `jobs` behind a held slot, then free it and let them run in turn"""
+        await self.scheduler.aacquire(INTERACTIVE)
+        tasks = []
+        for name, job_class in jobs:
+            tasks.append(asyncio.ensure_future(self.job(name, job_class)))
+            await asyncio.sleep(0)
+        self.scheduler.release(INTERACTIVE)
+        await asyncio.gather(*tasks)
+        return self.order
+
+    async def test_interactive_goes_ahead_of_queued_batch_work(self):
+        order = await self.run_queued([('batch', BATCH), ('interactive', INTERACTIVE)])
+        self.assertEqual(order, ['interactive', 'batch'])
+
+    async def test_batch_gets_its_weighted_share(self):
+        jobs = [('b1', BATCH), ('b2', BATCH)] + [(f'i{n}', INTERACTIVE) for n in range(1, 5)]
+        order = await self.run_queued(jobs)
+        self.assertEqual(order, ['i1', 'i2', 'b1', 'i3', 'i4', 'b2'])
+
+    @override_settings(AI_SCHEDULER_STARVATION_TIMEOUT=0)
+    async def test_starving_batch_work_is_promoted(self):
+        self.scheduler = LLMScheduler(slots=1)
+        order = await self.run_queued([('batch', BATCH), ('interactive', INTERACTIVE)])
+        self.assertEqual(order, ['batch', 'interactive'])
+        self.assertEqual(self.scheduler.stats()['classes'][BATCH]['starvation_promotions'], 1)
+
+    @override_settings(AI_SCHEDULER_BATCH_MAX_SLOTS=1)
+    async def test_batch_work_leaves_a_slot_for_interactive(self):
+        scheduler = LLMScheduler(slots=2)
+        await scheduler.aacquire(BATCH)
+        queued = asyncio.ensure_future(scheduler.aacquire(BATCH))
+        await asyncio.sleep(0)
+        self.assertFalse(queued.done())
+        await scheduler.aacquire(INTERACTIVE)
+        self.assertEqual(scheduler.stats()['classes'][BATCH]['in_flight'], 1)
+        scheduler.release(BATCH)
+        await queued
+
+    async def test_cancelled_batch_job_leaves_the_queue(self):
+        await self.scheduler.aacquire(INTERACTIVE)
+        queued = asyncio.ensure_future(self.scheduler.aacquire(BATCH))
+        await asyncio.sleep(0)
+        queued.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await queued
+
+        batch = self.scheduler.stats()['classes'][BATCH]
+        self.assertEqual((batch['queue_depth'], batch['abandoned']), (0, 1))
+        self.scheduler.release(INTERACTIVE)
+        self.assertEqual(self.scheduler.stats()['in_flight'], 0)
+
+
+@override_settings(AI_JOB_MAX_ATTEMPTS=2, AI_JOB_RETRY_BACKOFF=10, AI_JOB_RESULT_TTL=3600)
+class EnhancementJobQueueTests(TestCase):
+
+    def setUp(self):
+        self.queue = EnhancementJobQueue(worker_id='worker-a', visibility_timeout=60)
+
+    def lapse_lease(self, job):
+        EnhancementJob.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+
+    def test_claim_leases_due_jobs(self):
+        job = EnhancementJobQueue.submit('buy groceries')
+        EnhancementJob.objects.create(task_name='later', available_at=timezone.now() + timedelta(hours=1))
+
+        self.assertEqual(self.queue.claim(limit=5), [job])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.locked_by), ('running', 1, 'worker-a'))
+        self.assertGreater(job.locked_until, timezone.now())
+        self.assertEqual(self.queue.claim(limit=5), [])
+
+    def test_complete_stores_the_result(self):
+        job = EnhancementJobQueue.submit('buy groceries')
+        [job] = self.queue.claim()
+        self.assertTrue(self.queue.complete(job, {'success': True}))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result, job.locked_by), ('succeeded', {'success': True}, ''))
+        self.assertIsNotNone(job.expires_at)
+
+    def test_retry_requeues_after_the_backoff(self):
+        job = EnhancementJobQueue.submit('buy groceries')
+        [job] = self.queue.claim()
+        before = timezone.now()
+        self.assertTrue(self.queue.retry(job, 'timed out'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), ('queued', 'timed out'))
+        self.assertGreaterEqual(job.available_at, before + timedelta(seconds=10))
+        self.assertEqual(self.queue.claim(), [])
+
+    def test_retry_waits_for_a_longer_retry_after(self):
+        job = EnhancementJobQueue.submit('buy groceries')
+        [job] = self.queue.claim()
+        before = timezone.now()
+        self.queue.retry(job, 'at capacity', delay=120)
+        job.refresh_from_db()
+        self.assertGreaterEqual(job.available_at, before + timedelta(seconds=120))
+
+    def test_retry_out_of_attempts_fails_and_keeps_the_result(self):
+        job = EnhancementJobQueue.submit('buy groceries')
+        EnhancementJob.objects.filter(pk=job.pk).update(attempts=1)
+        [job] = self.queue.claim()
+        self.queue.retry(job, 'failed again', result={'success': False})
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result), ('failed', {'success': False}))
+
+    def test_lost_lease_drops_the_result(self):
+        job = EnhancementJobQueue.submit('buy groceries')
+        [stale] = self.queue.claim()
+        self.lapse_lease(stale)
+        other = EnhancementJobQueue(worker_id='worker-b', visibility_timeout=60)
+        [job] = other.claim()
+        self.assertEqual(job.attempts, 2)
+
+        self.assertFalse(self.queue.complete(stale, {'from': 'worker-a'}))
+        self.assertFalse(self.queue.retry(stale, 'late'))
+        self.assertTrue(other.complete(job, {'from': 'worker-b'}))
+        job.refresh_from_db()
+        self.assertEqual(job.result, {'from': 'worker-b'})
+
+    def test_expired_lease_out_of_attempts_is_failed(self):
+        job = EnhancementJobQueue.submit('buy groceries')
+        EnhancementJob.objects.filter(pk=job.pk).update(attempts=1)
+        [job] = self.queue.claim()
+        self.lapse_lease(job)
+
+        self.assertEqual(self.queue.claim(), [])
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('Lease expired', job.error)
+
+    def test_heartbeat_extends_only_own_leases(self):
+        job = EnhancementJobQueue.submit('buy groceries')
+        [job] = self.queue.claim()
+        self.lapse_lease(job)
+        other = EnhancementJobQueue(worker_id='worker-b', visibility_timeout=60)
+        self.assertEqual(other.heartbeat([job.pk]), 0)
+        self.assertEqual(self.queue.heartbeat([job.pk]), 1)
+        self.assertEqual(other.claim(), [])
+
+    def test_purge_expired_deletes_only_expired_jobs(self):
+        expired = EnhancementJob.objects.create(task_name='old', status='succeeded',
+                                                expires_at=timezone.now() - timedelta(seconds=1))
+        kept = EnhancementJob.objects.create(task_name='new', status='succeeded',
+                                             expires_at=timezone.now() + timedelta(hours=1))
+        self.assertEqual(EnhancementJobQueue.purge_expired(), 1)
+        self.assertFalse(EnhancementJob.objects.filter(pk=expired.pk).exists())
+        self.assertTrue(EnhancementJob.objects.filter(pk=kept.pk).exists())
+
+
+@skipUnlessDBFeature('has_select_for_update_skip_locked')
+class EnhancementJobClaimLockingTests(TransactionTestCase):
+
+    def test_claim_skips_jobs_locked_by_another_worker(self):
+        locked = EnhancementJobQueue.submit('locked')
+        free = EnhancementJobQueue.submit('free')
+        holding, done = threading.Event(), threading.Event()
+
+        def hold_lock():
+            try:
+                with transaction.atomic():
+                    list(EnhancementJob.objects.select_for_update().filter(pk=locked.pk))
+                    holding.set()
+                    done.wait(5)
+            finally:
+                connection.close()
+
+        holder = threading.Thread(target=hold_lock)
+        holder.start()
+        try:
+            self.assertTrue(holding.wait(5))
+            claimed = EnhancementJobQueue(worker_id='worker-a').claim(limit=2)
+        finally:
+            done.set()
+            holder.join()
+        self.assertEqual(claimed, [free])
+
+
+class EnhancementWorkerTests(TestCase):
+
+    def setUp(self):
+        self.queue = EnhancementJobQueue(worker_id='worker-a', visibility_timeout=60)
+        self.command = Command(stdout=StringIO())
+        EnhancementJobQueue.submit('buy groceries')
+        [self.job] = self.queue.claim()
+
+    def process(self, **outcome):
+        worker = 'aiengine.management.commands.run_enhancement_worker'
+        # Closing connections would end the test's transaction
+        with mock.patch(f'{worker}.TaskProcessor') as processor, mock.patch(f'{worker}.close_old_connections'):
+            processor.return_value.enhance_task.configure_mock(**outcome)
+            self.command._process(self.queue, self.job, 'batch')
+        self.job.refresh_from_db()
+        return self.job
+
+    def test_complete_result_succeeds(self):
+        job = self.process(return_value={'success': True, 'data': {}, 'meta': {'complete': True}})
+        self.assertEqual(job.status, 'succeeded')
+
+    def test_incomplete_generation_is_retried(self):
+        job = self.process(return_value={'success': True, 'data': {}, 'meta': {'complete': False}})
+        self.assertEqual(job.status, 'queued')
+        self.assertIn('before the answer was complete', job.error)
+
+    def test_rejected_job_waits_for_retry_after(self):
+        before = timezone.now()
+        job = self.process(side_effect=AdmissionRejected('queue_full', 300))
+        self.assertEqual(job.status, 'queued')
+        self.assertGreaterEqual(job.available_at, before + timedelta(seconds=300))
+
+
+class FakeBatchProcessor:
+    """TaskProcessor stand-in whose batch enhancement answers from `outcomes` by title"""
+
+    def __init__(self, outcomes=None):
+        self.outcomes = outcomes or {}
+        self.seen = []
+        self.client = mock.Mock(**{'is_available.return_value': True})
+
+    async def astream_batch_enhancement(self, task_names, concurrency=None):
+        for index, task_name in enumerate(task_names):
+            self.seen.append(task_name)
+            result = self.outcomes.get(task_name) or {
+                'success': True,
+                'data': {'descriptions': [f'About {task_name}'], 'deadline': '2026-10-20T17:00:00',
+                         'category': {'name': 'new', 'is_new': True}, 'priority_score': 0.8},
+                'meta': {'complete': True},
+            }
+            yield dict(result, index=index, task_name=task_name)
+        yield {'summary': {'items': len(task_names)}}
+
+
+class TaskBackfillTests(TestCase):
+
+    def setUp(self):
+        self.Task = apps.get_model('tasks', 'Task')
+        created_at = timezone.now() - timedelta(days=1)
+        self.tasks = [self.Task.objects.create(title=f'task {n}') for n in range(4)]
+        # Equal timestamps: the keyset order falls back to the id
+        self.Task.objects.filter(pk__in=[task.pk for task in self.tasks]).update(created_at=created_at)
+        self.tasks.sort(key=lambda task: task.pk)
+
+    def run_backfill(self, processor, **options):
+        dry_run = options.pop('dry_run', False)
+        with mock.patch('aiengine.services.backfill.TaskProcessor', return_value=processor):
+            backfill = TaskBackfill(chunk_size=2, rate_per_minute=0, dry_run=dry_run, log=lambda message: None)
+            return backfill.run(**options)
+
+    def enhanced(self):
+        enhanced = set(self.Task.objects.filter(is_ai_enhanced=True).values_list('pk', flat=True))
+        return [task.title for task in self.tasks if task.pk in enhanced]
+
+    def test_checkpoint_resumes_after_the_last_task(self):
+        first = FakeBatchProcessor()
+        self.assertEqual(self.run_backfill(first, max_tasks=3)['stopped'], 'max_tasks')
+        self.assertEqual(first.seen, [task.title for task in self.tasks[:3]])
+
+        second = FakeBatchProcessor()
+        totals = self.run_backfill(second)
+        self.assertEqual(second.seen, [self.tasks[3].title])
+        self.assertEqual((totals['processed'], totals['stopped']), (1, 'done'))
+        checkpoint = BackfillCheckpoint.objects.get(name='tasks')
+        self.assertEqual((checkpoint.last_id, checkpoint.processed), (self.tasks[3].pk, 4))
+        self.assertIsNotNone(checkpoint.finished_at)
+
+    def test_stops_before_a_retryable_failure(self):
+        unavailable = {'success': False, 'data': {}, 'meta': {'circuit': 'open', 'retry_after': 30}}
+        totals = self.run_backfill(FakeBatchProcessor({self.tasks[1].title: unavailable}))
+        self.assertEqual((totals['processed'], totals['stopped']), (1, 'backend_unavailable'))
+        self.assertEqual(self.enhanced(), [self.tasks[0].title])
+        self.assertEqual(BackfillCheckpoint.objects.get(name='tasks').last_id, self.tasks[0].pk)
+
+        retried = FakeBatchProcessor()
+        self.run_backfill(retried)
+        self.assertEqual(retried.seen, [task.title for task in self.tasks[1:]])
+
+    def test_incomplete_generation_is_counted_as_failed(self):
+        incomplete = {'success': True, 'data': {'descriptions': ['half']}, 'meta': {'complete': False}}
+        totals = self.run_backfill(FakeBatchProcessor({self.tasks[0].title: incomplete}))
+        self.assertEqual((totals['processed'], totals['failed'], totals['updated']), (4, 1, 3))
+        self.assertNotIn(self.tasks[0].title, self.enhanced())
+
+    def test_dry_run_writes_nothing(self):
+        totals = self.run_backfill(FakeBatchProcessor(), dry_run=True)
+        self.assertEqual(totals['updated'], 4)
+        self.assertEqual(self.enhanced(), [])
+        self.assertFalse(BackfillCheckpoint.objects.exists())
+
+    def test_task_edited_mid_chunk_is_not_overwritten(self):
+        edited = self.tasks[0]
+        apply = TaskBackfill._apply
+
+        def edit_then_apply(backfill, chunk, results):
+            self.Task.objects.filter(pk=edited.pk).update(description='written by the user', updated_at=timezone.now())
+            return apply(backfill, chunk, results)
+
+        with mock.patch.object(TaskBackfill, '_apply', edit_then_apply):
+            self.run_backfill(FakeBatchProcessor())
+        edited = self.Task.objects.get(pk=edited.pk)
+        self.assertEqual(edited.description, 'written by the user')
+        self.assertFalse(edited.is_ai_enhanced)
+        self.assertEqual(self.enhanced(), [task.title for task in self.tasks[1:]])
+
+
+class UpgradeRegistryTests(SimpleTestCase):
+
+    def setUp(self):
+        self.registry = UpgradeRegistry(max_workers=1, ttl=60, max_pending=2)
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def blocked(self, result=None):
+        def work():
+            self.release.wait(5)
+            return result or {'success': True}
+        return work
+
+    async def finish(self, upgrade_id):
+        self.release.set()
+        return await self.registry.await_upgrade(upgrade_id, timeout=5)
+
+    async def test_rejects_past_max_pending(self):
+        first = self.registry.submit(self.blocked())
+        self.registry.submit(self.blocked())
+        with self.assertRaises(AdmissionRejected) as rejected:
+            self.registry.submit(self.blocked())
+        self.assertEqual(rejected.exception.reason, 'upgrades_full')
+        self.assertEqual(self.registry.stats()['rejected'], 1)
+
+        self.assertEqual((await self.finish(first))['status'], 'ready')
+        for _ in range(100):
+            if self.registry.stats()['pending'] == 0:
+                break
+            await asyncio.sleep(0.01)
+        self.registry.submit(self.blocked())
+
+    async def test_newer_submission_cancels_an_unstarted_upgrade(self):
+        self.registry = UpgradeRegistry(max_workers=1, ttl=60, max_pending=3)
+        self.registry.submit(self.blocked())
+        older = self.registry.submit(self.blocked({'success': True, 'data': 'older'}), key='user:1:form')
+        newer = self.registry.submit(self.blocked({'success': True, 'data': 'newer'}), key='user:1:form')
+
+        self.assertEqual(await self.registry.await_upgrade(older), {'status': 'superseded'})
+        self.assertEqual((await self.finish(newer))['result']['data'], 'newer')
+        self.assertEqual(self.registry.stats()['superseded'], 1)
+
+    async def test_finished_results_expire_after_the_ttl(self):
+        upgrade_id = self.registry.submit(self.blocked())
+        self.assertEqual((await self.finish(upgrade_id))['status'], 'ready')
+
+        later = time.monotonic() + 61
+        with mock.patch('aiengine.services.provisional.time.monotonic', return_value=later):
+            self.registry.submit(self.blocked())
+        self.assertIsNone(await self.registry.await_upgrade(upgrade_id))
+        self.assertEqual(self.registry.stats()['evicted'], 1)
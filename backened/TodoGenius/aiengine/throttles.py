@@ -0,0 +1,46 @@
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class EnhanceTaskRateThrottle(SimpleRateThrottle):
+    """
+    Per-client limit on AI enhancement requests (scope 'ai_enhance')
+
+    Clients are identified by address rather than request.user, which
+    would need a synchronous session lookup inside the async views. The
+    rate comes from REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']['ai_enhance'].
+    """
+
+    scope = 'ai_enhance'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': self.get_ident(request)
+        }
+
+    def allow_request(self, request, view, cost: int = 1):
+        """SimpleRateThrottle.allow_request, charging `cost` requests at once"""
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        self.history = self.cache.get(self.key, [])
+        self.now = self.timer()
+        while self.history and self.history[-1] <= self.now - self.duration:
+            self.history.pop()
+        if len(self.history) + cost > self.num_requests:
+            return self.throttle_failure()
+        self.history[:0] = [self.now] * cost
+        self.cache.set(self.key, self.history, self.duration)
+        return True
+
+
+class EnhanceTaskBatchRateThrottle(EnhanceTaskRateThrottle):
+    """
+    Per-client limit on tasks enhanced through the batch endpoint (scope
+    'ai_enhance_batch'). Every task in a batch is charged, so a batch
+    cannot be used to get around the per-request limit.
+    """
+
+    scope = 'ai_enhance_batch'
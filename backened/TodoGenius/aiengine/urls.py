@@ -4,5 +4,12 @@ from . import views
 urlpatterns = [
     # Task AI endpoints
     path('enhance-task/', views.enhance_task, name='enhance_task'),
+    path('enhance-task/stream/', views.enhance_task_stream, name='enhance_task_stream'),
+    path('enhance-tasks/batch/', views.enhance_tasks_batch, name='enhance_tasks_batch'),
+    path('enhance-task/upgrade/<str:upgrade_id>/', views.enhancement_upgrade, name='enhancement_upgrade'),
+    path('jobs/', views.submit_enhancement_job, name='submit_enhancement_job'),
+    path('jobs/<uuid:job_id>/', views.enhancement_job, name='enhancement_job'),
+    path('jobs/<uuid:job_id>/result/', views.enhancement_job_result, name='enhancement_job_result'),
+    path('health/', views.ai_health, name='ai_health'),
     
     ]
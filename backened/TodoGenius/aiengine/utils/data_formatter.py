@@ -1,9 +1,10 @@
 from typing import Dict, List, Any, Optional
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone as dt_timezone
 import json
 import re
 from django.utils import timezone
-import random
+import zlib
+from .output_schema import OutputSchema
 
 class DataFormatter:
     """Format data for AI processing with robust error handling"""
@@ -60,9 +61,20 @@ class DataFormatter:
             target_date = timezone.now() + timedelta(days=3)
             return target_date.strftime('%Y-%m-%dT%H:%M:%S')
     
+    @staticmethod
+    def format_deadline(moment: datetime) -> str:
+        """A deadline in the same format as days_to_datetime (UTC when timezone-aware)"""
+        if timezone.is_aware(moment):
+            moment = moment.astimezone(dt_timezone.utc)
+        return moment.strftime('%Y-%m-%dT%H:%M:%S')
+    
     @staticmethod
     def generate_creative_description(task_name: str) -> str:
-        """Generate creative description when parsing fails"""
+        """
+        Generate creative description when parsing fails. The template is
+        picked from a hash of the task name, so the same task always gets
+        the same fallback.
+        """
         creative_templates = [
             f"Transform your approach to '{task_name}' by breaking it into manageable steps and focusing on the end goal.",
             f"Tackle '{task_name}' with renewed energy and strategic planning for optimal results.",
@@ -75,7 +87,7 @@ class DataFormatter:
             f"Excel at '{task_name}' by maintaining high standards and consistent effort.",
             f"Achieve mastery in '{task_name}' through dedicated practice and continuous improvement."
         ]
-        return random.choice(creative_templates)
+        return creative_templates[zlib.crc32(task_name.encode('utf-8')) % len(creative_templates)]
     
     @staticmethod
     def extract_json_from_response(text: str) -> Optional[Dict]:
@@ -228,6 +240,29 @@ class DataFormatter:
         
         return None
     
+    @staticmethod
+    def format_partial_field(name: str, value: Any) -> Any:
+        """
+        Convert one streamed top-level field to the shape the API returns,
+        or None when the value is unusable
+        """
+        try:
+            if name == 'category':
+                if isinstance(value, str):
+                    return {'name': value, 'color': '#3B82F6'}
+                if isinstance(value, dict) and value.get('name'):
+                    return value
+                return None
+            if name in ('priority_score', 'confidence'):
+                return max(0.0, min(1.0, float(value)))
+            if name == 'deadline':
+                return DataFormatter.days_to_datetime(int(value))
+            if name == 'descriptions' and isinstance(value, list):
+                return value[0] if value else None
+            return value
+        except (ValueError, TypeError):
+            return None
+
     @staticmethod
     def validate_and_fix_response(data: Dict, original_task_name: str = "") -> Dict:
         """
@@ -304,6 +339,36 @@ class DataFormatter:
             'reasoning': 'AI parsing failed - using intelligent fallback with creative description'
         }
 
+    @staticmethod
+    def conform_constrained_response(data: Dict) -> Dict:
+        """
+        Convert a response produced under constrained decoding to the API
+        shape. The grammar already guarantees types and ranges, so only the
+        deadline (days from now) needs converting.
+        """
+        if 'deadline' in data:
+            data['deadline'] = DataFormatter.days_to_datetime(int(data['deadline']))
+        return data
+
+    def parse_streamed_response(self, parser, original_task_name: str = "", schema: Optional[Dict] = None) -> Dict:
+        """
+        Validate the object decoded by a StreamingJSONParser, only falling
+        back to the full-text strategies when nothing parsed while streaming.
+
+        When `schema` is given the output was produced under constrained
+        decoding; a complete object then skips the repair path entirely.
+        """
+        parsed_data = parser.result()
+        if (schema is not None and parser.is_complete
+                and OutputSchema.has_required_fields(parsed_data, schema)):
+            return DataFormatter.conform_constrained_response(parsed_data)
+
+        if parsed_data is None:
+            print("Streaming parser found no JSON object, trying full-text strategies")
+            return self.parse_ai_response(parser.raw_text, original_task_name)
+        
+        return DataFormatter.validate_and_fix_response(parsed_data, original_task_name)
+
     def parse_ai_response(self, response: str, original_task_name: str = "") -> Dict:
         """Parse AI response using standard industry practices with robust fallback"""
         try:
@@ -0,0 +1,149 @@
+from typing import Any, Dict, List, Optional
+import json
+import re
+
+
+class StreamingJSONParser:
+    """
+    Incremental, tolerant parser for a JSON object streamed by the model.
+
+    feed() consumes text chunks as they are decoded. Chatter and markdown
+    fences before the first '{' are skipped, every top-level field is
+    decoded as soon as its value ends, and once the closing brace of the
+    top-level object arrives `is_complete` turns true so the caller can
+    stop the upstream generation. Each character is scanned exactly once.
+    """
+
+    # Positions inside the top-level object
+    _EXPECT_KEY = 'key'
+    _EXPECT_COLON = 'colon'
+    _EXPECT_VALUE = 'value'
+    _IN_VALUE = 'in_value'
+
+    _TRAILING_COMMA = re.compile(r',\s*([}\]])')
+
+    def __init__(self):
+        self.fields: Dict[str, Any] = {}
+        self.is_complete = False
+        self._raw: List[str] = []
+        self._object: List[str] = []
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._state = self._EXPECT_KEY
+        self._token_start: Optional[int] = None
+        self._key: Optional[str] = None
+
+    @property
+    def raw_text(self) -> str:
+        """Everything fed so far, including text around the object"""
+        return ''.join(self._raw)
+
+    @property
+    def object_text(self) -> str:
+        """The top-level object text consumed so far"""
+        return ''.join(self._object)
+
+    def feed(self, chunk: str) -> List[str]:
+        """
+        Consume a chunk of streamed text and return the names of the
+        top-level fields it completed
+        """
+        completed = []
+        if not chunk:
+            return completed
+        self._raw.append(chunk)
+        if self.is_complete:
+            return completed
+
+        for char in chunk:
+            if not self._started:
+                if char != '{':
+                    continue
+                self._started = True
+
+            position = len(self._object)
+            self._object.append(char)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._state == self._EXPECT_KEY:
+                        try:
+                            self._key = self._decode(self._token_start, position + 1)
+                        except ValueError:
+                            self._key = None
+                        self._state = self._EXPECT_COLON
+                continue
+
+            if char == '"':
+                self._in_string = True
+                if self._depth == 1:
+                    if self._state == self._EXPECT_KEY:
+                        self._token_start = position
+                    elif self._state == self._EXPECT_VALUE:
+                        self._token_start = position
+                        self._state = self._IN_VALUE
+                continue
+
+            if char in '{[':
+                self._depth += 1
+                if self._depth == 2 and self._state == self._EXPECT_VALUE:
+                    self._token_start = position
+                    self._state = self._IN_VALUE
+                continue
+
+            if char in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    self._complete_field(position, completed)
+                    self.is_complete = True
+                    break
+                continue
+
+            if self._depth != 1:
+                continue
+
+            if char == ':' and self._state == self._EXPECT_COLON:
+                self._state = self._EXPECT_VALUE
+            elif char == ',':
+                self._complete_field(position, completed)
+            elif not char.isspace() and self._state == self._EXPECT_VALUE:
+                # Bare literal: number, true, false or null
+                self._token_start = position
+                self._state = self._IN_VALUE
+
+        return completed
+
+    def _complete_field(self, end: int, completed: List[str]):
+        """Decode the top-level value that ends just before `end`"""
+        if self._state == self._IN_VALUE and self._key is not None:
+            try:
+                self.fields[self._key] = self._decode(self._token_start, end)
+                completed.append(self._key)
+            except ValueError:
+                print(f"Skipping malformed value for field '{self._key}'")
+        self._key = None
+        self._token_start = None
+        self._state = self._EXPECT_KEY
+
+    def _decode(self, start: int, end: int) -> Any:
+        text = ''.join(self._object[start:end]).strip()
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            # Tolerate trailing commas inside nested values
+            return json.loads(self._TRAILING_COMMA.sub(r'\1', text))
+
+    def result(self) -> Optional[Dict]:
+        """
+        The fields decoded from the top-level object. Every value was decoded
+        while streaming, so no second parse of the full text is needed; if
+        the object never closed this is whatever parsed before the cut-off.
+        """
+        return dict(self.fields) if self.fields else None
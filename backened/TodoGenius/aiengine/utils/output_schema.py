@@ -0,0 +1,166 @@
+from typing import Dict, Iterable, List, Optional
+from functools import lru_cache
+import copy
+import json
+
+
+# Single definition of the enhancement output shape. The OpenAI-style
+# response_format and the llama.cpp GBNF grammar are both generated from it.
+ENHANCEMENT_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'title': {'type': 'string', 'maxLength': 255},
+        'descriptions': {'type': 'string', 'maxLength': 900},
+        'category': {
+            'type': 'object',
+            'properties': {
+                'name': {'type': 'string', 'maxLength': 100},
+                'color': {'type': 'string', 'pattern': '^#[0-9A-Fa-f]{6}$'},
+            },
+            'required': ['name', 'color'],
+            'additionalProperties': False,
+        },
+        'priority_score': {'type': 'number', 'minimum': 0.0, 'maximum': 1.0},
+        'deadline': {'type': 'integer', 'minimum': 1, 'maximum': 30},
+        'confidence': {'type': 'number', 'minimum': 0.0, 'maximum': 1.0},
+        'reasoning': {'type': 'string', 'maxLength': 500},
+    },
+    'required': [
+        'title', 'descriptions', 'category', 'priority_score',
+        'deadline', 'confidence', 'reasoning'
+    ],
+    'additionalProperties': False,
+}
+
+# Modes accepted by the AI_CONSTRAINED_OUTPUT setting
+CONSTRAINED_OUTPUT_MODES = ('json_schema', 'gbnf')
+
+_HEX_COLOR_PATTERN = '^#[0-9A-Fa-f]{6}$'
+
+_GBNF_PRIMITIVES = {
+    'ws': '[ \\t\\n]*',
+    'string': '"\\"" ( [^"\\\\\\x7F\\x00-\\x1F] | "\\\\" ( ["\\\\/bfnrt] | "u" [0-9a-fA-F] [0-9a-fA-F] [0-9a-fA-F] [0-9a-fA-F] ) )* "\\""',
+    'number': '"-"? ( "0" | [1-9] [0-9]* ) ( "." [0-9]+ )? ( [eE] [-+]? [0-9]+ )?',
+    'integer': '"-"? ( "0" | [1-9] [0-9]* )',
+    'boolean': '"true" | "false"',
+    'null': '"null"',
+    # Scores constrained to [0, 1] with at most three decimals
+    'unit-number': '( "0" ( "." [0-9] [0-9]? [0-9]? )? ) | ( "1" ( "." "0" "0"? "0"? )? )',
+    'hex-color': '"\\"#" [0-9A-Fa-f] [0-9A-Fa-f] [0-9A-Fa-f] [0-9A-Fa-f] [0-9A-Fa-f] [0-9A-Fa-f] "\\""',
+}
+
+
+class OutputSchema:
+    """Build constrained-decoding payloads from the enhancement schema"""
+
+    @staticmethod
+    def enhancement_schema(exclude: Iterable[str] = ()) -> Dict:
+        """Copy of ENHANCEMENT_SCHEMA, optionally without some top-level fields"""
+        schema = copy.deepcopy(ENHANCEMENT_SCHEMA)
+        for field in exclude:
+            schema['properties'].pop(field, None)
+            if field in schema['required']:
+                schema['required'].remove(field)
+        return schema
+
+    @staticmethod
+    def to_response_format(schema: Dict, name: str = 'task_enhancement') -> Dict:
+        """response_format payload for OpenAI-compatible servers (LM Studio)"""
+        return {
+            'type': 'json_schema',
+            'json_schema': {
+                'name': name,
+                'strict': True,
+                'schema': schema,
+            }
+        }
+
+    @staticmethod
+    def to_gbnf(schema: Dict) -> str:
+        """GBNF grammar for llama.cpp that only admits JSON matching `schema`"""
+        return _schema_to_gbnf(json.dumps(schema))
+
+    @staticmethod
+    def request_params(mode: Optional[str], schema: Optional[Dict]) -> Dict:
+        """Extra request parameters for the given AI_CONSTRAINED_OUTPUT mode"""
+        if not mode or schema is None:
+            return {}
+        if mode == 'json_schema':
+            return {'response_format': OutputSchema.to_response_format(schema)}
+        if mode == 'gbnf':
+            return {'grammar': OutputSchema.to_gbnf(schema)}
+        raise ValueError(
+            f"Unknown constrained output mode '{mode}', expected one of {CONSTRAINED_OUTPUT_MODES}"
+        )
+
+    @staticmethod
+    def has_required_fields(data: Dict, schema: Dict) -> bool:
+        return isinstance(data, dict) and all(field in data for field in schema.get('required', []))
+
+
+@lru_cache(maxsize=32)
+def _schema_to_gbnf(schema_json: str) -> str:
+    """Cached worker for OutputSchema.to_gbnf, keyed on the schema JSON (property order matters)"""
+    rules: Dict[str, str] = {}
+    root = _GbnfBuilder(rules).visit(json.loads(schema_json), 'root')
+    lines = [f'root ::= {root} ws'] if root != 'root' else []
+    lines += [f'{name} ::= {body}' for name, body in rules.items()]
+    for name, body in _GBNF_PRIMITIVES.items():
+        lines.append(f'{name} ::= {body}')
+    return '\n'.join(lines) + '\n'
+
+
+class _GbnfBuilder:
+    """Translate the JSON-schema subset used by ENHANCEMENT_SCHEMA into GBNF rules"""
+
+    def __init__(self, rules: Dict[str, str]):
+        self.rules = rules
+
+    @staticmethod
+    def _literal(value: str) -> str:
+        return json.dumps(json.dumps(value))
+
+    def visit(self, schema: Dict, name: str) -> str:
+        """Return a rule reference (or inline expression) for `schema`"""
+        if 'enum' in schema:
+            return '( ' + ' | '.join(self._literal(v) for v in schema['enum']) + ' )'
+
+        schema_type = schema.get('type')
+        if schema_type == 'object':
+            return self._object(schema, name)
+        if schema_type == 'array':
+            item = self.visit(schema.get('items', {}), f'{name}-item')
+            self.rules[name] = f'"[" ws ( {item} ws ( "," ws {item} ws )* )? "]"'
+            return name
+        if schema_type == 'string':
+            return 'hex-color' if schema.get('pattern') == _HEX_COLOR_PATTERN else 'string'
+        if schema_type == 'number':
+            if schema.get('minimum') == 0 and schema.get('maximum') == 1:
+                return 'unit-number'
+            return 'number'
+        if schema_type == 'integer':
+            return self._integer(schema, name)
+        if schema_type == 'boolean':
+            return 'boolean'
+        if schema_type == 'null':
+            return 'null'
+        raise ValueError(f"Unsupported schema type for GBNF conversion: {schema_type}")
+
+    def _object(self, schema: Dict, name: str) -> str:
+        # Emit properties in schema order; required and optional alike are
+        # kept so the model cannot invent extra keys
+        parts: List[str] = []
+        for index, (key, subschema) in enumerate(schema.get('properties', {}).items()):
+            value = self.visit(subschema, f'{name}-{key.replace("_", "-")}')
+            separator = '"," ws ' if index else ''
+            parts.append(f'{separator}{self._literal(key)} ws ":" ws {value} ws')
+        self.rules[name] = '"{" ws ' + ' '.join(parts) + ' "}"'
+        return name
+
+    def _integer(self, schema: Dict, name: str) -> str:
+        minimum, maximum = schema.get('minimum'), schema.get('maximum')
+        if minimum is None or maximum is None or maximum - minimum > 100:
+            return 'integer'
+        # Small bounded ranges are spelled out so out-of-range values are impossible
+        self.rules[name] = ' | '.join(f'"{value}"' for value in range(int(minimum), int(maximum) + 1))
+        return name
@@ -0,0 +1,101 @@
+# ai_engine/utils/prompt_assembler.py
+
+import math
+import re
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from django.conf import settings
+from ..constants import PROMPT_SECTION_BUDGETS, PROMPT_ENTRY_MAX_TOKENS
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+_TERM_RE = re.compile(r"[a-z0-9]{3,}")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Fast tokenizer-free token count: one token per punctuation mark and
+    roughly one per four characters of every word, which tracks BPE
+    vocabularies closely enough for budgeting English prompts
+    """
+    if not text:
+        return 0
+    return sum(max(1, math.ceil(len(piece) / 4)) for piece in _WORD_RE.findall(text))
+
+
+def terms(text: str) -> set:
+    """Lower-cased words of three or more characters, for relevance scoring"""
+    return set(_TERM_RE.findall((text or '').lower()))
+
+
+class PromptAssembler:
+    """
+    Fill the request-specific prompt sections within a token budget
+
+    Each section (categories, tasks, context) gets its own budget. Its
+    candidate entries are ranked by relevance to the task, i.e. the share
+    of the task's terms they mention plus a small bonus for recency, and
+    taken in that order while they fit. A single entry longer than
+    PROMPT_ENTRY_MAX_TOKENS (a pasted email, say) is cut down to it first.
+    Selected entries are rendered back in source order so that requests
+    choosing the same entries produce the same text.
+    """
+
+    def __init__(self, count_tokens: Optional[Callable[[str], int]] = None,
+                 budgets: Optional[Dict[str, int]] = None, entry_max_tokens: Optional[int] = None):
+        self.count_tokens = count_tokens or estimate_tokens
+        self.budgets = dict(PROMPT_SECTION_BUDGETS, **(budgets or getattr(settings, 'AI_PROMPT_SECTION_BUDGETS', {})))
+        self.entry_max_tokens = entry_max_tokens or getattr(settings, 'AI_PROMPT_ENTRY_MAX_TOKENS', PROMPT_ENTRY_MAX_TOKENS)
+        # Tokens used per section by the last fill() calls
+        self.usage: Dict[str, int] = {}
+
+    @staticmethod
+    def relevance(query_terms: set, text: str, position: int) -> float:
+        """Term overlap with the task (0-1) plus a recency bonus for earlier entries"""
+        overlap = len(query_terms & terms(text)) / len(query_terms) if query_terms else 0.0
+        return overlap + 0.5 / (1 + position)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut text on a word boundary so it counts at most max_tokens"""
+        tokens = self.count_tokens(text)
+        if tokens <= max_tokens:
+            return text
+        cut = int(len(text) * max_tokens / tokens)
+        while cut > 0:
+            candidate = text[:cut].rsplit(' ', 1)[0] if ' ' in text[:cut] else text[:cut]
+            if self.count_tokens(candidate) <= max_tokens:
+                return candidate
+            cut = int(cut * 0.9)
+        return ''
+
+    def fill(self, section: str, query: str, entries: Sequence[Tuple[str, Callable[[str], str]]],
+             max_entries: int) -> List[str]:
+        """
+        Pick lines for `section`. Each entry is (scored text, render) where
+        render(text) formats the line, so an oversized text can be trimmed
+        before rendering. Returns the chosen lines in source order.
+        """
+        budget = self.budgets.get(section, 0)
+        query_terms = terms(query)
+        ranked = sorted(
+            range(len(entries)),
+            key=lambda index: self.relevance(query_terms, entries[index][0], index),
+            reverse=True
+        )
+
+        chosen: Dict[int, str] = {}
+        used = 0
+        for index in ranked:
+            if len(chosen) >= max_entries:
+                break
+            text, render = entries[index]
+            line = render(text)
+            tokens = self.count_tokens(line) + 1  # newline
+            if tokens > self.entry_max_tokens:
+                line = render(self.truncate(text, self.entry_max_tokens - (tokens - self.count_tokens(text))))
+                tokens = self.count_tokens(line) + 1
+            if used + tokens > budget:
+                continue
+            chosen[index] = line
+            used += tokens
+
+        self.usage[section] = used
+        return [chosen[index] for index in sorted(chosen)]
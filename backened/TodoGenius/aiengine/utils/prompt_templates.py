@@ -1,45 +1,232 @@
 # ai_engine/utils/prompt_templates.py
 
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 from datetime import datetime, timedelta
 import json
+from functools import lru_cache
+from .prompt_assembler import PromptAssembler
+
+# Static part of the enhancement prompt. It is sent as the system message and
+# must stay byte-identical between requests so the inference server can reuse
+# its KV cache for this prefix; anything request-specific belongs in the user
+# message built by PromptTemplates._build_enhancement_messages.
+ENHANCEMENT_SYSTEM_PROMPT = """You are TodoGenius AI, an intelligent task management assistant. Analyze the user's task and generate an enhanced task with context-aware insights, using the recent context, recent tasks and available categories provided with it.
+
+Your response must be ONLY valid JSON in this exact format:
+
+{
+  "title": "the task exactly as the user wrote it",
+  "descriptions": "Write a 2-3 sentence description here. Include specific details from the context when available. Make it actionable and personalized.",
+  "category": {
+    "name": "category_name",
+    "color": "#HEX_COLOR"
+  },
+  "priority_score": 0.0,
+  "deadline": 0,
+  "confidence": 0.0,
+  "reasoning": "Brief explanation of your analysis"
+}
+
+ANALYSIS GUIDELINES:
+
+1. PRIORITY SCORING (0.0-1.0):
+   - Emergency/urgent context → 0.8-1.0
+   - Business meetings/deadlines → 0.7-0.9
+   - Important personal events → 0.6-0.8
+   - Routine with mild pressure → 0.4-0.6
+   - General tasks → 0.2-0.4
+
+2. DEADLINE (days from now):
+   - "today", "urgent", "now" → 1
+   - "tomorrow", specific times → 2
+   - "this week" → 3-5
+   - "next week" → 7-10
+   - No urgency → 14-30
+
+3. DESCRIPTION RULES:
+   - Be specific and actionable
+   - Include context details (names, times, locations)
+   - 2-3 sentences, 45-85 words
+   - Professional but conversational tone
+
+4. CATEGORY SELECTION:
+   - Match existing categories when possible
+   - Use context clues (work/personal/health/etc.)
+   - Assign appropriate colors
+
+EXAMPLES:
+
+Input: "team meeting"
+Context: "Sarah mentioned budget review at 2 PM tomorrow"
+Output:
+{
+  "title": "team meeting",
+  "descriptions": "Attend the budget review meeting with Sarah tomorrow at 2 PM. Prepare your department's financial analysis and come ready to discuss cost optimization strategies. This meeting will finalize budget allocations for the next quarter.",
+  "category": {"name": "work", "color": "#3B82F6"},
+  "priority_score": 0.7,
+  "deadline": 2,
+  "confidence": 0.9,
+  "reasoning": "Work meeting with specific time and person mentioned in context"
+}
+
+Input: "grocery shopping"
+Context: "Mom's birthday dinner Saturday, need ingredients"
+Output:
+{
+  "title": "grocery shopping",
+  "descriptions": "Buy groceries for Mom's birthday dinner this Saturday. Pick up ingredients for her favorite dishes and don't forget to grab a birthday card. Plan to shop early to ensure fresh ingredients for the special meal.",
+  "category": {"name": "personal", "color": "#10B981"},
+  "priority_score": 0.6,
+  "deadline": 3,
+  "confidence": 0.8,
+  "reasoning": "Personal task with specific event context and moderate time pressure"
+}"""
+
+
+@lru_cache(maxsize=8)
+def _compile_chat_template(template: str):
+    """Compile a Hugging Face style chat template (as stored in GGUF metadata)"""
+    from jinja2.sandbox import ImmutableSandboxedEnvironment
+
+    def raise_exception(message):
+        raise ValueError(f"Chat template error: {message}")
+
+    environment = ImmutableSandboxedEnvironment(trim_blocks=True, lstrip_blocks=True)
+    environment.globals['raise_exception'] = raise_exception
+    return environment.from_string(template)
+
 
 class PromptTemplates:
     """Collection of prompt templates for different AI tasks"""
-    
-    def _build_enhancement_prompt(task_name: str, recent_tasks: List[Dict], recent_context: List[Dict], existing_categories: List[Dict]) -> str:
-        """Build comprehensive prompt for AI enhancement with category colors"""
-        
+
+    @staticmethod
+    def _format_prompt_sections(task_name: str, recent_tasks: List[Dict], recent_context: List[Dict],
+                                existing_categories: List[Dict], assembler: Optional[PromptAssembler] = None,
+                                skip_categories: bool = False) -> Dict[str, str]:
+        """
+        Render the request-specific context sections shared by both prompt
+        layouts, each filled by relevance to the task within its token budget.
+        The category list is left out when the category is already decided.
+        """
+        assembler = assembler or PromptAssembler()
+
         # Format recent tasks for context WITH COLORS
-        tasks_context = ""
-        if recent_tasks:
-            tasks_context = "\n".join([
-                f"- {task.get('title', '')}: {(task.get('description', '') or '')[:100]}... "
-                f"(Category: {task.get('category_name', 'N/A')} [{task.get('category_color', '#000000')}], Priority: {task.get('priority_score', 0):.2f})"
-                for task in recent_tasks[:5]
-            ])
-        else:
-            tasks_context = "No recent tasks available (new user)"
+        tasks_lines = assembler.fill('tasks', task_name, [
+            (
+                f"{task.get('title', '')} {task.get('description', '') or ''}",
+                lambda text, task=task: (
+                    f"- {task.get('title', '')}: {(task.get('description', '') or '')[:100]}... "
+                    f"(Category: {task.get('category_name', 'N/A')} [{task.get('category_color', '#000000')}], Priority: {task.get('priority_score', 0):.2f})"
+                )
+            )
+            for task in recent_tasks
+        ], max_entries=5)
+        tasks_context = "\n".join(tasks_lines) if tasks_lines else "No recent tasks available (new user)"
         
-        # Format recent context
-        context_info = ""
-        if recent_context:
-            context_info = "\n".join([
-                f"- [{ctx.get('source_type', 'unknown')}]: {(ctx.get('content', '') or '')}..."
-                for ctx in recent_context[:5]
-            ])
-        else:
-            context_info = "No recent context available"
+        # Format recent context; long entries are trimmed to fit
+        context_lines = assembler.fill('context', task_name, [
+            (
+                ctx.get('content', '') or '',
+                lambda text, ctx=ctx: f"- [{ctx.get('source_type', 'unknown')}]: {text}..."
+            )
+            for ctx in recent_context
+        ], max_entries=5)
+        context_info = "\n".join(context_lines) if context_lines else "No recent context available"
         
         # Format existing categories WITH COLORS
-        categories_info = ""
-        if existing_categories:
-            categories_info = "\n".join([
-                f"- {cat['name']} [{cat['color']}]: ... (Used {cat['usage_frequency']} times)"
-                for cat in existing_categories[:15]
-            ])
+        categories_lines = [] if skip_categories else assembler.fill('categories', task_name, [
+            (
+                cat['name'],
+                lambda text, cat=cat: f"- {cat['name']} [{cat['color']}]: ... (Used {cat['usage_frequency']} times)"
+            )
+            for cat in existing_categories
+        ], max_entries=15)
+        if skip_categories:
+            categories_info = "Not needed, the category is already set"
         else:
-            categories_info = "No existing categories"
+            categories_info = "\n".join(categories_lines) if categories_lines else "No existing categories"
+
+        return {
+            'tasks': tasks_context,
+            'context': context_info,
+            'categories': categories_info,
+        }
+
+    @staticmethod
+    def _build_enhancement_messages(task_name: str, recent_tasks: List[Dict], recent_context: List[Dict], existing_categories: List[Dict],
+                                    assembler: Optional[PromptAssembler] = None,
+                                    fixed_fields: Optional[Dict[str, str]] = None) -> List[Dict]:
+        """
+        Build the enhancement prompt as chat messages: the static
+        ENHANCEMENT_SYSTEM_PROMPT followed by a user message holding only the
+        request-specific parts, ordered from least to most volatile so
+        consecutive requests share as long a cached prefix as possible.
+
+        `fixed_fields` maps output fields already decided (a deadline read
+        from the task, a predicted category) to how they were decided; the
+        model is told to leave them out. Their rules stay in the system
+        prompt so its cached prefix is unchanged.
+        """
+        fixed_fields = fixed_fields or {}
+        sections = PromptTemplates._format_prompt_sections(
+            task_name, recent_tasks, recent_context, existing_categories, assembler,
+            skip_categories='category' in fixed_fields
+        )
+        fixed_note = ""
+        if fixed_fields:
+            fixed_note = "\nAlready decided, omit these fields from your response:\n" + "\n".join(
+                f"- {name}: {value}" for name, value in fixed_fields.items()
+            ) + "\n"
+        user_prompt = f"""Available Categories: {sections['categories']}
+Recent Tasks: {sections['tasks']}
+Relevant Context: {sections['context']}
+{fixed_note}
+TASK: "{task_name}"
+
+Now analyze "{task_name}" and provide your JSON response:"""
+
+        return [
+            {'role': 'system', 'content': ENHANCEMENT_SYSTEM_PROMPT},
+            {'role': 'user', 'content': user_prompt},
+        ]
+    
+    @staticmethod
+    def _render_instruct_prompt(messages: List[Dict], chat_template: Optional[Dict[str, str]] = None) -> str:
+        """
+        Flatten chat messages into a single completion prompt, for backends
+        that batch raw completions. `chat_template` is the model's Jinja
+        chat template ({'template', 'bos_token', 'eos_token'}, see
+        BaseInferenceEngine.chat_template). Without one the Mistral/Llama-2
+        [INST] layout is used, which only suits models trained on it. The
+        system message stays first so the cached prefix is the same as in
+        the chat layout.
+        """
+        if chat_template:
+            return _compile_chat_template(chat_template['template']).render(
+                messages=messages,
+                bos_token=chat_template.get('bos_token', ''),
+                eos_token=chat_template.get('eos_token', ''),
+                add_generation_prompt=True,
+            )
+        system = "\n\n".join(m['content'] for m in messages if m['role'] == 'system')
+        turns = [m['content'] for m in messages if m['role'] == 'user']
+        body = "\n\n".join(part for part in [system] + turns if part)
+        return f"[INST] {body} [/INST]"
+
+    @staticmethod
+    def _build_enhancement_prompt(task_name: str, recent_tasks: List[Dict], recent_context: List[Dict], existing_categories: List[Dict],
+                                  assembler: Optional[PromptAssembler] = None) -> str:
+        """
+        Build comprehensive prompt for AI enhancement with category colors.
+
+        Legacy single-string layout with the task ahead of the static
+        guidelines; kept for completion-only backends and benchmarking
+        against _build_enhancement_messages.
+        """
+        sections = PromptTemplates._format_prompt_sections(task_name, recent_tasks, recent_context, existing_categories, assembler)
+        tasks_context = sections['tasks']
+        context_info = sections['context']
+        categories_info = sections['categories']
         
         # Get available colors for new categories
         #available_colors = self._get_available_colors()
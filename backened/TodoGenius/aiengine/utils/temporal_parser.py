@@ -0,0 +1,286 @@
+# ai_engine/utils/temporal_parser.py
+
+import calendar
+import re
+from datetime import datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional
+
+# Confidence of each kind of expression. Explicit dates and offsets are
+# unambiguous; "next Friday" or "next week" are read differently by
+# different people and are left to the model at the default threshold.
+EXPLICIT = 0.95
+TIME_ONLY = 0.9
+PERIOD_END = 0.9
+NEXT_WEEKDAY = 0.8
+VAGUE = 0.6
+AMBIGUOUS = 0.4
+
+# Expressions found in context are relative to when the context was written
+# and may be about something else; they count for a little less
+CONTEXT_FACTOR = 0.95
+
+END_OF_BUSINESS = time(17, 0)
+END_OF_DAY = time(23, 59)
+
+DAYPART_HOURS = {
+    'morning': 9, 'noon': 12, 'midday': 12, 'afternoon': 15,
+    'evening': 18, 'night': 20, 'tonight': 20, 'tonite': 20, 'midnight': 23,
+}
+
+NUMBER_WORDS = {
+    'a': 1, 'an': 1, 'one': 1, 'a couple of': 2, 'couple of': 2, 'two': 2, 'three': 3, 'four': 4,
+    'five': 5, 'six': 6, 'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11, 'twelve': 12,
+}
+
+WEEKDAYS = {
+    'monday': 0, 'mon': 0, 'tuesday': 1, 'tue': 1, 'tues': 1, 'wednesday': 2, 'wed': 2,
+    'thursday': 3, 'thu': 3, 'thur': 3, 'thurs': 3, 'friday': 4, 'fri': 4,
+    'saturday': 5, 'sat': 5, 'sunday': 6, 'sun': 6,
+}
+
+MONTHS = {
+    'january': 1, 'jan': 1, 'february': 2, 'feb': 2, 'march': 3, 'mar': 3, 'april': 4, 'apr': 4,
+    'may': 5, 'june': 6, 'jun': 6, 'july': 7, 'jul': 7, 'august': 8, 'aug': 8,
+    'september': 9, 'sept': 9, 'sep': 9, 'october': 10, 'oct': 10, 'november': 11, 'nov': 11,
+    'december': 12, 'dec': 12,
+}
+
+
+def _alternatives(words: Iterable[str]) -> str:
+    # Longest first so "thursday" is not matched as "thu"
+    return '|'.join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+
+
+_MONTH = _alternatives(MONTHS)
+_NUMBER = r'\d{1,3}|' + _alternatives(NUMBER_WORDS)
+
+_DAY_RE = re.compile(rf"""
+    \b(?:
+        (?P<eod>eod|cob|end\ of\ (?:the\ )?(?:day|business)|close\ of\ business)
+      | (?P<eow>eow|end\ of\ (?:the\ |this\ )?week)
+      | (?P<eom>eom|end\ of\ (?:the\ |this\ )?month)
+      | (?P<after_tomorrow>day\ after\ (?:tomorrow|tmrw))
+      | (?P<today>today|tdy|tonight|tonite|this\ (?:morning|afternoon|evening))
+      | (?P<tomorrow>tomorrow|tmrw|tmr|tmw|2moro)
+      | (?:in|within)\ (?P<count>{_NUMBER})\ (?P<unit>minute|min|hour|hr|day|week|wk|month)s?
+      | (?P<next_period>next\ (?:week|month))
+      | (?P<this_week>this\ week)
+      | (?P<iso>(?P<year>\d{{4}})-(?P<month>\d{{2}})-(?P<day>\d{{2}}))
+      | (?P<md_month>{_MONTH})\.?\ (?P<md_day>\d{{1,2}})(?:st|nd|rd|th)?(?:,?\ (?P<md_year>\d{{4}}))?
+      | (?:(?P<dm_prep>by|on|due|before|until|till)\ (?:the\ )?)?(?P<dm_day>\d{{1,2}})(?P<dm_ordinal>st|nd|rd|th)?\ (?P<dm_of>of\ )?(?P<dm_month>{_MONTH})(?:,?\ (?P<dm_year>\d{{4}}))?
+      | (?:(?P<modifier>next|this|last|by|on|before|until|till|due|every|each)\ )?(?P<weekday>{_alternatives(WEEKDAYS)})
+    )\b
+""", re.VERBOSE)
+
+_TIME_RE = re.compile(r"""
+    \b(?:
+        (?P<hour>1[0-2]|0?[1-9])(?::(?P<minute>[0-5]\d))?\ ?(?P<meridiem>[ap])\.?m\b\.?
+      | (?:at|@|by|before)\ (?P<hour24>[01]?\d|2[0-3]):(?P<minute24>[0-5]\d)\b(?!\ ?[ap]\.?m\b)
+      | (?P<daypart>noon|midday|midnight|morning|afternoon|evening|night)\b
+    )
+""", re.VERBOSE)
+
+_FULL_WEEKDAYS = frozenset(name for name in WEEKDAYS if name.endswith('day'))
+
+
+class TemporalParser:
+    """
+    Rule-based reader for the deadline expressions people put in task names
+    ("tomorrow at 3pm", "by Friday", "in 2 weeks", "EOD")
+
+    Two precompiled regular expressions find the day and the time of day;
+    the rest is date arithmetic, so a parse takes microseconds. A result
+    carries a confidence: explicit expressions score high enough to fix the
+    deadline without asking the model, vague or conflicting ones do not.
+    """
+
+    @staticmethod
+    def parse(text: str, now: datetime) -> Optional[Dict]:
+        """
+        Deadline named in `text`, read relative to `now`, as
+        {'deadline': datetime, 'text': matched phrase, 'confidence': 0-1},
+        or None when it names none
+        """
+        if not text:
+            return None
+        lowered = text.lower()
+
+        days = []
+        for match in _DAY_RE.finditer(lowered):
+            resolved = TemporalParser._resolve_day(match, now)
+            if resolved is not None:
+                days.append((match, resolved))
+        times = list(_TIME_RE.finditer(lowered))
+        explicit_times = [match for match in times if not match.group('daypart')]
+
+        if not days:
+            if not explicit_times:
+                return None
+            # A bare time ("call at 3pm") is the next time that clock time comes round
+            match = explicit_times[0]
+            deadline = datetime.combine(now.date(), TemporalParser._clock(match), now.tzinfo)
+            if deadline <= now:
+                deadline += timedelta(days=1)
+            return {'deadline': deadline, 'text': text[match.start():match.end()].strip(), 'confidence': TIME_ONLY}
+
+        match, (deadline, confidence, default_time) = days[0]
+        spans = [match.span()]
+        if len({resolved[0] for _, resolved in days}) > 1:
+            # "move Friday's review to Monday": more than one candidate date
+            confidence = AMBIGUOUS
+
+        # Offsets in minutes or hours already carry their time
+        if not isinstance(deadline, datetime):
+            clock = default_time
+            time_match = (explicit_times or times or [None])[0]
+            if time_match is not None:
+                clock = TemporalParser._clock(time_match)
+                spans.append(time_match.span())
+            deadline = datetime.combine(deadline, clock, now.tzinfo)
+
+        if deadline <= now:
+            # "today at 9am" said at noon: probably not what was meant
+            confidence = min(confidence, VAGUE)
+
+        start = min(span[0] for span in spans)
+        end = max(span[1] for span in spans)
+        return {'deadline': deadline, 'text': text[start:end].strip(), 'confidence': confidence}
+
+    @staticmethod
+    def resolve_deadline(task_name: str, context: List[Dict], now: datetime) -> Optional[Dict]:
+        """
+        Deadline from the task name or, when it names none, from the
+        context retrieved for it. Only context entries found by relevance
+        search (they carry a 'score') are read, each relative to when it
+        was written; they must agree and lie in the future. The result has
+        a 'source' of 'task' or 'context'.
+        """
+        match = TemporalParser.parse(task_name, now)
+        if match is not None:
+            match['source'] = 'task'
+            return match
+
+        matches = []
+        for ctx in context:
+            if 'score' not in ctx:
+                continue
+            written = ctx.get('created_at')
+            try:
+                reference = datetime.fromisoformat(written).astimezone(now.tzinfo) if written else now
+            except (TypeError, ValueError):
+                reference = now
+            found = TemporalParser.parse(ctx.get('content') or '', reference)
+            if found is not None and found['deadline'] > now:
+                matches.append(found)
+        if not matches:
+            return None
+
+        match = matches[0]
+        confidence = match['confidence'] * CONTEXT_FACTOR
+        if len({found['deadline'] for found in matches}) > 1:
+            confidence = min(confidence, AMBIGUOUS)
+        return dict(match, confidence=round(confidence, 4), source='context')
+
+    @staticmethod
+    def _resolve_day(match: re.Match, now: datetime):
+        """
+        (date or datetime, confidence, default time) for a day expression,
+        or None when it does not name an upcoming deadline
+        """
+        today = now.date()
+        group = match.group
+
+        if group('eod'):
+            return today, PERIOD_END, END_OF_BUSINESS
+        if group('eow'):
+            return today + timedelta(days=(4 - today.weekday()) % 7), PERIOD_END, END_OF_BUSINESS
+        if group('eom'):
+            last = calendar.monthrange(today.year, today.month)[1]
+            return today.replace(day=last), PERIOD_END, END_OF_BUSINESS
+        if group('after_tomorrow'):
+            return today + timedelta(days=2), EXPLICIT, END_OF_DAY
+        if group('today'):
+            word = group('today').split()[-1]
+            hour = DAYPART_HOURS.get(word)
+            return today, EXPLICIT, time(hour) if hour is not None else END_OF_DAY
+        if group('tomorrow'):
+            return today + timedelta(days=1), EXPLICIT, END_OF_DAY
+        if group('count'):
+            count = int(group('count')) if group('count').isdigit() else NUMBER_WORDS[group('count')]
+            unit = group('unit')
+            if unit in ('minute', 'min'):
+                return now + timedelta(minutes=count), EXPLICIT, None
+            if unit in ('hour', 'hr'):
+                return now + timedelta(hours=count), EXPLICIT, None
+            if unit == 'day':
+                return today + timedelta(days=count), EXPLICIT, END_OF_DAY
+            if unit in ('week', 'wk'):
+                return today + timedelta(weeks=count), EXPLICIT, END_OF_DAY
+            return TemporalParser._add_months(today, count), EXPLICIT, END_OF_DAY
+        if group('next_period'):
+            if group('next_period').endswith('week'):
+                return today + timedelta(days=7), VAGUE, END_OF_DAY
+            return TemporalParser._add_months(today, 1), VAGUE, END_OF_DAY
+        if group('this_week'):
+            return today + timedelta(days=(4 - today.weekday()) % 7), VAGUE, END_OF_DAY
+        if group('iso'):
+            return TemporalParser._date(int(group('year')), int(group('month')), int(group('day')))
+        if group('md_month'):
+            return TemporalParser._calendar_day(today, group('md_month'), group('md_day'), group('md_year'))
+        if group('dm_month'):
+            if not (group('dm_prep') or group('dm_ordinal') or group('dm_of') or group('dm_year')):
+                # "top 10 dec deals", "the 3 mar report": a count or a label, not a date
+                return None
+            return TemporalParser._calendar_day(today, group('dm_month'), group('dm_day'), group('dm_year'))
+        return TemporalParser._weekday(today, group('weekday'), group('modifier'))
+
+    @staticmethod
+    def _weekday(today, name: str, modifier: Optional[str]):
+        if modifier in ('last', 'every', 'each'):
+            # Past or recurring, not a deadline
+            return None
+        if modifier is None and name not in _FULL_WEEKDAYS:
+            # "wed", "sat", "sun" on their own are too often ordinary words
+            return None
+        ahead = (WEEKDAYS[name] - today.weekday()) % 7
+        if modifier == 'next':
+            return today + timedelta(days=ahead or 7), NEXT_WEEKDAY, END_OF_DAY
+        if ahead == 0 and modifier not in ('this', 'by', 'before', 'until', 'till', 'due'):
+            # "on Friday" said on a Friday means next week's
+            ahead = 7
+        return today + timedelta(days=ahead), EXPLICIT, END_OF_DAY
+
+    @staticmethod
+    def _calendar_day(today, month_name: str, day: str, year: Optional[str]):
+        month = MONTHS[month_name]
+        if year:
+            return TemporalParser._date(int(year), month, int(day))
+        resolved = TemporalParser._date(today.year, month, int(day))
+        if resolved is not None and resolved[0] < today:
+            # A date without a year that has passed means next year's
+            resolved = TemporalParser._date(today.year + 1, month, int(day))
+        return resolved
+
+    @staticmethod
+    def _date(year: int, month: int, day: int):
+        try:
+            return datetime(year, month, day).date(), EXPLICIT, END_OF_DAY
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _add_months(day, months: int):
+        month_index = day.month - 1 + months
+        year, month = day.year + month_index // 12, month_index % 12 + 1
+        return day.replace(year=year, month=month, day=min(day.day, calendar.monthrange(year, month)[1]))
+
+    @staticmethod
+    def _clock(match: re.Match) -> time:
+        if match.group('daypart'):
+            return time(DAYPART_HOURS[match.group('daypart')])
+        if match.group('hour24'):
+            return time(int(match.group('hour24')), int(match.group('minute24')))
+        hour = int(match.group('hour')) % 12
+        if match.group('meridiem') == 'p':
+            hour += 12
+        return time(hour, int(match.group('minute') or 0))
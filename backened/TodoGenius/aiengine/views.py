@@ -1,70 +1,210 @@
+import json
+import math
+from asgiref.sync import sync_to_async
 from rest_framework import status
-from rest_framework.decorators import api_view
-from rest_framework.response import Response
-from django.utils.decorators import method_decorator
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.db.models import Q
+from django.urls import reverse
 from django.utils import timezone
+from django.views.decorators.http import require_http_methods, require_POST
+from .constants import PROVISIONAL_MODE, PROVISIONAL_MAX_WAIT
 from .services.task_processor import TaskProcessor
-from .services.lm_studio_client import LMStudioClient
-from django.utils import timezone
-from datetime import timedelta
-from django.db.models import Q
-from .serializers import TaskEnhancementInputSerializer, TaskEnhancementOutputSerializer
+from .services.inference_engine import get_inference_engine
+from .services.enhancement_cache import get_enhancement_cache
+from .services.semantic_cache import get_semantic_cache
+from .services.batch_scheduler import get_batch_scheduler
+from .services.single_flight import enhancement_flights, async_enhancement_flights
+from .services.admission import AdmissionRejected
+from .services.cancellation import RequestSuperseded, enhancement_cancellations
+from .services.context_search import get_context_search
+from .services.task_predictor import get_task_predictor
+from .services.llm_scheduler import get_llm_scheduler
+from .services.provisional import get_upgrade_registry
+from .services.prompt_context import get_prompt_context_store
+from .services.job_queue import EnhancementJobQueue
+from .models import EnhancementJob
+from .serializers import (
+    TaskEnhancementInputSerializer, TaskBatchEnhancementInputSerializer, TaskEnhancementOutputSerializer
+)
+from .throttles import EnhanceTaskRateThrottle, EnhanceTaskBatchRateThrottle
+
+
+def _parse_request_data(request) -> dict:
+    """Read the request body as JSON, falling back to form data"""
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+            return data if isinstance(data, dict) else {}
+        except (ValueError, UnicodeDecodeError):
+            return {}
+    return request.POST.dict()
+
+
+async def _throttled_response(request, throttle_class=EnhanceTaskRateThrottle, cost: int = 1):
+    """429 with Retry-After when this client exceeded its enhancement rate, else None"""
+    throttle = throttle_class()
+    # The throttle reads and writes the Django cache, which may be synchronous
+    if await sync_to_async(throttle.allow_request)(request, None, cost):
+        return None
+    retry_after = max(1, math.ceil(throttle.wait() or 1))
+    response = JsonResponse({
+        'success': False,
+        'message': 'Too many enhancement requests, slow down',
+        'retry_after': retry_after
+    }, status=status.HTTP_429_TOO_MANY_REQUESTS)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def _overloaded_response(rejected: AdmissionRejected):
+    """503 with Retry-After when the admission queue turned the request away"""
+    response = JsonResponse({
+        'success': False,
+        'message': 'AI service is at capacity, try again shortly',
+        'reason': rejected.reason,
+        'retry_after': rejected.retry_after
+    }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    response['Retry-After'] = str(rejected.retry_after)
+    return response
+
+
+async def _request_key(request, validated_data: dict):
+    """
+    Scope the client's request key to the client, so keys never collide
+    across users: the signed-in user, else the session, else the client
+    address. Clients behind one NAT or proxy share an address, so without
+    a session they share a key namespace and can cancel each other's
+    requests by reusing a key.
+    """
+    key = validated_data.get('request_key')
+    if not key:
+        return None
+    user = await request.auser()
+    if user.is_authenticated:
+        return f"user:{user.pk}:{key}"
+    session_key = request.session.session_key
+    if session_key:
+        return f"session:{session_key}:{key}"
+    return f"ip:{EnhanceTaskRateThrottle().get_ident(request)}:{key}"
+
+
+def _superseded_response():
+    """409 for a request cancelled by a newer one with the same request key"""
+    return JsonResponse({
+        'success': False,
+        'message': 'Superseded by a newer enhancement request',
+        'cancelled': True
+    }, status=status.HTTP_409_CONFLICT)
+
 
-@api_view(['POST'])
-def enhance_task(request):
+@csrf_exempt
+@require_POST
+async def enhance_task(request):
     """
     Enhance a task with AI-generated insights based on user context and history
-    
-    Expected input: {"task_name": "Buy groceries"}
-    
+
+    Expected input: {"task_name": "Buy groceries", "request_key": "optional",
+                     "provisional": optional, defaults to AI_PROVISIONAL_MODE}
+
     Returns enhanced task data with:
     - Enhanced title and description
     - Suggested category
     - Priority score
     - Suggested deadline
     - Reasoning for decisions
+
+    This is an async view: under ASGI (TodoGenius/asgi.py) the worker is
+    released while LM Studio decodes, so one process can hold many
+    in-flight enhancements. A newer request with the same request_key, or
+    the client disconnecting, cancels the generation.
+
+    In provisional mode the answer comes at once without the model, marked
+    meta.provisional, and meta.upgrade_url serves the full enhancement
+    once the background generation finishes (see enhancement_upgrade).
     """
+    throttled = await _throttled_response(request)
+    if throttled is not None:
+        return throttled
+
+    request_data = _parse_request_data(request)
     try:
         # Validate input
-        input_serializer = TaskEnhancementInputSerializer(data=request.data)
+        input_serializer = TaskEnhancementInputSerializer(data=request_data)
         if not input_serializer.is_valid():
-            return Response({
+            return JsonResponse({
                 'success': False,
                 'message': 'Invalid input data',
                 'errors': input_serializer.errors
             }, status=status.HTTP_400_BAD_REQUEST)
-        
+
         task_name = input_serializer.validated_data['task_name']
-        
+
         # Initialize the smart task enhancer (CREATE AN INSTANCE)
         task_processor = TaskProcessor()
-        
+
+        request_key = await _request_key(request, input_serializer.validated_data)
+        provisional = input_serializer.validated_data.get('provisional')
+        if provisional is None:
+            provisional = getattr(settings, 'AI_PROVISIONAL_MODE', PROVISIONAL_MODE)
+
         # Enhance the task (CALL ON INSTANCE)
-        enhancement_result = task_processor.enhance_task(task_name=task_name)
-        
+        try:
+            if provisional:
+                enhancement_result = await task_processor.aprovisional_enhancement(task_name, request_key)
+            else:
+                enhancement_result = await enhancement_cancellations.run(
+                    request_key,
+                    task_processor.aenhance_task(task_name=task_name)
+                )
+        except AdmissionRejected as rejected:
+            return _overloaded_response(rejected)
+        except RequestSuperseded:
+            return _superseded_response()
+
+        meta = enhancement_result.get('meta', {})
+        if meta.get('circuit') == 'open':
+            # Backend down: fallback data, and tell the client when to retry
+            response = JsonResponse({
+                'success': False,
+                'message': 'AI service temporarily unavailable',
+                'data': enhancement_result['data'],
+                'meta': meta
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            response['Retry-After'] = str(max(1, math.ceil(meta.get('retry_after', 0))))
+            return response
+
         if not enhancement_result['success']:
-            return Response({
+            return JsonResponse({
                 'success': False,
                 'message': 'Failed to enhance task',
                 'data': enhancement_result['data']
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        
-        return Response({
+
+        if meta.get('provisional'):
+            meta['upgrade_url'] = reverse('enhancement_upgrade', args=[meta['upgrade_id']])
+            return JsonResponse({
+                'success': True,
+                'message': 'Provisional enhancement, full enhancement in progress',
+                'data': enhancement_result['data'],
+                'meta': meta
+            }, status=status.HTTP_200_OK)
+
+        return JsonResponse({
                 'success': True,
                 'message': 'Task enhanced successfully (with validation warnings)',
-                'data': enhancement_result['data']
-               
+                'data': enhancement_result['data'],
+                'meta': meta
+
             }, status=status.HTTP_200_OK)
-        
+
     except Exception as e:
         print(f"Error in enhance_task view: {str(e)}")
-        return Response({
+        return JsonResponse({
             'success': False,
             'message': 'Internal server error',
             'data': {
-                'title': request.data.get('task_name', 'Untitled Task'),
+                'title': request_data.get('task_name', 'Untitled Task'),
                 'descriptions': [
                     'Complete the task as planned',
                     'Focus on achieving the desired outcome',
@@ -77,3 +217,346 @@ def enhance_task(request):
             }
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+
+def _format_sse(event: str, data) -> str:
+    """Encode one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@csrf_exempt
+@require_http_methods(['GET', 'POST'])
+async def enhance_task_stream(request):
+    """
+    Streaming variant of enhance_task using Server-Sent Events
+
+    Accepts {"task_name": "..."} as a JSON body, or ?task_name=... on GET
+    so the browser EventSource API can be used directly.
+
+    Events:
+    - token:  {"text": "..."} for every decoded text delta
+    - field:  {"<field>": value} as soon as a top-level field parses
+    - result: the same {"success", "data"} payload enhance_task returns
+    - cancelled: {"reason": "superseded"} when a newer request with the
+      same request_key took over; the stream ends without a result
+    """
+    throttled = await _throttled_response(request)
+    if throttled is not None:
+        return throttled
+
+    request_data = request.GET.dict() if request.method == 'GET' else _parse_request_data(request)
+    input_serializer = TaskEnhancementInputSerializer(data=request_data)
+    if not input_serializer.is_valid():
+        return JsonResponse({
+            'success': False,
+            'message': 'Invalid input data',
+            'errors': input_serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    task_name = input_serializer.validated_data['task_name']
+
+    task_processor = TaskProcessor()
+    events = enhancement_cancellations.stream(
+        await _request_key(request, input_serializer.validated_data),
+        task_processor.astream_enhancement(task_name=task_name)
+    )
+    # Pull the first event before committing to a 200 stream: admission is
+    # decided before anything is emitted
+    try:
+        first_event = await events.__anext__()
+    except AdmissionRejected as rejected:
+        return _overloaded_response(rejected)
+    except RequestSuperseded:
+        return _superseded_response()
+
+    async def event_stream():
+        yield _format_sse(first_event['event'], first_event['data'])
+        try:
+            async for event in events:
+                yield _format_sse(event['event'], event['data'])
+        except RequestSuperseded:
+            yield _format_sse('cancelled', {'reason': 'superseded'})
+
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop reverse proxies (nginx) from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@csrf_exempt
+@require_POST
+async def enhance_tasks_batch(request):
+    """
+    Enhance many tasks in one call, streamed back as NDJSON
+
+    Expected input: {"task_names": ["Buy groceries", "Call the dentist", ...]}
+
+    Recent tasks and categories are read once for the whole batch and
+    several tasks are enhanced at once (AI_BATCH_ENHANCEMENT_CONCURRENCY).
+    Each line is one task's result as soon as it is ready, in completion
+    order: {"index", "task_name", "success", "data", "meta", "elapsed"},
+    where index is the task's position in task_names. The last line is
+    {"summary": ...} with the batch's wall time and throughput.
+
+    Every task counts against the client's 'ai_enhance_batch' rate, and
+    the tasks run in the LLM scheduler's 'batch' class, behind
+    interactive requests.
+    """
+    input_serializer = TaskBatchEnhancementInputSerializer(data=_parse_request_data(request))
+    if not input_serializer.is_valid():
+        return JsonResponse({
+            'success': False,
+            'message': 'Invalid input data',
+            'errors': input_serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    task_names = input_serializer.validated_data['task_names']
+    throttled = await _throttled_response(request, EnhanceTaskBatchRateThrottle, cost=len(task_names))
+    if throttled is not None:
+        return throttled
+
+    task_processor = TaskProcessor(priority='batch')
+    items = task_processor.astream_batch_enhancement(task_names)
+
+    async def ndjson_stream():
+        async for item in items:
+            yield json.dumps(item, default=str) + '\n'
+
+    response = StreamingHttpResponse(ndjson_stream(), content_type='application/x-ndjson')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@require_http_methods(['GET'])
+async def enhancement_upgrade(request, upgrade_id):
+    """
+    Full enhancement behind a provisional answer
+
+    Poll with GET; ?wait=N (seconds, at most AI_PROVISIONAL_MAX_WAIT)
+    holds the request until the upgrade finishes or the wait runs out.
+
+    Returns 200 with the enhancement once ready, 202 while pending, 409
+    when a newer request with the same request_key replaced it, 503 when
+    the AI service turned it away, 500 when it failed and 404 for an
+    unknown or expired id.
+    """
+    try:
+        wait = float(request.GET.get('wait', 0))
+    except ValueError:
+        wait = 0.0
+    wait = min(max(0.0, wait), getattr(settings, 'AI_PROVISIONAL_MAX_WAIT', PROVISIONAL_MAX_WAIT))
+
+    upgrade = await get_upgrade_registry().await_upgrade(upgrade_id, wait)
+    if upgrade is None:
+        return JsonResponse({
+            'success': False,
+            'status': 'unknown',
+            'message': 'Unknown or expired upgrade'
+        }, status=status.HTTP_404_NOT_FOUND)
+
+    if upgrade['status'] == 'pending':
+        response = JsonResponse({
+            'success': False,
+            'status': 'pending',
+            'message': 'Full enhancement still in progress',
+            'elapsed': upgrade['elapsed']
+        }, status=status.HTTP_202_ACCEPTED)
+        response['Retry-After'] = '1'
+        return response
+
+    if upgrade['status'] == 'superseded':
+        return JsonResponse({
+            'success': False,
+            'status': 'superseded',
+            'message': 'Superseded by a newer enhancement request',
+            'cancelled': True
+        }, status=status.HTTP_409_CONFLICT)
+
+    result = upgrade.get('result')
+    if upgrade['status'] == 'ready':
+        return JsonResponse({
+            'success': True,
+            'status': 'ready',
+            'message': 'Task enhanced successfully',
+            'data': result['data'],
+            'meta': result.get('meta', {})
+        }, status=status.HTTP_200_OK)
+
+    retry_after = upgrade.get('retry_after')
+    if result is not None and result.get('meta', {}).get('circuit') == 'open':
+        retry_after = result['meta'].get('retry_after', 0)
+    if retry_after is not None:
+        response = JsonResponse({
+            'success': False,
+            'status': 'failed',
+            'message': 'AI service temporarily unavailable',
+            'reason': upgrade.get('reason', 'circuit_open'),
+            'retry_after': retry_after
+        }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        response['Retry-After'] = str(max(1, math.ceil(retry_after)))
+        return response
+
+    return JsonResponse({
+        'success': False,
+        'status': 'failed',
+        'message': 'Failed to enhance task',
+        'reason': upgrade.get('reason'),
+        'data': result['data'] if result is not None else None
+    }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def _job_status(job: EnhancementJob) -> dict:
+    """Public view of an enhancement job, without its result"""
+    return {
+        'job_id': str(job.id),
+        'task_name': job.task_name,
+        'status': job.status,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'error': job.error or None,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'updated_at': job.updated_at.isoformat() if job.updated_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'status_url': reverse('enhancement_job', args=[job.id]),
+        'result_url': reverse('enhancement_job_result', args=[job.id]),
+    }
+
+
+async def _get_job(job_id):
+    """The job, or None when unknown or past its result TTL"""
+    job = await EnhancementJob.objects.filter(pk=job_id).afirst()
+    if job is None or (job.expires_at is not None and job.expires_at < timezone.now()):
+        return None
+    return job
+
+
+def _job_not_found():
+    return JsonResponse({
+        'success': False,
+        'message': 'Unknown or expired enhancement job'
+    }, status=status.HTTP_404_NOT_FOUND)
+
+
+@csrf_exempt
+@require_POST
+async def submit_enhancement_job(request):
+    """
+    Queue a task enhancement for the worker (`manage.py run_enhancement_worker`)
+
+    Expected input: {"task_name": "Buy groceries"}
+
+    Answers 202 at once with the job id and the URLs to poll; the web
+    worker is never held while the model runs.
+    """
+    throttled = await _throttled_response(request)
+    if throttled is not None:
+        return throttled
+
+    input_serializer = TaskEnhancementInputSerializer(data=_parse_request_data(request))
+    if not input_serializer.is_valid():
+        return JsonResponse({
+            'success': False,
+            'message': 'Invalid input data',
+            'errors': input_serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    job = await EnhancementJobQueue.asubmit(input_serializer.validated_data['task_name'])
+    response = JsonResponse({
+        'success': True,
+        'message': 'Enhancement queued',
+        'job': _job_status(job)
+    }, status=status.HTTP_202_ACCEPTED)
+    response['Location'] = reverse('enhancement_job', args=[job.id])
+    return response
+
+
+@require_http_methods(['GET'])
+async def enhancement_job(request, job_id):
+    """Status of an enhancement job: queued, running, succeeded or failed"""
+    job = await _get_job(job_id)
+    if job is None:
+        return _job_not_found()
+    return JsonResponse({'success': True, 'job': _job_status(job)}, status=status.HTTP_200_OK)
+
+
+@require_http_methods(['GET'])
+async def enhancement_job_result(request, job_id):
+    """
+    Result of an enhancement job
+
+    Returns 200 with the enhanced task once it succeeded, 202 while queued
+    or running, and 500 with fallback data when every attempt failed.
+    """
+    job = await _get_job(job_id)
+    if job is None:
+        return _job_not_found()
+
+    if not job.is_finished:
+        response = JsonResponse({
+            'success': False,
+            'message': 'Enhancement not finished yet',
+            'job': _job_status(job)
+        }, status=status.HTTP_202_ACCEPTED)
+        response['Retry-After'] = '1'
+        return response
+
+    result = job.result or {}
+    if job.status == 'failed':
+        return JsonResponse({
+            'success': False,
+            'message': 'Failed to enhance task',
+            'error': job.error,
+            'data': result.get('data')
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    return JsonResponse({
+        'success': True,
+        'message': 'Task enhanced successfully',
+        'data': result['data'],
+        'meta': result.get('meta', {})
+    }, status=status.HTTP_200_OK)
+
+
+@require_http_methods(['GET'])
+async def ai_health(request):
+    """
+    Health of the AI backend for dashboards and load balancers
+
+    Served from the background health monitor's cached probe and the
+    circuit breaker state, so it answers immediately even when LM Studio
+    is down. Also reports the enhancement cache, request coalescing,
+    batching, scheduler, cancellation, provisional upgrade and prompt context counters. Returns 503 while the backend is unhealthy or its
+    circuit is open.
+    """
+    engine = get_inference_engine()
+    health = await engine.acheck_health()
+    circuit = health.get('circuit') or engine.circuit_state()
+    healthy = health.get('status') == 'healthy' and (circuit is None or circuit['state'] != 'open')
+
+    cache = get_enhancement_cache()
+    batcher = get_batch_scheduler(engine)
+    context_search = get_context_search()
+    semantic_cache = get_semantic_cache()
+    predictor = get_task_predictor()
+    prompt_context = get_prompt_context_store()
+    return JsonResponse({
+        'success': healthy,
+        'status': 'healthy' if healthy else 'unhealthy',
+        'engine': type(engine).__name__,
+        'backend': health,
+        'circuit': circuit,
+        'cache': cache.stats() if cache is not None else None,
+        'semantic_cache': semantic_cache.stats() if semantic_cache is not None else None,
+        'coalescing': {
+            'sync': enhancement_flights.stats(),
+            'async': async_enhancement_flights.stats(),
+        },
+        'batching': batcher.stats() if batcher is not None else None,
+        'scheduler': get_llm_scheduler().stats(),
+        'cancellation': enhancement_cancellations.stats(),
+        'context_search': context_search.stats() if context_search is not None else None,
+        'predictor': predictor.stats() if predictor is not None else None,
+        'provisional': get_upgrade_registry().stats(),
+        'prompt_context': prompt_context.stats() if prompt_context is not None else None,
+    }, status=status.HTTP_200_OK if healthy else status.HTTP_503_SERVICE_UNAVAILABLE)
@@ -0,0 +1,20 @@
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('context', '0002_rename_context_ent_source__152b14_idx_context_source__775d1e_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='context',
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.search.SearchVector('content', config='english'),
+                name='context_content_fts_idx',
+            ),
+        ),
+    ]
@@ -1,4 +1,6 @@
 import uuid
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
 from django.db import models
 
 class Context(models.Model):
@@ -26,6 +28,8 @@ class Context(models.Model):
         indexes = [
             models.Index(fields=['source_type', 'context_date']),
             models.Index(fields=['is_processed']),
+            # Full-text search over content for task-specific context retrieval
+            GinIndex(SearchVector('content', config='english'), name='context_content_fts_idx'),
         ]
 
     def __str__(self):
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-17 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0003_remove_category_description'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('is_ai_enhanced', False)), fields=['created_at', 'id'], name='task_unenhanced_created_idx'),
+        ),
+    ]
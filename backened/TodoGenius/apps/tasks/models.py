@@ -69,6 +69,9 @@ class Task(models.Model):
             models.Index(fields=['status', 'priority_score']),
             models.Index(fields=['deadline']),
             models.Index(fields=['category']),
+            # Keyset walk of the enhancement backfill over tasks created without AI
+            models.Index(fields=['created_at', 'id'], condition=models.Q(is_ai_enhanced=False),
+                         name='task_unenhanced_created_idx'),
         ]
 
     def __str__(self):
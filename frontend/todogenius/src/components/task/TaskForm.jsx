@@ -8,7 +8,7 @@ import useDebounce from '../../hooks/useDebounce'
 import {
   createTask,
   updateTask,
-  enhanceTask,
+  enhanceTaskStream,
   getCategories,
 } from '../../services/api'
 import PriorityIndicator from './PriorityIndicator'
@@ -46,6 +46,12 @@ export default function TaskForm({ task, onSuccess, onCancel }) {
   const catInputRef = useRef()
   const priorityRef = useRef()
   const deadlineRef = useRef()
+  // One request key per open form: each new enhancement cancels the last
+  const requestKeyRef = useRef(
+    window.crypto?.randomUUID?.() || `${Date.now()}-${Math.random().toString(36).slice(2)}`
+  )
+  // In-flight enhancement, aborted when a newer one starts or the form closes
+  const aiRequestRef = useRef(null)
 
   // Debounce title for AI suggestions (both create and edit)
   const debouncedTitle = useDebounce(title, 3000) // Reduced to 3 seconds for better UX
@@ -85,29 +91,44 @@ export default function TaskForm({ task, onSuccess, onCancel }) {
 
     if (!shouldFetchAI) return
 
+    aiRequestRef.current?.abort()
+    const controller = new AbortController()
+    aiRequestRef.current = controller
+
     const fetchAiSuggestions = async () => {
       setAiLoading(true)
       setErrors({})
       
       try {
-        const response = await enhanceTask(debouncedTitle)
-        if (response.data.success) {
-          const aiResponse = response.data.data
+        // Show fields as soon as the model produces them
+        const result = await enhanceTaskStream(debouncedTitle, (fields) => {
+          setAiData((prev) => ({
+            confidence: 0,
+            ...(prev?.original_title === debouncedTitle ? prev : {}),
+            ...fields,
+            original_title: debouncedTitle,
+          }))
+          setShowAiSuggestions(true)
+        }, { requestKey: requestKeyRef.current, signal: controller.signal })
+        if (result?.success) {
           // Store original title with AI data for comparison
-          setAiData({ ...aiResponse, original_title: debouncedTitle })
+          setAiData({ ...result.data, original_title: debouncedTitle })
           setShowAiSuggestions(true)
         }
       } catch (error) {
+        if (error.name === 'AbortError') return
         console.error('AI enhancement failed:', error)
         setErrors({ ai: 'Failed to get AI suggestions. Please try again.' })
       } finally {
-        setAiLoading(false)
+        if (aiRequestRef.current === controller) setAiLoading(false)
       }
     }
 
     fetchAiSuggestions()
   }, [debouncedTitle, originalTitle, isEditing, aiData?.original_title])
 
+  useEffect(() => () => aiRequestRef.current?.abort(), [])
+
   // Get text color based on background
   const getTextColor = (bgColor) => {
     const hex = bgColor.replace('#', '')
@@ -10,8 +10,55 @@ export const createTask = (data) => api.post('/tasks/tasks-list/', data)
 export const updateTask = (id, data) => api.put(`/tasks/${id}/`, data)
 export const deleteTask = (id) => api.delete(`/tasks/${id}/`)
 
-export const enhanceTask = (task_name) =>
-  api.post('/ai/enhance-task/', { task_name })
+// request_key identifies the caller (e.g. one open form): a newer request
+// with the same key cancels the one still generating on the server.
+export const enhanceTask = (task_name, { requestKey, signal } = {}) =>
+  api.post('/ai/enhance-task/', { task_name, request_key: requestKey }, { signal })
+
+// Streams /ai/enhance-task/stream/ (Server-Sent Events). onField receives
+// each top-level field as soon as the model has produced it; the promise
+// resolves with the final { success, data } payload, or null when a newer
+// request with the same requestKey superseded this one. Aborting `signal`
+// disconnects, which stops the generation on the server.
+export const enhanceTaskStream = async (task_name, onField, { requestKey, signal } = {}) => {
+  const response = await fetch(`${api.defaults.baseURL}/ai/enhance-task/stream/`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+    body: JSON.stringify({ task_name, request_key: requestKey }),
+    signal,
+  })
+  if (response.status === 409) return null
+  if (!response.ok || !response.body) {
+    throw new Error(`Enhancement stream failed with status ${response.status}`)
+  }
+
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  let result = null
+
+  while (true) {
+    const { value, done } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+
+    const events = buffer.split('\n\n')
+    buffer = events.pop()
+    for (const raw of events) {
+      let event = 'message'
+      let data = ''
+      for (const line of raw.split('\n')) {
+        if (line.startsWith('event:')) event = line.slice(6).trim()
+        else if (line.startsWith('data:')) data += line.slice(5).trim()
+      }
+      if (!data) continue
+      if (event === 'field' && onField) onField(JSON.parse(data))
+      else if (event === 'result') result = JSON.parse(data)
+      else if (event === 'cancelled') return null
+    }
+  }
+  return result
+}
 
 export const getContext = (params) => api.get('/context/', { params })
 export const createContext = (data) => api.post('/context/', data)